@@ -26,6 +26,20 @@ options:
           The configuration file is optional. If the file path is not provided, the configuration will be loaded from
           environment variables.
       required: false
+    token_cache:
+      description:
+        - When true, the OVC access token is cached on the controller and shared by all the tasks, so the login
+          happens once per token lifetime. It can also be enabled with the environment variable SIMPLIVITY_TOKEN_CACHE.
+      type: bool
+      required: false
+    rate_limit:
+      description:
+        - When true, the requests of all the tasks to the OVC share a rate limit kept on the controller, which adapts
+          to the throttling and latency of the OVC. It applies to the requests sent directly to the OVC and through
+          the OVC broker, not through the httpapi plugin. It can also be enabled with the environment variable
+          SIMPLIVITY_RATE_LIMIT.
+      type: bool
+      required: false
 
 notes:
     - "A sample configuration file for the config parameter can be found at:
@@ -26,6 +26,7 @@ exit_code_build_simplivity_ansible=0
 exit_code_module_validation=0
 exit_code_playbook_validation=0
 exit_code_tests=0
+exit_code_startup_budget=0
 exit_code_flake8=0
 exit_code_coveralls=0
 
@@ -140,10 +141,17 @@ python -m pytest test/
 exit_code_tests=$?
 
 
+echo -e "\n${COLOR_START}Checking the startup time budget${COLOR_END}"
+# Medians of fresh interpreters, the budget is about three times the measured import time
+PYTHONPATH=".:$PYTHONPATH" python test/simplivity_benchmark.py --backend mock --rounds 5 --vms 10
+exit_code_startup_budget=$?
+
+
 echo -e "\n=== Summary =========================="
 print_summary "Modules validation" ${exit_code_module_validation}
 print_summary "Playbooks validation" ${exit_code_playbook_validation}
 print_summary "Unit tests" ${exit_code_tests}
+print_summary "Startup time budget" ${exit_code_startup_budget}
 print_summary "Flake8" ${exit_code_flake8}
 print_summary "Doc Generation" ${exit_code_doc_generation}
 print_summary "Coveralls" ${exit_code_coveralls}
@@ -18,17 +18,33 @@
 
 import abc
 import collections
+import contextlib
+import errno
+import fcntl
+import hashlib
+import itertools
 import json
 import logging
 import os
+import tempfile
 import traceback
 
 try:
-    from simplivity.ovc_client import OVC
-    from simplivity.exceptions import HPESimpliVityResourceNotFound
-    HAS_HPE_SIMPLIVITY = True
+    from collections.abc import Mapping
 except ImportError:
-    HAS_HPE_SIMPLIVITY = False
+    # Python 2
+    from collections import Mapping
+
+try:
+    from importlib.util import find_spec
+except ImportError:
+    # Python 2
+    from pkgutil import find_loader as find_spec
+
+# The SDK imports http.client, ssl and email, so it is only loaded when the OVC client is created.
+# See _import_ovc_client().
+HAS_HPE_SIMPLIVITY = find_spec('simplivity') is not None
+OVC = None
 
 try:
     from ansible.module_utils import six
@@ -37,7 +53,7 @@ except ImportError:
     import six
     to_native = str
 
-from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.basic import AnsibleModule, env_fallback
 
 
 logger = logging.getLogger(__name__)  # Logger for development purposes
@@ -65,6 +81,18 @@ def get_logger(mod_name):
     return logger
 
 
+def _import_ovc_client():
+    """
+    Imports the SDK OVC client on first use.
+
+    :return: class: simplivity.ovc_client.OVC
+    """
+    global OVC
+    if OVC is None:
+        from simplivity.ovc_client import OVC
+    return OVC
+
+
 def transform_list_to_dict(list_):
     """
     Transforms a list into a dictionary, putting values as keys.
@@ -79,7 +107,7 @@ def transform_list_to_dict(list_):
         return ret
 
     for value in list_:
-        if isinstance(value, collections.Mapping):
+        if isinstance(value, Mapping):
             ret.update(value)
         else:
             ret[to_native(value)] = True
@@ -87,9 +115,85 @@ def transform_list_to_dict(list_):
     return ret
 
 
+def project_fields(data, fields):
+    """
+    Keeps only the given fields of a resource, in the same way as the REST API fields parameter.
+
+    :arg dict data: Resource data
+    :arg list fields: Names of the fields to keep, None to keep all of them
+    :return: dict: Resource data with the given fields only
+    """
+    if not fields:
+        return data
+
+    return dict((field, data[field]) for field in fields if field in data)
+
+
+def _encode_column(column):
+    # Only the string columns repeating their values are worth a table of distinct values
+    if not all(value is None or isinstance(value, six.string_types) for value in column):
+        return column
+
+    indexes = {}
+    encoded = [indexes.setdefault(value, len(indexes)) for value in column]
+    if len(indexes) * 2 > len(column):
+        return column
+
+    return dict(values=sorted(indexes, key=indexes.get), indexes=encoded)
+
+
+def to_columnar(records):
+    """
+    Converts records to columns: the list of keys, in the order they are first found, and one list of values per
+    key, with None where a record does not have the key. The string columns whose values are repeated, such as the
+    cluster and datastore names, are dictionary-encoded: a dict with the distinct values, and the index in them of
+    the value of each record.
+
+    :arg iterable records: Records, such as a generator of the data of the resources
+    :return: dict: keys, columns and count of records
+    """
+    keys, positions, columns = [], {}, []
+    count = 0
+
+    for record in records:
+        for key, value in record.items():
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = len(keys)
+                keys.append(key)
+                columns.append([None] * count)
+            columns[position].append(value)
+
+        count += 1
+        for column in columns:
+            if len(column) < count:
+                column.append(None)
+
+    return dict(keys=keys, columns=[_encode_column(column) for column in columns], count=count)
+
+
+def from_columnar(table):
+    """
+    Converts the columns returned by to_columnar() back to records. The keys a record did not have are None.
+
+    :arg dict table: keys, columns and count of records
+    :return: list: Records
+    """
+    columns = [[column['values'][index] for index in column['indexes']] if isinstance(column, Mapping) else column
+               for column in table['columns']]
+    if not columns:
+        return [{} for _ in range(table['count'])]
+
+    return [dict(zip(table['keys'], values)) for values in zip(*columns)]
+
+
+# json.dumps() builds a new encoder for each call with sort_keys, this one is shared by the comparisons
+_SORTED_JSON_ENCODER = json.JSONEncoder(sort_keys=True)
+
+
 def _str_sorted(obj):
-    if isinstance(obj, collections.Mapping):
-        return json.dumps(obj, sort_keys=True)
+    if isinstance(obj, Mapping):
+        return _SORTED_JSON_ENCODER.encode(obj)
     else:
         return str(obj)
 
@@ -110,60 +214,204 @@ def _standardize_value(value):
     return str(value)
 
 
-def compare(first_resource, second_resource):
+def _join_path(path, key):
+    return '{0}.{1}'.format(path, key) if path else to_native(key)
+
+
+_FALSY_KEY = ('f',)
+
+
+def _canonical_key(value, keys):
     """
-    Recursively compares dictionary contents equivalence, ignoring types and elements order.
-    Particularities of the comparison:
-        - Inexistent key = None
-        - These values are considered equal: None, empty, False
-        - Lists are compared value by value after a sort, if they have same size.
-        - Each element is converted to str before the comparison.
-    :arg dict first_resource: first dictionary
-    :arg dict second_resource: second dictionary
-    :return: bool: True when equal, False when different.
+    Gets a key of a value that ignores the order of the lists and the types of the values, as compare() does:
+    the values of a dict set to None, empty or False have the same key, a key set to None is the same as a missing
+    key, and the other values are keyed by their str, with 1.0 the same as 1. The keys of the dicts and lists are
+    built from the keys of their values and cached by id, so each value is only visited once, however deep it is.
+
+    :arg value: Value
+    :arg dict keys: Cached keys, by id of the dicts and lists
+    :return: tuple: Hashable and sortable key, the values with the same key are equal for compare()
     """
-    resource1 = first_resource
-    resource2 = second_resource
+    # The resources are made of JSON types, the exact type checks avoid the slower checks of the ABCs
+    value_type = type(value)
+    if value_type is str:
+        return 's', value
+
+    if value_type is dict or value_type is not list and isinstance(value, Mapping):
+        key = keys.get(id(value))
+        if key is None:
+            key = keys[id(value)] = ('d',) + tuple(sorted((to_native(name), _canonical_key(item, keys) if item else _FALSY_KEY)
+                                                          for name, item in value.items() if item is not None))
+        return key
+
+    if isinstance(value, list):
+        key = keys.get(id(value))
+        if key is None:
+            key = keys[id(value)] = ('l',) + tuple(sorted(_canonical_key(item, keys) for item in value))
+        return key
+
+    return 's', _standardize_value(value)
 
-    debug_resources = "resource1 = {0}, resource2 = {1}".format(resource1, resource2)
 
+def _iter_diff(first_resource, second_resource, path, keys):
+    """
+    Yields the differences between two dicts, following the rules of compare(), as tuples (path, first value,
+    second value).
+    """
     # The first resource is True / Not Null and the second resource is False / Null
-    if resource1 and not resource2:
-        logger.debug("resource1 and not resource2. " + debug_resources)
-        return False
+    if first_resource and not second_resource:
+        yield path, first_resource, second_resource
+        return
+
+    if not isinstance(second_resource, Mapping):
+        if second_resource:
+            yield path, first_resource, second_resource
+        return
 
     # Checks all keys in first dict against the second dict
-    for key in resource1:
-        if key not in resource2:
-            if resource1[key] is not None:
+    for key, value in first_resource.items():
+        if key not in second_resource:
+            if value is not None:
                 # Inexistent key is equivalent to exist with value None
-                logger.debug(SimplivityModule.MSG_DIFF_AT_KEY.format(key) + debug_resources)
-                return False
+                yield _join_path(path, key), value, None
         # If both values are null, empty or False it will be considered equal.
-        elif not resource1[key] and not resource2[key]:
+        elif not value and not second_resource[key]:
             continue
-        elif isinstance(resource1[key], collections.Mapping):
-            # recursive call
-            if not compare(resource1[key], resource2[key]):
-                logger.debug(SimplivityModule.MSG_DIFF_AT_KEY.format(key) + debug_resources)
-                return False
-        elif isinstance(resource1[key], list):
-            # change comparison function to compare_list
-            if not compare_list(resource1[key], resource2[key]):
-                logger.debug(SimplivityModule.MSG_DIFF_AT_KEY.format(key) + debug_resources)
-                return False
-        elif _standardize_value(resource1[key]) != _standardize_value(resource2[key]):
-            logger.debug(SimplivityModule.MSG_DIFF_AT_KEY.format(key) + debug_resources)
-            return False
+        elif isinstance(value, Mapping):
+            for difference in _iter_diff(value, second_resource[key], _join_path(path, key), keys):
+                yield difference
+        elif isinstance(value, list):
+            for difference in _iter_list_diff(value, second_resource[key], _join_path(path, key), keys):
+                yield difference
+        elif _standardize_value(value) != _standardize_value(second_resource[key]):
+            yield _join_path(path, key), value, second_resource[key]
 
     # Checks all keys in the second dict, looking for missing elements
-    for key in resource2.keys():
-        if key not in resource1:
-            if resource2[key] is not None:
-                # Inexistent key is equivalent to exist with value None
-                logger.debug(SimplivityModule.MSG_DIFF_AT_KEY.format(key) + debug_resources)
-                return False
-    return True
+    for key, value in second_resource.items():
+        if key not in first_resource and value is not None:
+            yield _join_path(path, key), None, value
+
+
+def _iter_list_diff(first_resource, second_resource, path, keys):
+    """
+    Yields the differences between two lists, following the rules of compare_list(), in any order.
+
+    The elements of both lists are paired after a sort by their JSON text, or their str for the other values, which
+    finds equal lists fast. When a pair differs, the elements are matched as multisets by their canonical key, so a
+    sort putting equal elements at different positions does not make the lists different, and only the elements left
+    without a match are paired and compared. The paths of the elements have their index in the first list.
+    """
+    if not isinstance(second_resource, list) or len(first_resource) != len(second_resource):
+        yield path, first_resource, second_resource
+        return
+
+    # Lists read back from the OVC are mostly in the same order. The equality of Python is not enough, as 1 is
+    # equal to True, but it avoids serializing most of the different lists
+    if first_resource == second_resource and _SORTED_JSON_ENCODER.encode(first_resource) == _SORTED_JSON_ENCODER.encode(second_resource):
+        return
+
+    first_texts = [_str_sorted(value) for value in first_resource]
+    second_texts = [_str_sorted(value) for value in second_resource]
+    first_order = sorted(range(len(first_texts)), key=first_texts.__getitem__)
+    second_order = sorted(range(len(second_texts)), key=second_texts.__getitem__)
+
+    for index, other_index in zip(first_order, second_order):
+        value, other_value = first_resource[index], second_resource[other_index]
+        # Dicts with the same JSON text are equal, there is no need to walk them
+        if first_texts[index] == second_texts[other_index] and isinstance(value, Mapping) and isinstance(other_value, Mapping):
+            continue
+        if next(_iter_item_diff(value, other_value, path, keys), None) is not None:
+            break
+    else:
+        return
+
+    first_unmatched, second_unmatched = _unmatched([_canonical_key(value, keys) for value in first_resource],
+                                                   [_canonical_key(value, keys) for value in second_resource])
+
+    first_unmatched.sort(key=first_texts.__getitem__)
+    second_unmatched.sort(key=second_texts.__getitem__)
+
+    for index, other_index in zip(first_unmatched, second_unmatched):
+        item_path = '{0}[{1}]'.format(path, index)
+        for difference in _iter_item_diff(first_resource[index], second_resource[other_index], item_path, keys):
+            yield difference
+
+
+def _iter_item_diff(value, other_value, path, keys):
+    if isinstance(value, Mapping):
+        if not isinstance(other_value, Mapping):
+            # Unlike the values of a dict, the elements of a list are only equal to the elements of the same type,
+            # so an empty dict is different from None or ''
+            yield path, value, other_value
+            return
+        for difference in _iter_diff(value, other_value, path, keys):
+            yield difference
+    elif isinstance(value, list):
+        for difference in _iter_list_diff(value, other_value, path, keys):
+            yield difference
+    elif _standardize_value(value) != _standardize_value(other_value):
+        yield path, value, other_value
+
+
+def _unmatched(first_keys, second_keys):
+    """
+    Matches two lists of keys as multisets.
+
+    :return: Tuple (indexes of the first keys without a match, indexes of the second keys without a match)
+    """
+    first_counts = collections.Counter(first_keys)
+    second_counts = collections.Counter(second_keys)
+
+    return (_unmatched_indexes(first_keys, first_counts - second_counts),
+            _unmatched_indexes(second_keys, second_counts - first_counts))
+
+
+def _unmatched_indexes(keys, surplus):
+    unmatched = []
+    for index, key in enumerate(keys):
+        if surplus[key] > 0:
+            surplus[key] -= 1
+            unmatched.append(index)
+    return unmatched
+
+
+def diff(first_resource, second_resource, first_only=False, values=False):
+    """
+    Finds the differences between two dictionaries, with the rules of compare().
+
+    :arg dict first_resource: first dictionary
+    :arg dict second_resource: second dictionary
+    :arg bool first_only: Stops at the first difference
+    :arg bool values: Returns the values of the differences with their paths
+    :return: list: Paths of the differences, such as 'rules[0].frequency', empty when the dictionaries are equal.
+        A difference in the whole dictionary has the path ''. With values, tuples (path, first value, second value).
+    """
+    differences = _iter_diff(first_resource, second_resource, '', {})
+    differences = list(itertools.islice(differences, 1) if first_only else differences)
+
+    # The resources are only formatted when the debug messages are logged
+    if differences and logger.isEnabledFor(logging.DEBUG):
+        debug_resources = "resource1 = {0}, resource2 = {1}".format(first_resource, second_resource)
+        logger.debug(SimplivityModule.MSG_DIFF_AT_KEY.format(differences[0][0]) + debug_resources)
+
+    if values:
+        return differences
+    return [path for path, first_value, second_value in differences]
+
+
+def compare(first_resource, second_resource):
+    """
+    Recursively compares dictionary contents equivalence, ignoring types and elements order.
+    Particularities of the comparison:
+        - Inexistent key = None
+        - These values are considered equal: None, empty, False
+        - Lists are compared value by value after a sort, if they have same size.
+        - Each element is converted to str before the comparison.
+    :arg dict first_resource: first dictionary
+    :arg dict second_resource: second dictionary
+    :return: bool: True when equal, False when different.
+    """
+    return not diff(first_resource, second_resource, first_only=True)
 
 
 def compare_list(first_resource, second_resource):
@@ -171,45 +419,32 @@ def compare_list(first_resource, second_resource):
     Recursively compares lists contents equivalence, ignoring types and element orders.
     Lists with same size are compared value by value after a sort,
     each element is converted to str before the comparison.
+    None, empty and False elements are not equal, and a dict element is only equal to a dict.
     :arg list first_resource: first list
     :arg list second_resource: second list
     :return: True when equal; False when different.
     """
+    differences = _iter_list_diff(first_resource, second_resource, '', {})
+    return next(differences, None) is None
 
-    resource1 = first_resource
-    resource2 = second_resource
-
-    debug_resources = "resource1 = {0}, resource2 = {1}".format(resource1, resource2)
 
-    # The second list is null / empty  / False
-    if not resource2:
-        logger.debug("resource 2 is null. " + debug_resources)
-        return False
+def _json_size(value):
+    return len(json.dumps(value, default=to_native))
 
-    if len(resource1) != len(resource2):
-        logger.debug("resources have different length. " + debug_resources)
-        return False
 
-    resource1 = sorted(resource1, key=_str_sorted)
-    resource2 = sorted(resource2, key=_str_sorted)
+def _summarize_value(value):
+    """
+    Summarizes a value too big for the diff mode.
 
-    for i, val in enumerate(resource1):
-        if isinstance(val, collections.Mapping):
-            # change comparison function to compare dictionaries
-            if not compare(val, resource2[i]):
-                logger.debug("resources are different. " + debug_resources)
-                return False
-        elif isinstance(val, list):
-            # recursive call
-            if not compare_list(val, resource2[i]):
-                logger.debug("lists are different. " + debug_resources)
-                return False
-        elif _standardize_value(val) != _standardize_value(resource2[i]):
-            logger.debug("values are different. " + debug_resources)
-            return False
+    :return: str: Summary, such as '<list of 2000 items>'
+    """
+    if isinstance(value, Mapping):
+        return '<dict of {0} keys>'.format(len(value))
+    if isinstance(value, list):
+        return '<list of {0} items>'.format(len(value))
 
-    # no differences found
-    return True
+    text = to_native(value)
+    return text if len(text) <= 80 else text[:80] + '...'
 
 
 class SimplivityModuleException(Exception):
@@ -246,11 +481,13 @@ class SimplivityModuleTaskError(SimplivityModuleException):
     Attributes:
        msg (str): Exception message.
        error_code (str): A code which uniquely identifies the specific error.
+       result (dict): Return values sent along with the failure, such as the results of the tasks that succeeded.
     """
 
-    def __init__(self, msg, error_code=None):
+    def __init__(self, msg, error_code=None, result=None):
         super(SimplivityModuleTaskError, self).__init__(msg)
         self.error_code = error_code
+        self.result = result
 
 
 class SimplivityModuleValueError(SimplivityModuleException):
@@ -264,6 +501,145 @@ class SimplivityModuleValueError(SimplivityModuleException):
     pass
 
 
+DEFAULT_STATE_DIR = '~/.ansible/simplivity'
+BROKER_SOCKET_NAME = 'broker.sock'
+
+
+def get_state_dir(path=None, create=True):
+    """
+    Gets the directory where the SimpliVity modules keep the state shared between tasks, such as cached tokens.
+    It can be changed with the environment var SIMPLIVITY_STATE_DIR and it is created readable by the owner only.
+
+    :arg str path: Directory to use instead of the default one.
+    :arg bool create: Creates the directory when it does not exist.
+    :return: str: Directory path
+    """
+    path = os.path.expanduser(path or os.environ.get('SIMPLIVITY_STATE_DIR') or DEFAULT_STATE_DIR)
+    if create:
+        make_private_dirs(path)
+    return path
+
+
+def make_private_dirs(path):
+    """
+    Creates a directory readable by the owner only, along with its parents. A directory created meanwhile by a
+    parallel fork is kept.
+
+    :arg str path: Directory path
+    """
+    if os.path.isdir(path):
+        return
+
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+
+def get_broker_socket():
+    """
+    Gets the Unix socket of the OVC broker. It can be changed with the environment var SIMPLIVITY_BROKER_SOCKET.
+
+    :return: str: Socket path, or None when the broker is not running.
+    """
+    path = os.environ.get('SIMPLIVITY_BROKER_SOCKET') or os.path.join(get_state_dir(create=False), BROKER_SOCKET_NAME)
+    return path if os.path.exists(path) else None
+
+
+def load_json_file(path, default=None):
+    """
+    Loads a state file, a missing or corrupted file is returned as the default value.
+
+    :arg str path: File path
+    :arg default: Value returned when the file can not be read.
+    :return: File content
+    """
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+@contextlib.contextmanager
+def locked_file(path):
+    """
+    Holds an exclusive lock on the file '<path>.lock' while the context is active.
+    It serializes the access to a state file among parallel Ansible forks.
+
+    :arg str path: Path of the file to protect.
+    """
+    lock_fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+def dump_json_file(path, data):
+    """
+    Atomically replaces a state file content, so readers never see a partially written file.
+
+    :arg str path: File path
+    :arg data: JSON serializable content
+    """
+    directory, file_name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + file_name)
+    try:
+        with os.fdopen(fd, 'w') as json_file:
+            json.dump(data, json_file)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def dump_json_lines(path, records):
+    """
+    Writes records to a JSON Lines file, one JSON document per line, as they are iterated. The file is replaced once
+    all the records are written, so it is never left partially written.
+
+    :arg str path: File path
+    :arg iterable records: JSON serializable records
+    :return: dict: File path, count of records and SHA-1 checksum, as the checksum of the Ansible stat module
+    """
+    directory, file_name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + file_name)
+    checksum = hashlib.sha1()
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb') as json_lines_file:
+            for record in records:
+                line = (json.dumps(record) + '\n').encode('utf-8')
+                json_lines_file.write(line)
+                checksum.update(line)
+                count += 1
+
+        # mkstemp creates the file readable by its owner only, the output file has the default permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    return dict(path=path, count=count, checksum=checksum.hexdigest())
+
+
+def credentials_fingerprint(ovc_ip, username, password):
+    """
+    Gets a digest identifying OVC credentials without keeping the password.
+
+    :return: str: SHA-256 hex digest
+    """
+    credentials = '{0}\0{1}\0{2}'.format(ovc_ip, username, password)
+    return hashlib.sha256(credentials.encode('utf-8')).hexdigest()
+
+
 # @six.add_metaclass(abc.ABCMeta)
 class SimplivityModule(object):
     MSG_CREATED = 'Resource created successfully.'
@@ -272,16 +648,48 @@ class SimplivityModule(object):
     MSG_ALREADY_PRESENT = 'Resource is already present.'
     MSG_ALREADY_ABSENT = 'Resource is already absent.'
     MSG_DIFF_AT_KEY = 'Difference found at key \'{0}\'. '
+    MSG_DIFF_TRUNCATED = '{0} more differences not shown.'
     MSG_MANDATORY_FIELD_MISSING = 'Missing mandatory field: name'
     HPE_SIMPLIVITY_SDK_REQUIRED = 'HPE SimpliVity Python SDK is required for this module.'
 
+    MSG_OVC_CONFIG_MISSING = 'Missing OVC configuration: ovc_ip, username and password are required.'
+    MSG_OUTPUT_DIRECTORY_NOT_FOUND = 'The directory of the output_file does not exist: {0}'
+
     SIMPLIVITY_ARGS = dict(
         config=dict(type='path'),
         ovc_ip=dict(type='str'),
         password=dict(type='str', no_log=True),
-        username=dict(type='str')
+        username=dict(type='str'),
+        token_cache=dict(type='bool', fallback=(env_fallback, ['SIMPLIVITY_TOKEN_CACHE'])),
+        rate_limit=dict(type='bool', fallback=(env_fallback, ['SIMPLIVITY_RATE_LIMIT']))
     )
 
+    # Arguments shared by the facts modules
+    FACTS_ARGS = dict(
+        fields=dict(type='list'),
+        max_items=dict(type='int'),
+        page_size=dict(type='int'),
+        cache_ttl=dict(type='int', fallback=(env_fallback, ['SIMPLIVITY_FACTS_CACHE_TTL'])),
+        cache_refresh=dict(type='bool', default=False),
+        output_file=dict(type='path'),
+        output_format=dict(type='str', default='records', choices=['records', 'columnar'])
+    )
+
+    # Arguments of the facts modules gathering performance metrics
+    METRICS_ARGS = dict(
+        metrics=dict(type='bool', default=False),
+        metrics_range=dict(type='int', default=43200),
+        metrics_resolution=dict(type='str', default='MINUTE', choices=['SECOND', 'MINUTE', 'HOUR', 'DAY']),
+        metrics_time_offset=dict(type='int', default=0),
+        metrics_aggregations=dict(type='list', default=[], choices=['min', 'max', 'avg', 'p95'])
+    )
+
+    # Same as the SDK get_all default limit
+    DEFAULT_PAGE_SIZE = 500
+
+    # Maximum size of the values of the diff mode, as JSON text
+    DIFF_MAX_SIZE = 16384
+
     def __init__(self, additional_arg_spec=None):
         """
         SimplivityModuleBase constructor.
@@ -299,6 +707,7 @@ class SimplivityModule(object):
         self.data = self.module.params.get('data')
 
         self._check_simplivity_sdk()
+        self._load_cached_facts()
         self._create_simplivity_client()
 
         # Preload params for get_all - used by facts
@@ -330,16 +739,201 @@ class SimplivityModule(object):
         """
         Creates Simplivity client object using module prams/env variables/config file
         """
-        if self.module.params.get('ovc_ip'):
+        persistent_socket = getattr(self.module, '_socket_path', None)
+
+        if isinstance(persistent_socket, six.string_types):
+            # The task runs through the 'simplivity' httpapi plugin, no OVC configuration is needed
+            from ansible.module_utils.simplivity_connection import OVCSession, PersistentConnection
+
+            self.ovc_client = OVCSession(PersistentConnection(persistent_socket))
+            return
+
+        broker_session = self._create_broker_session()
+
+        if broker_session:
+            self.ovc_client = broker_session
+
+        elif self.module.params.get('token_cache') or self.module.params.get('rate_limit'):
+            self.ovc_client = self._create_ovc_session(token_cache=self.module.params.get('token_cache'),
+                                                       rate_limit=self.module.params.get('rate_limit'))
+
+        elif self.module.params.get('ovc_ip'):
             config = dict(ip=self.module.params['ovc_ip'],
                           credentials=dict(username=self.module.params['username'],
                                            password=self.module.params['password']))
-            self.ovc_client = OVC(config)
+            self.ovc_client = _import_ovc_client()(config)
+
+        elif not self.module.params['config']:
+            self.ovc_client = _import_ovc_client().from_environment_variables()
+        else:
+            self.ovc_client = _import_ovc_client().from_json_file(self.module.params['config'])
 
+    def _get_ovc_identity(self):
+        """
+        Gets the OVC used by the module, without connecting to it.
+
+        :return: Tuple (OVC IP, username, credentials fingerprint), the fingerprint is None when the httpapi
+            plugin holds the credentials.
+        """
+        persistent_socket = getattr(self.module, '_socket_path', None)
+
+        if isinstance(persistent_socket, six.string_types):
+            from ansible.module_utils.connection import Connection
+
+            connection = Connection(persistent_socket)
+            return connection.get_option('host'), connection.get_option('remote_user'), None
+
+        config = self._get_ovc_config()
+        username, password = config['credentials']['username'], config['credentials']['password']
+        return config['ip'], username, credentials_fingerprint(config['ip'], username, password)
+
+    def _load_cached_facts(self):
+        """
+        Exits with the cached facts when the module enables the facts cache with cache_ttl and they are found,
+        before connecting to the OVC. Otherwise, the facts gathered by the module are cached when it exits.
+        """
+        self.facts_cache = None
+
+        # The changes since a watermark are different on every run, and the output file is written on every run
+        if not self.module.params.get('cache_ttl') or self.module.params.get('since') or self.module.params.get('output_file'):
+            return
+
+        from ansible.module_utils.simplivity_facts_cache import FactsCache
+
+        ovc_ip, username, fingerprint = self._get_ovc_identity()
+        # The query is made of the module params, apart from the OVC configuration and the cache options
+        query = dict((name, value) for name, value in self.module.params.items()
+                     if name not in self.SIMPLIVITY_ARGS and not name.startswith('cache_'))
+
+        self.facts_cache = FactsCache()
+        self.facts_cache_key = FactsCache.key(ovc_ip, username, fingerprint, type(self).__name__, query)
+        # Read before gathering the facts, so an OVC change made meanwhile makes them stale
+        self.facts_cache_generation = self.facts_cache.generation(ovc_ip)
+
+        if not self.module.params.get('cache_refresh'):
+            facts = self.facts_cache.get(self.facts_cache_key, self.facts_cache_generation)
+            if facts is not None:
+                self.module.exit_json(changed=False, ansible_facts=facts)
+
+    def _invalidate_cached_facts(self):
+        """
+        Makes the cached facts of the OVC stale, after the module changed it.
+        """
+        from ansible.module_utils.simplivity_facts_cache import FactsCache
+
+        if FactsCache.exists():
+            FactsCache().invalidate(self._get_ovc_identity()[0])
+
+    def _get_ovc_config(self):
+        """
+        Gets the OVC configuration from module params/env variables/config file,
+        following the same precedence of the client creation.
+
+        :return: dict: OVC configuration in the SDK format (ip, credentials, ssl_certificate, timeout)
+        """
+        if self.module.params.get('ovc_ip'):
+            config = dict(ip=self.module.params['ovc_ip'],
+                          credentials=dict(username=self.module.params['username'],
+                                           password=self.module.params['password']))
         elif not self.module.params['config']:
-            self.ovc_client = OVC.from_environment_variables()
+            config = dict(ip=os.environ.get('SIMPLIVITYSDK_OVC_IP'),
+                          credentials=dict(username=os.environ.get('SIMPLIVITYSDK_USERNAME'),
+                                           password=os.environ.get('SIMPLIVITYSDK_PASSWORD')),
+                          ssl_certificate=os.environ.get('SIMPLIVITYSDK_SSL_CERTIFICATE'),
+                          timeout=os.environ.get('SIMPLIVITYSDK_CONNECTION_TIMEOUT'))
         else:
-            self.ovc_client = OVC.from_json_file(self.module.params['config'])
+            config = load_json_file(self.module.params['config'], default={})
+
+        credentials = config.get('credentials') or {}
+        if not (config.get('ip') and credentials.get('username') and credentials.get('password')):
+            self.module.fail_json(msg=self.MSG_OVC_CONFIG_MISSING)
+
+        return config
+
+    def _create_ovc_session(self, token_cache=False, rate_limit=False):
+        """
+        Creates an OVCSession, the client used when the token is shared among tasks or the rate of requests is limited.
+
+        :arg bool token_cache: Shares the access token through the on-disk token cache.
+        :arg bool rate_limit: Limits the rate of requests to the OVC, shared with the other tasks.
+        """
+        from ansible.module_utils.simplivity_connection import OVCConnection, OVCSession, RateLimiter, TokenCache
+
+        config = self._get_ovc_config()
+        connection = OVCConnection(config['ip'],
+                                   config['credentials']['username'],
+                                   config['credentials']['password'],
+                                   ssl_certificate=config.get('ssl_certificate'),
+                                   timeout=config.get('timeout'),
+                                   token_cache=TokenCache() if token_cache else None,
+                                   rate_limiter=RateLimiter(config['ip']) if rate_limit else None)
+        return OVCSession(connection)
+
+    def _create_broker_session(self):
+        """
+        Creates an OVCSession that sends the requests through the OVC broker, with the rate limit of the module.
+
+        :return: OVCSession, or None when the broker is not running.
+        """
+        socket_path = get_broker_socket()
+        if not socket_path:
+            return None
+
+        from ansible.module_utils.simplivity_connection import BrokerConnection, OVCSession, RateLimiter
+
+        config = self._get_ovc_config()
+        try:
+            connection = BrokerConnection(socket_path,
+                                          config['ip'],
+                                          config['credentials']['username'],
+                                          config['credentials']['password'],
+                                          ssl_certificate=config.get('ssl_certificate'),
+                                          timeout=config.get('timeout'),
+                                          rate_limiter=RateLimiter(config['ip']) if self.module.params.get('rate_limit') else None)
+        except (IOError, OSError):
+            logger.debug("OVC broker not reachable at '{0}', connecting directly".format(socket_path))
+            return None
+
+        return OVCSession(connection)
+
+    def _create_connection_factory(self):
+        """
+        Gets a function creating connections to the OVC, one for each thread sending requests at the same time.
+        The connections go through the httpapi plugin or the OVC broker, like the client of the module, or
+        share one access token, so the task logs in once.
+
+        :return: callable: Function without arguments returning an OVCConnection
+        """
+        persistent_socket = getattr(self.module, '_socket_path', None)
+
+        if isinstance(persistent_socket, six.string_types):
+            from ansible.module_utils.simplivity_connection import PersistentConnection
+
+            return lambda: PersistentConnection(persistent_socket)
+
+        from ansible.module_utils.simplivity_connection import (BrokerConnection,
+                                                                OVCConnection,
+                                                                RateLimiter,
+                                                                SharedTokenCache,
+                                                                TokenCache)
+
+        config = self._get_ovc_config()
+        args = (config['ip'], config['credentials']['username'], config['credentials']['password'])
+        kwargs = dict(ssl_certificate=config.get('ssl_certificate'), timeout=config.get('timeout'))
+
+        rate_limiter = RateLimiter(config['ip']) if self.module.params.get('rate_limit') else None
+
+        socket_path = get_broker_socket()
+        if socket_path:
+            try:
+                BrokerConnection(socket_path, *args, **kwargs).close()
+            except (IOError, OSError):
+                logger.debug("OVC broker not reachable at '{0}', connecting directly".format(socket_path))
+            else:
+                return lambda: BrokerConnection(socket_path, *args, rate_limiter=rate_limiter, **kwargs)
+
+        token_cache = SharedTokenCache(TokenCache() if self.module.params.get('token_cache') else None)
+        return lambda: OVCConnection(*args, token_cache=token_cache, rate_limiter=rate_limiter, **kwargs)
 
     def set_resource_object(self, resource_client):
         """
@@ -355,12 +949,134 @@ class SimplivityModule(object):
             name = self.module.params["name"]
 
         if name:
+            from simplivity.exceptions import HPESimpliVityResourceNotFound
+
             try:
                 self.active_resource = self.resource_client.get_by_name(name)
             except HPESimpliVityResourceNotFound:
                 logger.debug("Resource not found")
         return
 
+    def get_all_resources(self, **params):
+        """
+        Gets the resources matching the facts params, as a generator.
+
+        When max_items, page_size or output_file is set, the resources are requested page by page, using the params
+        offset as the first one. Each page is yielded as soon as it arrives, and the requests stop at the last page,
+        at max_items or at the params limit. Otherwise, it makes a single get_all call, like the SDK.
+
+        The fields option is sent as the REST API fields parameter.
+
+        :arg params: get_all params overriding the facts params, the filters are added to the facts params filters.
+            The max_items param overrides the option, the page_size param is used when the option is not set.
+        :return: generator: Resource objects
+        """
+        max_items = params.pop('max_items', self.module.params.get('max_items'))
+        page_size = params.pop('page_size', None)
+        filters = params.pop('filters', None)
+        params = dict(self.facts_params, **params)
+        if filters:
+            params['filters'] = dict(params.get('filters') or {}, **filters)
+
+        fields = self.module.params.get('fields')
+        if fields and not params.get('fields'):
+            # Only the needed fields are transferred, the REST API does the projection
+            if self.module.params.get('metrics'):
+                # The metrics are requested by id and keyed by name
+                fields = fields + [field for field in ('id', 'name') if field not in fields]
+            params['fields'] = ','.join(fields)
+
+        page_size = self.module.params.get('page_size') or page_size
+
+        if not (max_items or page_size or self.module.params.get('output_file')):
+            for resource in self.resource_client.get_all(**params):
+                yield resource
+            return
+
+        # The SDK pagination object is replaced by the pages below
+        params.pop('pagination', None)
+        page_size = page_size or self.DEFAULT_PAGE_SIZE
+        offset = params.pop('offset', None) or 0
+        remaining = [count for count in (max_items, params.pop('limit', None)) if count]
+        remaining = min(remaining) if remaining else None
+
+        while remaining is None or remaining > 0:
+            limit = page_size if remaining is None else min(page_size, remaining)
+            page = self.resource_client.get_all(limit=limit, offset=offset, **params)
+
+            for resource in page:
+                yield resource
+
+            if len(page) < limit:
+                return
+
+            offset += len(page)
+            if remaining is not None:
+                remaining -= len(page)
+
+    def get_facts_data(self, resource):
+        """
+        Gets the data of a resource for the facts, with the fields option only.
+
+        The projection also applies to the resources that are not requested with the REST API fields
+        parameter, such as the ones found by name.
+
+        :arg Resource resource: Resource object
+        :return: dict: Resource data
+        """
+        return project_fields(resource.data, self.module.params.get('fields'))
+
+    def get_records_facts(self, name, records):
+        """
+        Gets the facts of a list of records, such as the data of the resources.
+
+        When output_file is set, the records are written to it in JSON Lines format as they are iterated, instead of
+        being returned in the facts, and the facts only have the path, count and checksum of the file in
+        <name>_output_file, such as backups_output_file.
+        Otherwise, with the columnar output_format, the facts have the records converted by to_columnar().
+
+        :arg str name: Name of the facts, such as backups
+        :arg iterable records: Records, such as a generator of the data of the resources
+        :return: dict: Facts
+        """
+        output_file = self.module.params.get('output_file')
+        if output_file:
+            directory = os.path.dirname(os.path.abspath(output_file))
+            if not os.path.isdir(directory):
+                raise SimplivityModuleValueError(self.MSG_OUTPUT_DIRECTORY_NOT_FOUND.format(directory))
+            return {name + '_output_file': dump_json_lines(output_file, records)}
+
+        if self.module.params.get('output_format') == 'columnar':
+            return {name: to_columnar(records)}
+
+        return {name: list(records)}
+
+    def get_metrics_facts(self, resource_url, resources):
+        """
+        Gets the performance metrics of resources in columnar form: the timestamps and one list of values per
+        metric, such as iops_reads, with the aggregations requested by metrics_aggregations.
+
+        :arg str resource_url: URL of the resources, such as /hosts
+        :arg list resources: Resource objects
+        :return: list: One dict per resource, with its id, name, timestamps, columns and aggregations
+        """
+        from ansible.module_utils.simplivity_metrics import aggregate, get_metrics, to_columns
+
+        aggregations = self.module.params.get('metrics_aggregations')
+        facts = []
+        for resource in resources:
+            metrics = get_metrics(self.ovc_client.connection, resource_url, resource.data['id'],
+                                  self.module.params['metrics_range'], self.module.params['metrics_resolution'],
+                                  self.module.params.get('metrics_time_offset') or 0)
+            timestamps, columns = to_columns(metrics)
+            resource_metrics = dict(id=resource.data['id'], name=resource.data.get('name'),
+                                    timestamps=timestamps, columns=columns)
+            if aggregations:
+                resource_metrics['aggregations'] = aggregate(columns, aggregations)
+            facts.append(resource_metrics)
+
+        return facts
+
     @abc.abstractmethod
     def execute_module(self):
         """
@@ -391,11 +1107,22 @@ class SimplivityModule(object):
             if "changed" not in result:
                 result['changed'] = False
 
+            if self.facts_cache and 'ansible_facts' in result:
+                self.facts_cache.set(self.facts_cache_key, self.facts_cache_generation,
+                                     self.module.params['cache_ttl'], result['ansible_facts'])
+
+            if result['changed']:
+                self._invalidate_cached_facts()
+
             self.module.exit_json(**result)
 
         except SimplivityModuleException as exception:
+            # The modules with a state may have partially changed the OVC
+            if self.state:
+                self._invalidate_cached_facts()
+
             error_msg = '; '.join(to_native(e) for e in exception.args)
-            self.module.fail_json(msg=error_msg, exception=traceback.format_exc())
+            self.module.fail_json(msg=error_msg, exception=traceback.format_exc(), **(getattr(exception, 'result', None) or {}))
 
     def resource_absent(self, method='delete'):
         """
@@ -434,15 +1161,19 @@ class SimplivityModule(object):
             self.active_resource = getattr(self.resource_client, create_method)(self.data)
             msg = self.MSG_CREATED
             changed = True
+            differences = diff({}, self.active_resource.data, values=True) if self.module._diff else None
         else:
-            changed, msg = self._update_resource()
+            changed, msg, differences = self._update_resource()
 
         data = self.active_resource.data
-        return dict(
+        result = dict(
             msg=msg,
             changed=changed,
             ansible_facts={fact_name: data}
         )
+        if changed and differences:
+            result['diff'] = self.build_diff(differences)
+        return result
 
     def _update_resource(self):
         """
@@ -451,17 +1182,55 @@ class SimplivityModule(object):
         It updates the resource if the requested configuration is
         different from the current configuration.
 
-        :return: Tuple (change flag, message)
+        In diff mode, all the differences are found by the same traversal, which otherwise stops at the first one.
+
+        :return: Tuple (change flag, message, differences with their values, None when not in diff mode)
         """
         updated_data = self.active_resource.data.copy()
         updated_data.update(self.data)
         changed = False
 
-        if compare(self.active_resource.data, updated_data):
+        if self.module._diff:
+            differences = diff(self.active_resource.data, updated_data, values=True)
+            equal = not differences
+        else:
+            differences = None
+            equal = compare(self.active_resource.data, updated_data)
+
+        if equal:
             msg = self.MSG_ALREADY_PRESENT
         else:
             self.active_resource.update(updated_data)
             changed = True
             msg = self.MSG_UPDATED
 
-        return (changed, msg)
+        return (changed, msg, differences)
+
+    def build_diff(self, differences):
+        """
+        Builds the diff returned in diff mode, with the before and after values keyed by the paths of the differences.
+
+        The values are kept up to DIFF_MAX_SIZE characters of JSON text. A bigger value is replaced by a summary,
+        and the differences past the limit are only counted.
+
+        :arg list differences: Differences returned by diff() with their values
+        :return: dict: Diff with before and after
+        """
+        before, after = {}, {}
+        size = 0
+
+        for index, (path, before_value, after_value) in enumerate(differences):
+            if size >= self.DIFF_MAX_SIZE:
+                after['...'] = self.MSG_DIFF_TRUNCATED.format(len(differences) - index)
+                break
+
+            path = path or '.'
+            entry_size = len(path) + _json_size(before_value) + _json_size(after_value)
+            if size + entry_size > self.DIFF_MAX_SIZE:
+                before_value, after_value = _summarize_value(before_value), _summarize_value(after_value)
+                entry_size = len(path) + _json_size(before_value) + _json_size(after_value)
+
+            before[path], after[path] = before_value, after_value
+            size += entry_size
+
+        return dict(before=before, after=after)
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Long-lived OVC broker.
+
+It keeps authenticated keep-alive HTTPS connections per OVC and serves the SimpliVity modules through a
+Unix domain socket, so the tasks do not pay the TLS handshake and the login. The modules use it whenever
+the socket exists and connect directly to the OVC otherwise.
+
+Usage:
+    PYTHONPATH=$ANSIBLE_LIBRARY python -m module_utils.simplivity_broker [--socket PATH] [--idle-timeout SECONDS]
+
+Protocol: each request and reply is a JSON document on a single line.
+    request: {"ovc": {"ip", "username", "password", "ssl_certificate", "timeout"},
+              "method", "path", "body", "headers"}
+    reply: {"status", "body"} or {"error"} or {"authentication_error"}
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from ansible.module_utils.six.moves import socketserver
+from ansible.module_utils._text import to_native
+
+from module_utils import simplivity
+
+# The broker runs outside of Ansible, the module_utils are imported from the library directory
+sys.modules.setdefault('ansible.module_utils.simplivity', simplivity)
+
+from module_utils.simplivity import BROKER_SOCKET_NAME, credentials_fingerprint, get_logger, get_state_dir
+from module_utils.simplivity_connection import HPESimpliVityAuthenticationError, OVCConnection, TokenCache
+
+
+logger = get_logger(__file__)
+
+
+class _BrokerRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the requests of one module process, until it closes the socket.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+                status, body = self.server.forward(request)
+                reply = dict(status=status, body=body)
+            except HPESimpliVityAuthenticationError as error:
+                reply = dict(authentication_error=to_native(error))
+            except Exception as error:
+                logger.debug("Request failed: {0}".format(error))
+                reply = dict(error=to_native(error))
+
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class OVCBroker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server holding a pool of OVC connections.
+
+    Connections are pooled by OVC IP and credentials. A module request borrows an idle connection, or a new one
+    when all of them are busy, and gives it back when the reply is received. Connections share the access
+    token through the token cache, so the OVC login only happens when the token expires.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, connection_class=OVCConnection, token_cache=None, pool_size=4):
+        """
+        OVCBroker constructor, it binds the socket readable by the owner only.
+
+        :arg str socket_path: Unix socket path
+        :arg class connection_class: Class of the OVC connections
+        :arg TokenCache token_cache: Cache used to share the access tokens
+        :arg int pool_size: Maximum number of idle connections kept per OVC
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        socketserver.UnixStreamServer.__init__(self, socket_path, _BrokerRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+        self.socket_path = socket_path
+        self.connection_class = connection_class
+        self.token_cache = token_cache
+        self.pool_size = pool_size
+        self.last_activity = time.time()
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, ovc):
+        key = (ovc['ip'], ovc['username'], credentials_fingerprint(ovc['ip'], ovc['username'], ovc['password']))
+
+        with self._lock:
+            self.last_activity = time.time()
+            idle = self._idle_connections.setdefault(key, [])
+            if idle:
+                return key, idle.pop()
+
+        logger.debug("Opening a new connection to the OVC '{0}'".format(ovc['ip']))
+        connection = self.connection_class(ovc['ip'], ovc['username'], ovc['password'],
+                                           ssl_certificate=ovc.get('ssl_certificate'),
+                                           timeout=ovc.get('timeout'),
+                                           token_cache=self.token_cache)
+        return key, connection
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            idle = self._idle_connections[key]
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def forward(self, request):
+        """
+        Sends a module request to the OVC.
+
+        :arg dict request: Request received from the module
+        :return: Tuple (HTTP status, response body)
+        """
+        key, connection = self._checkout(request['ovc'])
+        try:
+            return connection.request(request['method'], request['path'], request.get('body') or '',
+                                      request.get('headers'))
+        finally:
+            self._checkin(key, connection)
+
+    def serve(self, idle_timeout=None):
+        """
+        Serves the modules until shutdown() is called or no request arrives for idle_timeout seconds.
+
+        :arg float idle_timeout: Seconds without requests before stopping, None to run forever.
+        """
+        if idle_timeout:
+            watchdog = threading.Thread(target=self._stop_when_idle, args=(idle_timeout,))
+            watchdog.daemon = True
+            watchdog.start()
+
+        try:
+            self.serve_forever()
+        finally:
+            self.close()
+
+    def _stop_when_idle(self, idle_timeout):
+        while time.time() - self.last_activity < idle_timeout:
+            time.sleep(min(idle_timeout, 1))
+        logger.debug("No requests for {0} seconds, stopping".format(idle_timeout))
+        self.shutdown()
+
+    def close(self):
+        """
+        Closes the socket and all the pooled connections.
+        """
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        with self._lock:
+            for idle in self._idle_connections.values():
+                for connection in idle:
+                    connection.close()
+            self._idle_connections.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-lived OVC broker for the SimpliVity Ansible modules.')
+    parser.add_argument('--socket', default=os.environ.get('SIMPLIVITY_BROKER_SOCKET'),
+                        help='Unix socket path. Default: $SIMPLIVITY_STATE_DIR/' + BROKER_SOCKET_NAME)
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help='Stops after this number of seconds without requests.')
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help='Maximum number of idle connections kept per OVC.')
+    args = parser.parse_args()
+
+    socket_path = args.socket or os.path.join(get_state_dir(), BROKER_SOCKET_NAME)
+    broker = OVCBroker(socket_path, token_cache=TokenCache(), pool_size=args.pool_size)
+
+    # serve_forever must be stopped from another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=broker.shutdown).start())
+    broker.serve(args.idle_timeout)
+
+
+if __name__ == '__main__':
+    main()
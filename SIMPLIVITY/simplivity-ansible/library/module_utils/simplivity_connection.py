@@ -0,0 +1,709 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Connections to the OVC REST API used when the OAuth token is shared among tasks: the token cache, the OVC broker
+and the httpapi persistent connection, or when the rate of requests is limited.
+
+This module is only imported when one of them is in use, so the tasks connecting through the SimpliVity SDK do
+not load and compile it.
+"""
+
+import errno
+import json
+import os
+import socket
+import ssl
+import threading
+import time
+import traceback
+
+from base64 import b64encode
+
+from simplivity.exceptions import HPESimpliVityAuthenticationError, HPESimpliVityException
+
+from ansible.module_utils._text import to_native
+from ansible.module_utils.connection import Connection, ConnectionError as PersistentConnectionError
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.simplivity import (credentials_fingerprint,
+                                             dump_json_file,
+                                             get_logger,
+                                             get_state_dir,
+                                             load_json_file,
+                                             locked_file)
+
+
+logger = get_logger(__file__)
+
+
+class TokenCache(object):
+    """
+    OAuth access tokens shared by all the tasks running on the controller.
+
+    Tokens are kept in a state file keyed by OVC IP and username, along with their expiration time.
+    The file is locked during the lookup, so when the token is missing or expired only one of the
+    parallel forks logs in and the others reuse its token.
+    """
+    FILE_NAME = 'tokens.json'
+    # The OVC revokes tokens unused for 10 minutes, regardless of its expires_in value
+    IDLE_TIMEOUT = 600
+    # Tokens about to expire are renewed before being handed to a task
+    EXPIRATION_MARGIN = 60
+
+    def __init__(self, directory=None):
+        self.path = os.path.join(get_state_dir(directory), self.FILE_NAME)
+
+    @staticmethod
+    def _key(ovc_ip, username):
+        return '{0}|{1}'.format(ovc_ip, username)
+
+    def _is_valid(self, entry, now):
+        expires_at = min(entry['expires_at'], entry['last_used'] + self.IDLE_TIMEOUT)
+        return expires_at - self.EXPIRATION_MARGIN > now
+
+    def _load(self, now):
+        tokens = load_json_file(self.path, default={})
+        return dict((key, entry) for key, entry in tokens.items() if self._is_valid(entry, now))
+
+    def get_token(self, ovc_ip, username, password, login):
+        """
+        Gets a valid access token for the credentials, it only calls login when no valid token is cached.
+
+        :arg str ovc_ip: OVC IP
+        :arg str username: OVC username
+        :arg str password: OVC password
+        :arg callable login: Function that authenticates against the OVC, it must return
+            a tuple (access token, expiration in seconds).
+        :return: str: Access token
+        """
+        key = self._key(ovc_ip, username)
+        # Binds the token to the password, so wrong credentials never get a cached token
+        fingerprint = credentials_fingerprint(ovc_ip, username, password)
+
+        with locked_file(self.path):
+            now = time.time()
+            tokens = self._load(now)
+            entry = tokens.get(key)
+
+            if entry and entry['fingerprint'] == fingerprint:
+                logger.debug("Reusing cached token for '{0}'".format(key))
+                entry['last_used'] = now
+            else:
+                token, expires_in = login()
+                entry = dict(token=token, fingerprint=fingerprint, expires_at=now + expires_in, last_used=now)
+                tokens[key] = entry
+
+            dump_json_file(self.path, tokens)
+
+        return entry['token']
+
+    def invalidate(self, ovc_ip, username, token):
+        """
+        Removes a token rejected by the OVC. It is kept when another task has already replaced it.
+
+        :arg str ovc_ip: OVC IP
+        :arg str username: OVC username
+        :arg str token: Rejected access token
+        """
+        key = self._key(ovc_ip, username)
+
+        with locked_file(self.path):
+            tokens = self._load(time.time())
+            if key in tokens and tokens[key]['token'] == token:
+                del tokens[key]
+                dump_json_file(self.path, tokens)
+
+
+class SharedTokenCache(object):
+    """
+    Access token shared by the connections of the threads of a task, with the same interface as TokenCache.
+
+    Only the first thread logs in, the others wait for its token. With a TokenCache, the token is also shared with
+    the other tasks.
+    """
+
+    def __init__(self, token_cache=None):
+        """
+        SharedTokenCache constructor.
+
+        :arg TokenCache token_cache: On-disk token cache the token comes from, when the task shares it.
+        """
+        self._token_cache = token_cache
+        self._token = None
+        self._lock = threading.Lock()
+
+    def get_token(self, ovc_ip, username, password, login):
+        """
+        Gets the shared access token, it only calls login when there is no token yet.
+
+        :return: str: Access token
+        """
+        with self._lock:
+            if self._token is None:
+                if self._token_cache:
+                    self._token = self._token_cache.get_token(ovc_ip, username, password, login)
+                else:
+                    self._token = login()[0]
+            return self._token
+
+    def invalidate(self, ovc_ip, username, token):
+        """
+        Removes a token rejected by the OVC. It is kept when another thread has already replaced it.
+        """
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                if self._token_cache:
+                    self._token_cache.invalidate(ovc_ip, username, token)
+
+
+class RateLimiter(object):
+    """
+    Token bucket limiting the rate of the requests sent to an OVC by all the tasks running on the controller.
+
+    The bucket of each OVC is kept in a state file, locked while a request takes its token, so the parallel forks
+    share it. The allowed rate adapts to the OVC, AIMD-style: it is multiplied by MULTIPLICATIVE_DECREASE when a
+    request is throttled, fails, or takes longer than TARGET_LATENCY, and grows by ADDITIVE_INCREASE requests per
+    second every second while the OVC answers fast. Until the first decrease, it doubles every second instead.
+    """
+    FILE_NAME = 'rate_limits.json'
+    INITIAL_RATE = 10.0
+    MIN_RATE = 0.5
+    MAX_RATE = 100.0
+    # Requests per second the rate grows by every second without congestion
+    ADDITIVE_INCREASE = 5.0
+    MULTIPLICATIVE_DECREASE = 0.5
+    # Seconds above which a response is a sign of the OVC queueing the requests
+    TARGET_LATENCY = 2.0
+    # Seconds of requests sent at once after an idle time, a larger burst is throttled by the OVC
+    BURST = 0.1
+    # Round trip assumed until the OVC answers, as the TCP initial retransmission timeout
+    INITIAL_LATENCY = 1.0
+    # Seconds after which an unused bucket starts again from INITIAL_RATE
+    IDLE_TIMEOUT = 3600
+
+    def __init__(self, ovc_ip, directory=None):
+        """
+        RateLimiter constructor.
+
+        :arg str ovc_ip: OVC IP, each OVC has its own bucket.
+        :arg str directory: State directory to use instead of the default one.
+        """
+        self.ovc_ip = ovc_ip
+        self.path = os.path.join(get_state_dir(directory), self.FILE_NAME)
+
+    def _update(self, update):
+        """
+        Updates the bucket of the OVC while the state file is locked.
+
+        :arg callable update: Function called with the bucket and the current time, returning its result.
+        """
+        with locked_file(self.path):
+            now = time.time()
+            buckets = load_json_file(self.path, default={})
+            bucket = buckets.get(self.ovc_ip)
+            if not bucket or bucket['updated_at'] + self.IDLE_TIMEOUT < now:
+                bucket = dict(rate=self.INITIAL_RATE, tokens=1.0, updated_at=now, latency=self.INITIAL_LATENCY,
+                              slow_start=True, recovery_until=0)
+
+            # Refills the tokens at the current rate, up to the burst
+            bucket['tokens'] = min(max(bucket['rate'] * self.BURST, 1.0),
+                                   bucket['tokens'] + (now - bucket['updated_at']) * bucket['rate'])
+            bucket['updated_at'] = now
+            result = update(bucket, now)
+
+            buckets[self.ovc_ip] = bucket
+            dump_json_file(self.path, buckets)
+
+        return result
+
+    def acquire(self):
+        """
+        Takes a token for a request, waiting until the bucket has one. The token is reserved before waiting, so
+        the tasks waiting at the same time are spread over the following tokens.
+
+        :return: float: Seconds waited
+        """
+        def take(bucket, now):
+            bucket['tokens'] -= 1
+            return -bucket['tokens'] / bucket['rate'] if bucket['tokens'] < 0 else 0
+
+        wait = self._update(take)
+        if wait:
+            logger.debug("Waiting {0:.3f}s for the rate limit of the OVC '{1}'".format(wait, self.ovc_ip))
+            time.sleep(wait)
+        return wait
+
+    def record(self, latency, congested=False):
+        """
+        Adapts the rate to a response of the OVC.
+
+        :arg float latency: Seconds the request took
+        :arg bool congested: Whether the OVC throttled the request or failed to answer it
+        """
+        def adapt(bucket, now):
+            if congested or latency > self.TARGET_LATENCY:
+                # The requests reserved before a decrease are still spaced at the previous rate, so the rate is
+                # only decreased again once they are answered, as in the TCP fast recovery
+                if now > bucket['recovery_until']:
+                    reserved = max(0.0, -bucket['tokens'])
+                    bucket['recovery_until'] = now + reserved / bucket['rate'] + bucket['latency']
+                    bucket['rate'] = max(self.MIN_RATE, bucket['rate'] * self.MULTIPLICATIVE_DECREASE)
+                    bucket['tokens'] = min(bucket['tokens'], 0.0)
+                    bucket['slow_start'] = False
+                    logger.debug("Rate limit of the OVC '{0}' decreased to {1:.2f}/s".format(self.ovc_ip,
+                                                                                             bucket['rate']))
+                return
+
+            # Round trip of the requests answered, smoothed as the TCP one
+            bucket['latency'] = 0.875 * bucket['latency'] + 0.125 * latency
+            if bucket['slow_start']:
+                # As TCP, until the first congestion each response increases the rate by one, so it doubles every
+                # second
+                bucket['rate'] = min(self.MAX_RATE, bucket['rate'] + 1)
+            else:
+                # About rate responses per second, each one increasing the rate by a fraction of the increase
+                bucket['rate'] = min(self.MAX_RATE, bucket['rate'] + self.ADDITIVE_INCREASE / bucket['rate'])
+
+        self._update(adapt)
+
+
+class OVCConnection(object):
+    """
+    Connection to the OVC REST API, compatible with simplivity.connection.Connection.
+
+    Differences from the SDK connection:
+        - The HTTPS connection is kept alive between requests.
+        - The access token may come from a TokenCache instead of a new login.
+        - A request rejected with 401 triggers a new login and is retried once.
+        - With a RateLimiter, the requests wait for their turn, and the throttled ones are sent again.
+    """
+    API_PATH = '/api'
+    LOGIN_URL = '/oauth/token'
+    ACCEPT = 'application/vnd.simplivity.v1+json'
+    CONTENT_TYPE = 'application/vnd.simplivity.v1.8+json'
+    # Errors of a keep-alive connection closed by the OVC while it was idle
+    CLOSED_CONNECTION_ERRNOS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+    # Used when the login response does not inform the token lifetime
+    DEFAULT_TOKEN_LIFETIME = 600
+    # Responses of an OVC busy with other requests
+    THROTTLED_STATUSES = (429, 503)
+    # Times a throttled request is sent again with a RateLimiter
+    MAX_THROTTLED_RETRIES = 5
+
+    def __init__(self, ovc_ip, username, password, ssl_certificate=None, timeout=None, token_cache=None,
+                 rate_limiter=None):
+        """
+        OVCConnection constructor.
+
+        :arg str ovc_ip: OVC IP
+        :arg str username: OVC username
+        :arg str password: OVC password
+        :arg str ssl_certificate: Trusted CA bundle, the OVC certificate is not verified when it is not provided.
+        :arg float timeout: Connection timeout in seconds.
+        :arg TokenCache token_cache: Cache used to share the access token with other tasks.
+        :arg RateLimiter rate_limiter: Limiter of the rate of requests shared with other tasks.
+        """
+        self.ovc_ip = ovc_ip
+        self.username = username
+        self._password = password
+        self._ssl_certificate = ssl_certificate
+        self._timeout = float(timeout) if timeout else None
+        self._token_cache = token_cache
+        self._rate_limiter = rate_limiter
+        self._access_token = None
+        self._http = None
+
+    def get(self, url):
+        """
+        Calls the GET http method.
+
+        :arg str url: Resource URL
+        :return: dict: Response body
+        """
+        status, body = self.request('GET', url)
+        if status >= 400:
+            raise HPESimpliVityException(body)
+        return body
+
+    def post(self, uri, body, custom_headers=None):
+        """
+        Calls the POST http method.
+
+        :return: Tuple (task, response body), task is None when the OVC did not start a task.
+        """
+        return self._do_rest_call('POST', uri, body, custom_headers)
+
+    def put(self, uri, body, custom_headers=None):
+        """
+        Calls the PUT http method.
+
+        :return: Tuple (task, response body), task is None when the OVC did not start a task.
+        """
+        return self._do_rest_call('PUT', uri, body, custom_headers)
+
+    def delete(self, uri, custom_headers=None):
+        """
+        Calls the DELETE http method.
+
+        :return: Tuple (task, response body), task is None when the OVC did not start a task.
+        """
+        return self._do_rest_call('DELETE', uri, {}, custom_headers)
+
+    def _do_rest_call(self, method, uri, body, custom_headers):
+        status, body = self.request(method, uri, json.dumps(body), custom_headers)
+
+        if status in [400, 401, 403, 404]:
+            raise HPESimpliVityException(body)
+
+        if isinstance(body, dict) and 'task' in body:
+            return body, body
+
+        return None, body
+
+    def login(self):
+        """
+        Gets an access token, from the token cache when it is available.
+        """
+        if self._token_cache:
+            self._access_token = self._token_cache.get_token(self.ovc_ip, self.username, self._password,
+                                                             self._oauth_login)
+        else:
+            self._access_token = self._oauth_login()[0]
+
+    def _oauth_login(self):
+        """
+        Authenticates against the OVC.
+
+        :return: Tuple (access token, expiration in seconds)
+        """
+        logger.debug("Logging in to the OVC '{0}' as '{1}'".format(self.ovc_ip, self.username))
+        headers = {'Content-type': 'application/x-www-form-urlencoded',
+                   'Authorization': 'Basic ' + b64encode(b'simplivity:').decode('ascii')}
+        body = urlencode(dict(grant_type='password', username=self.username, password=self._password))
+
+        status, response = self._send('POST', self.LOGIN_URL, body, headers)
+
+        if not isinstance(response, dict) or 'access_token' not in response:
+            raise HPESimpliVityAuthenticationError("Invalid credentials")
+
+        return response['access_token'], response.get('expires_in') or self.DEFAULT_TOKEN_LIFETIME
+
+    def request(self, method, path, body='', custom_headers=None):
+        """
+        Sends an authenticated request, logging in again once when the access token is rejected.
+
+        :arg str method: HTTP method
+        :arg str path: Resource path, relative to the API root
+        :arg str body: Request body
+        :arg dict custom_headers: Headers to append or update on the default ones
+        :return: Tuple (HTTP status, response body)
+        """
+        if not self._access_token:
+            self.login()
+
+        status, response = self._send_limited(method, path, body, custom_headers)
+
+        if status == 401:
+            logger.debug("Access token rejected by the OVC '{0}'".format(self.ovc_ip))
+            if self._token_cache:
+                self._token_cache.invalidate(self.ovc_ip, self.username, self._access_token)
+            self.login()
+            status, response = self._send_limited(method, path, body, custom_headers)
+
+        return status, response
+
+    def _send_limited(self, method, path, body, custom_headers):
+        """
+        Sends a request once the rate limiter allows it, and reports its latency and throttling to the limiter.
+        A throttled request is sent again, at the rate decreased by the limiter.
+
+        :return: Tuple (HTTP status, response body)
+        """
+        if not self._rate_limiter:
+            return self._send(method, path, body, self._build_headers(custom_headers))
+
+        for attempt in range(self.MAX_THROTTLED_RETRIES + 1):
+            self._rate_limiter.acquire()
+            start = time.time()
+            try:
+                status, response = self._send(method, path, body, self._build_headers(custom_headers))
+            except HPESimpliVityException:
+                self._rate_limiter.record(time.time() - start, congested=True)
+                raise
+
+            throttled = status in self.THROTTLED_STATUSES
+            self._rate_limiter.record(time.time() - start, congested=throttled)
+            if not throttled:
+                break
+            logger.debug("Request {0} {1} throttled by the OVC '{2}' ({3})".format(method, path, self.ovc_ip, status))
+
+        return status, response
+
+    def _build_headers(self, custom_headers):
+        headers = {'Content-type': self.CONTENT_TYPE,
+                   'Authorization': 'Bearer ' + self._access_token}
+        if custom_headers:
+            headers.update(custom_headers)
+        return headers
+
+    def _send(self, method, path, body, headers):
+        """
+        Sends a request through the keep-alive connection.
+        When the OVC has closed an idle connection, it reconnects and sends the request again.
+
+        :return: Tuple (HTTP status, response body)
+        """
+        headers = dict(headers, Accept=self.ACCEPT)
+        reused = self._http is not None
+
+        try:
+            if not reused:
+                self._http = self._open_connection()
+            self._http.request(method, self.API_PATH + path, body, headers)
+            response = self._http.getresponse()
+            content = response.read()
+        except (http_client.HTTPException, IOError) as error:
+            self.close()
+            # An idle connection closed by the OVC only fails when it is reused, the request is sent again
+            if reused and (isinstance(error, http_client.BadStatusLine) or self._is_closed_connection_error(error)):
+                return self._send(method, path, body, headers)
+            raise HPESimpliVityException(traceback.format_exc())
+
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+
+        return response.status, json.loads(content.decode('utf-8')) if content else {}
+
+    def _is_closed_connection_error(self, error):
+        return isinstance(error, socket.error) and error.errno in self.CLOSED_CONNECTION_ERRNOS
+
+    def _open_connection(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        if self._ssl_certificate:
+            context.load_verify_locations(self._ssl_certificate)
+        else:
+            context.verify_mode = ssl.CERT_NONE
+
+        return http_client.HTTPSConnection(self.ovc_ip, context=context, timeout=self._timeout)
+
+    def close(self):
+        """
+        Closes the underlying HTTP connection, it is opened again on the next request.
+        """
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+
+class BrokerConnection(OVCConnection):
+    """
+    OVCConnection that forwards the requests to the local OVC broker through its Unix socket.
+
+    The broker (module_utils/simplivity_broker.py) keeps authenticated keep-alive HTTPS connections per OVC,
+    so the task neither opens its own TLS connection nor logs in. With a RateLimiter, the requests wait for their
+    turn before they are forwarded, as the ones of an OVCConnection.
+    """
+
+    def __init__(self, socket_path, ovc_ip, username, password, ssl_certificate=None, timeout=None,
+                 rate_limiter=None):
+        """
+        BrokerConnection constructor. It connects to the broker right away.
+
+        :arg str socket_path: Broker Unix socket
+        :raises socket.error: When the broker is not running.
+        """
+        super(BrokerConnection, self).__init__(ovc_ip, username, password, ssl_certificate, timeout,
+                                               rate_limiter=rate_limiter)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(socket_path)
+        except Exception:
+            self._socket.close()
+            raise
+        self._stream = self._socket.makefile('rwb')
+
+    def login(self):
+        """
+        The broker authenticates the requests, there is nothing to do on the module side.
+        """
+        pass
+
+    def request(self, method, path, body='', custom_headers=None):
+        """
+        Sends a request through the broker.
+
+        :return: Tuple (HTTP status, response body)
+        """
+        return self._send_limited(method, path, body, custom_headers)
+
+    def _build_headers(self, custom_headers):
+        # The broker adds the authorization
+        return custom_headers
+
+    def _send(self, method, path, body, headers):
+        message = dict(ovc=dict(ip=self.ovc_ip,
+                                username=self.username,
+                                password=self._password,
+                                ssl_certificate=self._ssl_certificate,
+                                timeout=self._timeout),
+                       method=method,
+                       path=path,
+                       body=body,
+                       headers=headers)
+
+        self._stream.write(json.dumps(message).encode('utf-8') + b'\n')
+        self._stream.flush()
+        line = self._stream.readline()
+
+        if not line:
+            raise HPESimpliVityException('The OVC broker closed the connection.')
+
+        reply = json.loads(line.decode('utf-8'))
+        if reply.get('authentication_error'):
+            raise HPESimpliVityAuthenticationError(reply['authentication_error'])
+        if 'error' in reply:
+            raise HPESimpliVityException(reply['error'])
+
+        return reply['status'], reply['body']
+
+    def close(self):
+        self._stream.close()
+        self._socket.close()
+
+
+class PersistentConnection(OVCConnection):
+    """
+    OVCConnection that sends the requests through the Ansible persistent connection of the play.
+
+    It is used when the task runs with 'connection: httpapi' and 'ansible_network_os: simplivity'. The httpapi
+    plugin (plugins/httpapi/simplivity.py) holds the authenticated session, so all the tasks share one login.
+    """
+
+    def __init__(self, socket_path):
+        """
+        PersistentConnection constructor.
+
+        :arg str socket_path: Socket of the persistent connection, given by Ansible to the module.
+        """
+        self._persistent_connection = Connection(socket_path)
+        super(PersistentConnection, self).__init__(self._persistent_connection.get_option('host'),
+                                                   self._persistent_connection.get_option('remote_user'),
+                                                   None)
+
+    def login(self):
+        """
+        The httpapi plugin authenticates the requests, there is nothing to do on the module side.
+        """
+        pass
+
+    def request(self, method, path, body='', custom_headers=None):
+        """
+        Sends a request through the persistent connection.
+
+        :return: Tuple (HTTP status, response body)
+        """
+        try:
+            status, response = self._persistent_connection.send_request(body, path, method=method, headers=custom_headers)
+        except PersistentConnectionError as error:
+            raise HPESimpliVityException(to_native(error))
+
+        return status, response
+
+    def close(self):
+        pass
+
+
+class OVCSession(object):
+    """
+    OVC client bound to an OVCConnection.
+    It exposes the same resource clients as simplivity.ovc_client.OVC.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._resource_clients = {}
+
+    def _get_resource_client(self, module_name, class_name):
+        if module_name not in self._resource_clients:
+            module = __import__('simplivity.resources.' + module_name, fromlist=[class_name])
+            self._resource_clients[module_name] = getattr(module, class_name)(self.connection)
+        return self._resource_clients[module_name]
+
+    @property
+    def virtual_machines(self):
+        return self._get_resource_client('virtual_machines', 'VirtualMachines')
+
+    @property
+    def policies(self):
+        return self._get_resource_client('policies', 'Policies')
+
+    @property
+    def datastores(self):
+        return self._get_resource_client('datastores', 'Datastores')
+
+    @property
+    def omnistack_clusters(self):
+        return self._get_resource_client('omnistack_clusters', 'OmnistackClusters')
+
+    @property
+    def backups(self):
+        return self._get_resource_client('backups', 'Backups')
+
+    @property
+    def hosts(self):
+        return self._get_resource_client('hosts', 'Hosts')
+
+
+def create_plugin_session(get_option):
+    """
+    Creates an OVCSession from the connection options of the inventory and lookup plugins, with the same connection
+    as the modules when they share the token.
+
+    :arg callable get_option: get_option method of the plugin
+    :return: OVCSession
+    """
+    connection = OVCConnection(get_option('ovc_ip'),
+                               get_option('username'),
+                               get_option('password'),
+                               ssl_certificate=get_option('ssl_certificate'),
+                               timeout=get_option('timeout'),
+                               token_cache=TokenCache() if get_option('token_cache') else None)
+    return OVCSession(connection)
+
+
+def get_all_pages(resource_client, page_size, **params):
+    """
+    Gets all the resources, page by page, as a generator. The requests stop at the first page shorter than page_size.
+
+    :arg resource_client: SDK client of the resources
+    :arg int page_size: Number of resources requested per page
+    :arg params: Other get_all params, such as the filters
+    :return: generator: Resource objects
+    """
+    offset = 0
+    while True:
+        page = resource_client.get_all(limit=page_size, offset=offset, **params)
+        for resource in page:
+            yield resource
+
+        if len(page) < page_size:
+            return
+        offset += len(page)
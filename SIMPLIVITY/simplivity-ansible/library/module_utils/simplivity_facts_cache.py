@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Cache of the facts gathered by the SimpliVity facts modules, kept on the controller disk.
+
+It is only imported when the facts cache is in use, or when a module changes an OVC whose facts are cached.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from ansible.module_utils.simplivity import (dump_json_file,
+                                             get_logger,
+                                             get_state_dir,
+                                             load_json_file,
+                                             locked_file,
+                                             make_private_dirs)
+
+
+logger = get_logger(__file__)
+
+
+class FactsCache(object):
+    """
+    Facts shared by the tasks running on the controller, until their TTL expires.
+
+    Each entry is a state file named after the digest of its key, written atomically, so the parallel forks
+    read it without locking. The entries are bound to a generation of their OVC, which is incremented by the
+    modules changing the OVC. An entry of an older generation is stale, as the facts may have changed.
+
+    The modification time of each entry file is set to its expiration time, so the expired entries, including the
+    stale ones, are removed from the directory by looking at the file times only.
+    """
+    DIRECTORY_NAME = 'facts'
+    GENERATIONS_FILE_NAME = 'generations.json'
+    # Marker file whose modification time is the last time the expired entries were removed
+    PRUNED_FILE_NAME = 'pruned'
+    # Seconds between two removals of the expired entries
+    PRUNE_INTERVAL = 300
+
+    def __init__(self, directory=None):
+        self.directory = os.path.join(get_state_dir(directory), self.DIRECTORY_NAME)
+        make_private_dirs(self.directory)
+        self.generations_path = os.path.join(self.directory, self.GENERATIONS_FILE_NAME)
+
+    @classmethod
+    def exists(cls, directory=None):
+        """
+        Checks whether the facts cache was ever used, so the modules changing an OVC can skip the invalidation.
+
+        :arg str directory: State directory to use instead of the default one.
+        :return: bool
+        """
+        return os.path.isdir(os.path.join(get_state_dir(directory, create=False), cls.DIRECTORY_NAME))
+
+    @staticmethod
+    def key(*parts):
+        """
+        Builds an entry key from JSON serializable parts, such as the OVC, the module and its query.
+
+        :return: str: SHA-256 hex digest
+        """
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def generation(self, ovc_ip):
+        """
+        Gets the current generation of an OVC. It must be read before gathering the facts to cache, so a change
+        made meanwhile makes them stale.
+
+        :arg str ovc_ip: OVC IP
+        :return: int: Generation
+        """
+        return load_json_file(self.generations_path, default={}).get(ovc_ip, 0)
+
+    def get(self, key, generation):
+        """
+        Gets cached facts.
+
+        :arg str key: Entry key
+        :arg int generation: Current generation of the OVC
+        :return: Facts, or None when they are missing, expired or stale.
+        """
+        entry = load_json_file(self._entry_path(key))
+
+        if entry and entry['generation'] == generation and entry['expires_at'] > time.time():
+            logger.debug("Reusing cached facts '{0}'".format(key))
+            return entry['facts']
+
+        if entry:
+            self._remove(self._entry_path(key))
+        return None
+
+    def set(self, key, generation, ttl, facts):
+        """
+        Caches facts.
+
+        :arg str key: Entry key
+        :arg int generation: Generation of the OVC read before gathering the facts
+        :arg int ttl: Seconds the facts are kept
+        :arg facts: JSON serializable facts
+        """
+        now = time.time()
+        path = self._entry_path(key)
+        dump_json_file(path, dict(generation=generation, expires_at=now + ttl, facts=facts))
+        os.utime(path, (now, now + ttl))
+
+        self._prune(now)
+
+    def _prune(self, now):
+        """
+        Removes the expired entries, at most once per PRUNE_INTERVAL.
+        """
+        pruned_path = os.path.join(self.directory, self.PRUNED_FILE_NAME)
+        try:
+            if os.stat(pruned_path).st_mtime + self.PRUNE_INTERVAL > now:
+                return
+        except OSError:
+            pass
+
+        with open(pruned_path, 'a'):
+            os.utime(pruned_path, (now, now))
+
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.json') and file_name != self.GENERATIONS_FILE_NAME:
+                path = os.path.join(self.directory, file_name)
+                try:
+                    expired = os.stat(path).st_mtime <= now
+                except OSError:
+                    continue
+                if expired:
+                    self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        # Another fork may have removed or replaced it meanwhile
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def invalidate(self, ovc_ip):
+        """
+        Makes all the cached facts of an OVC stale.
+
+        :arg str ovc_ip: OVC IP
+        """
+        with locked_file(self.generations_path):
+            generations = load_json_file(self.generations_path, default={})
+            generations[ovc_ip] = generations.get(ovc_ip, 0) + 1
+            dump_json_file(self.generations_path, generations)
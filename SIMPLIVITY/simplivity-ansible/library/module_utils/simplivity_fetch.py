@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Fetch engine getting several listings of the OVC REST API at the same time, such as /hosts and /virtual_machines.
+
+It is only imported by the modules gathering several listings.
+"""
+
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+
+
+class FetchEngine(object):
+    """
+    Gets listings of the OVC with a bounded pool of threads.
+
+    Each thread has its own connection, created by the connection factory, as an HTTPS connection can not be used
+    by two threads at once. The pages of a listing after the first one are requested at the same time once the OVC
+    sends the count of its members, the listings are requested one page after the other otherwise.
+    """
+    DEFAULT_MAX_WORKERS = 4
+    # Same as the SDK get_all default limit
+    DEFAULT_PAGE_SIZE = 500
+
+    def __init__(self, connection_factory, max_workers=None, page_size=None):
+        """
+        FetchEngine constructor.
+
+        :arg callable connection_factory: Function without arguments returning a new OVCConnection, such as the one
+            of SimplivityModule._create_connection_factory()
+        :arg int max_workers: Maximum number of requests sent at the same time
+        :arg int page_size: Number of members requested per page
+        """
+        self._connection_factory = connection_factory
+        self._max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+        self._page_size = page_size or self.DEFAULT_PAGE_SIZE
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connection_factory()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _get_page(self, name, params, offset):
+        """
+        Gets a page of a listing.
+
+        :return: Tuple (members, count of members of the listing or None when the OVC does not send it)
+        """
+        query = urlencode(sorted(dict(params, limit=self._page_size, offset=offset).items()))
+        body = self._get_connection().get('/{0}?{1}'.format(name, query))
+        return body.get(name) or [], body.get('count')
+
+    def fetch(self, listings):
+        """
+        Gets all the members of the listings. The first page of each listing is requested right away, the following
+        ones as soon as the count of members is known.
+
+        :arg dict listings: Query params by name of listing, such as {'hosts': {'fields': 'id,name'}}. The name is
+            both the URL and the field of the members in the response, as in the OVC REST API.
+        :return: dict: List of members by name of listing, in the order of the OVC
+        """
+        pages = dict((name, {}) for name in listings)
+        pending = {}
+
+        executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            def submit(name, offset):
+                pending[executor.submit(self._get_page, name, listings[name], offset)] = (name, offset)
+
+            for name in listings:
+                submit(name, 0)
+
+            while pending:
+                done = wait(pending, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    name, offset = pending.pop(future)
+                    members, count = future.result()
+                    pages[name][offset] = members
+
+                    if offset == 0 and count is not None:
+                        for next_offset in range(self._page_size, count, self._page_size):
+                            submit(name, next_offset)
+                    elif count is None and len(members) == self._page_size:
+                        submit(name, offset + self._page_size)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+        return dict((name, [member for offset in sorted(pages[name]) for member in pages[name][offset]])
+                    for name in listings)
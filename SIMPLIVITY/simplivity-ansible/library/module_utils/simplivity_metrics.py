@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Performance metrics of the SimpliVity VMs, hosts and clusters, in columnar form.
+
+It is only imported when the facts modules gather metrics.
+"""
+
+import math
+
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+
+
+def get_metrics(connection, resource_url, resource_id, time_range, resolution, time_offset=0):
+    """
+    Gets the metrics of a resource from the REST API, such as iops, throughput and latency, each one with its data
+    points.
+
+    :arg connection: OVC connection
+    :arg str resource_url: URL of the resources, such as /hosts
+    :arg str resource_id: Resource ID
+    :arg int time_range: Seconds of metrics to get
+    :arg str resolution: Resolution of the data points, SECOND, MINUTE, HOUR or DAY
+    :arg int time_offset: Seconds between now and the end of the range
+    :return: list: Metrics as sent by the OVC
+    """
+    query = urlencode([('range', time_range), ('resolution', resolution), ('time_offset', time_offset)])
+    return connection.get('{0}/{1}/metrics?{2}'.format(resource_url, resource_id, query)).get('metrics') or []
+
+
+def to_columns(metrics):
+    """
+    Converts the metrics to columns sharing the same timestamps, instead of one dict per data point.
+
+    Each value of the data points, such as the reads and writes of the iops, becomes a column named after the metric
+    and the value, such as iops_reads. The metrics have the same dates, as they come from the same query, otherwise
+    the columns are aligned on all the dates, with None where a metric has no data point.
+
+    :arg list metrics: Metrics as sent by the OVC
+    :return: Tuple (list of timestamps, dict of columns)
+    """
+    series = [metric.get('data_points') or [] for metric in metrics]
+    dates = [[point['date'] for point in data_points] for data_points in series]
+
+    if all(metric_dates == dates[0] for metric_dates in dates[1:]):
+        timestamps = dates[0] if dates else []
+        positions = None
+    else:
+        timestamps = sorted(set(date for metric_dates in dates for date in metric_dates))
+        positions = dict((date, index) for index, date in enumerate(timestamps))
+
+    columns = {}
+    for metric, data_points in zip(metrics, series):
+        names = sorted(set(name for point in data_points for name in point if name != 'date'))
+        for name in names:
+            values = [point.get(name) for point in data_points]
+            if positions is not None:
+                aligned = [None] * len(timestamps)
+                for point, value in zip(data_points, values):
+                    aligned[positions[point['date']]] = value
+                values = aligned
+            columns['{0}_{1}'.format(metric['name'], name)] = values
+
+    return timestamps, columns
+
+
+def aggregate(columns, aggregations):
+    """
+    Aggregates each column as a whole, with the builtin functions running over the lists, instead of per data point.
+    The missing values are ignored, and the p95 is the nearest-rank 95th percentile.
+
+    :arg dict columns: Columns returned by to_columns()
+    :arg list aggregations: Names of the aggregations: min, max, avg or p95
+    :return: dict: Aggregations by column, such as {'iops_reads': {'max': 120, 'p95': 100}}
+    """
+    result = {}
+
+    for name, values in columns.items():
+        values = [value for value in values if value is not None]
+        if not values:
+            result[name] = dict.fromkeys(aggregations)
+            continue
+
+        stats = {}
+        if 'min' in aggregations:
+            stats['min'] = min(values)
+        if 'max' in aggregations:
+            stats['max'] = max(values)
+        if 'avg' in aggregations:
+            stats['avg'] = math.fsum(values) / len(values)
+        if 'p95' in aggregations:
+            values.sort()
+            stats['p95'] = values[int(math.ceil(0.95 * len(values))) - 1]
+        result[name] = stats
+
+    return result
@@ -39,6 +39,63 @@ options:
     options:
       description:
         - 'List with options to gather additional facts about a Backup'
+    fields:
+      description:
+        - List with the names of the fields of the backups to gather. Default is all of them. The OVC only sends
+          these fields when getting all the backups.
+    max_items:
+      description:
+        - Maximum number of backups to gather. The backups are requested page by page, and the requests stop once
+          this number is reached.
+    page_size:
+      description:
+        - Number of backups requested per page. When C(page_size) or C(max_items) is set, the pages are requested
+          one after the other, starting at the C(offset) of C(params), until the last one. Default is 500.
+    cache_ttl:
+      description:
+        - Seconds the gathered facts are cached on the controller. While they are cached, the tasks gathering
+          the same facts from the same OVC get them without connecting to it. The cached facts of an OVC are
+          discarded when a module changes it, such as simplivity_virtual_machine. It can also be set with the
+          environment variable SIMPLIVITY_FACTS_CACHE_TTL. Default is no cache.
+    cache_refresh:
+      description:
+        - Gathers the facts from the OVC even when they are cached, and caches them again. Default is false.
+    output_file:
+      description:
+        - Path of a file the backups are written to, in JSON Lines format, instead of returning them in C(backups). The
+          backups are requested page by page and written as they arrive, and the file is replaced once they are all
+          written. Only the path, count and checksum of the file are returned, in C(backups_output_file). The facts
+          cache is not used with this option.
+    output_format:
+      description:
+        - Format of C(backups). With C(records), it is a list with one dict per resource. With C(columnar), it is a
+          dict with the C(keys) of the resources, one list of values per key in C(columns), with null where a
+          resource does not have the key, and the C(count) of resources. A column of strings repeating their values
+          is a dict with the distinct C(values) and, for each resource, the index of its value in C(indexes). It is
+          smaller and faster to parse for many resources. Default is records.
+      choices: ['records', 'columnar']
+    since:
+      description:
+        - Name of a watermark kept on the controller between runs. When it is set, only the changes since the
+          previous run with the same watermark, OVC and C(params) filters are returned. New backups are requested
+          by creation time, backups that were not in a final state yet are checked again by ID, and backups are
+          removed once their expiration time has passed. The IDs of the backups seen are kept with the watermark,
+          and they are all listed again when the OVC counts fewer backups, to find the ones deleted before they
+          expire. The first run returns all the backups, page by page. With C(max_items), each run returns at most
+          this number of new backups, the oldest first, and the next run returns the following ones. The facts
+          cache is not used with this option.
+    sort:
+      description:
+        - Name of the field the OVC sorts the backups by, such as C(created_at). Default is the name.
+    order:
+      description:
+        - Order of the backups sorted by the OVC.
+      choices: ['ascending', 'descending']
+    latest_per_vm:
+      description:
+        - Number of backups returned per VM, the newest ones by creation time. The backups are requested page by
+          page, newest first unless C(sort) is set, and only this number of backups per VM is kept while they
+          arrive. The backups of a VM are returned together, newest first. Not used with C(since).
 '''
 
 EXAMPLES = '''
@@ -58,6 +115,39 @@ EXAMPLES = '''
       filters:
         name: '{{ name }}'
 
+- name: Gather facts about the first 2000 Backups, 500 per request
+  simplivity_backup_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    max_items: 2000
+    page_size: 500
+  delegate_to: localhost
+
+- name: Export all the Backups to a JSON Lines file
+  simplivity_backup_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    output_file: /tmp/backups.jsonl
+  delegate_to: localhost
+
+- name: Gather the 3 newest Backups of each VM
+  simplivity_backup_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    latest_per_vm: 3
+  delegate_to: localhost
+
+- name: Gather the Backups created, changed or removed since the previous report
+  simplivity_backup_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    since: backup_report
+  delegate_to: localhost
+
 - name: Gather facts about a Backup by name
   simplivity_backup_facts:
     ovc_ip: <ip>
@@ -69,36 +159,280 @@ EXAMPLES = '''
 
 RETURN = '''
 backups:
-    description: Facts about the SimpliVity backups
-    returned: Always, but can be empty list.
+    description: Facts about the SimpliVity backups, only the new ones when since is set, only the newest ones of
+                 each VM when latest_per_vm is set. A dict of columns with the columnar output_format.
+    returned: When output_file is not set, but can be empty list.
+    type: list
+changed_backups:
+    description: Facts about the SimpliVity backups whose state changed since the previous run.
+    returned: When since is set, but can be empty list.
     type: list
+removed_backups:
+    description: IDs of the SimpliVity backups removed or expired since the previous run. A backup deleted while the
+                 OVC still counts expired backups is returned once they are removed.
+    returned: When since is set, but can be empty list.
+    type: list
+backups_output_file:
+    description: Path, count of backups and SHA-1 checksum of the output file, the same as the checksum of the stat
+                 module.
+    returned: When output_file is set.
+    type: dict
 '''
 
-from ansible.module_utils.simplivity import SimplivityModule
+import bisect
+import calendar
+import hashlib
+import heapq
+import json
+import os
+import time
+from collections import OrderedDict
+
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.simplivity import (SimplivityModule,
+                                             dump_json_file,
+                                             get_state_dir,
+                                             load_json_file,
+                                             locked_file,
+                                             make_private_dirs)
 
 
 class BackupFactsModule(SimplivityModule):
+    WATERMARKS_DIRECTORY_NAME = 'backup_watermarks'
+    # Backups in these states do not change anymore, until they expire
+    FINAL_STATES = ['PROTECTED', 'FAILED']
+    # Fields the watermark needs, even when they are not in the fields option
+    WATERMARK_FIELDS = ['id', 'created_at', 'expiration_time', 'state']
+    # The new backups are requested from some seconds before the newest one seen, as the OVC may list
+    # a backup after others created later
+    WATERMARK_OVERLAP = 300
+    # Number of pending backups checked per request, their IDs go in the query string
+    ID_BATCH_SIZE = 100
+    TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+    # Fields latest_per_vm needs, even when they are not in the fields option
+    LATEST_FIELDS = ['virtual_machine_id', 'created_at']
 
     def __init__(self):
         argument_spec = dict(name=dict(type='str'),
                              options=dict(type='list'),
-                             params=dict(type='dict'))
+                             params=dict(type='dict'),
+                             since=dict(type='str'),
+                             sort=dict(type='str'),
+                             order=dict(type='str', choices=['ascending', 'descending']),
+                             latest_per_vm=dict(type='int'))
+        argument_spec.update(self.FACTS_ARGS)
 
         super(BackupFactsModule, self).__init__(additional_arg_spec=argument_spec)
         self.set_resource_object(self.ovc_client.backups)
 
     def execute_module(self):
-        facts = {'backups': []}
+        if self.module.params.get('since') and not self.module.params['name']:
+            return dict(changed=False, ansible_facts=self.__get_changes_since(self.module.params['since']))
 
+        backups = []
         if self.module.params['name'] and self.active_resource:
-            facts["backups"].append(self.active_resource.data)
+            backups = [self.active_resource]
+        elif not self.module.params['name'] and self.module.params.get('latest_per_vm'):
+            backups = self.__get_latest_per_vm()
         elif not self.module.params['name']:
-            backups = self.resource_client.get_all(**self.facts_params)
-            for backup in backups:
-                facts["backups"].append(backup.data)
+            backups = self.get_all_resources(**self.__get_sort_params())
 
+        facts = self.get_records_facts('backups', (self.get_facts_data(backup) for backup in backups))
         return dict(changed=False, ansible_facts=facts)
 
+    def __get_sort_params(self):
+        params = {}
+        for name in ('sort', 'order'):
+            if self.module.params.get(name):
+                params[name] = self.module.params[name]
+        return params
+
+    def __get_latest_per_vm(self):
+        """
+        Gets the newest backups of each VM, in a single pass over the pages of backups.
+
+        Each VM has a min-heap of at most latest_per_vm backups, keyed by creation time, so the memory does not
+        grow with the number of backups. When the OVC sends the newest backups first, the older ones are dropped
+        by comparing them with the top of the heap only.
+        """
+        count = self.module.params['latest_per_vm']
+        params = dict(sort='created_at', order='descending')
+        params.update(self.__get_sort_params())
+        if self.module.params.get('fields'):
+            params['fields'] = ','.join(sorted(set(self.module.params['fields']) | set(self.LATEST_FIELDS)))
+        if not (self.module.params.get('max_items') or self.module.params.get('page_size')):
+            # The backups are streamed page by page, instead of a single get_all call
+            params['page_size'] = self.DEFAULT_PAGE_SIZE
+
+        heaps = OrderedDict()
+        for sequence, backup in enumerate(self.get_all_resources(**params)):
+            # The sequence keeps the OVC order between backups created at the same time
+            entry = (backup.data.get('created_at') or '', -sequence, backup)
+            heap = heaps.setdefault(backup.data.get('virtual_machine_id'), [])
+            if len(heap) < count:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+
+        for heap in heaps.values():
+            for entry in sorted(heap, reverse=True):
+                yield entry[2]
+
+    def __get_changes_since(self, since):
+        """
+        Gets the backups created, changed and removed since the previous run with the same watermark.
+
+        The watermark state file holds the creation time of the newest backup seen, the backups created in
+        the overlap before it, the backups that are not in a final state, the expiration times and the IDs of the
+        backups seen. It is locked during the run, and only saved once the changes are gathered, so they are
+        returned again if the task fails.
+        """
+        ovc_ip, username = self._get_ovc_identity()[:2]
+        filters = self.facts_params.get('filters') or {}
+        key = json.dumps([ovc_ip, username, since, filters], sort_keys=True)
+        directory = os.path.join(get_state_dir(), self.WATERMARKS_DIRECTORY_NAME)
+        make_private_dirs(directory)
+        path = os.path.join(directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+        params = {}
+        if self.module.params.get('fields'):
+            params['fields'] = ','.join(sorted(set(self.module.params['fields']) | set(self.WATERMARK_FIELDS)))
+
+        with locked_file(path):
+            watermark = load_json_file(path, default=None) or dict(created_after=None, recent={}, pending={},
+                                                                   expirations=[], ids=[])
+            if watermark.get('ids') is None:
+                # The watermarks saved before the IDs were tracked start from the backups of the OVC
+                watermark['ids'] = sorted(self.__get_backup_ids()) if watermark['created_after'] else []
+            new_backups = self.__get_new_backups(watermark, params)
+            changed_backups, removed_ids = self.__check_pending_backups(watermark, params)
+            removed_ids.extend(self.__expire_backups(watermark))
+
+            for backup in new_backups + changed_backups:
+                self.__track_backup(watermark, backup.data)
+
+            removed_ids.extend(self.__remove_deleted_backups(watermark, new_backups, removed_ids))
+
+            changes = dict(changed_backups=[self.get_facts_data(backup) for backup in changed_backups],
+                           removed_backups=removed_ids)
+            # The output file is written before the watermark is saved
+            changes.update(self.get_records_facts('backups', (self.get_facts_data(backup) for backup in new_backups)))
+            dump_json_file(path, watermark)
+
+        return changes
+
+    def __get_new_backups(self, watermark, params):
+        filters = {}
+        if watermark['created_after']:
+            filters['created_after'] = watermark['created_after']
+
+        # Oldest first, so the watermark stays consistent when max_items cuts the list. The pages are requested
+        # until max_items new backups are found, as more than a page of backups of the overlap may be skipped.
+        max_items = self.module.params.get('max_items')
+        params = dict(params, max_items=None)
+        if not self.module.params.get('page_size'):
+            params['page_size'] = self.DEFAULT_PAGE_SIZE
+
+        backups = []
+        for backup in self.get_all_resources(filters=filters, sort='created_at', order='ascending', **params):
+            if backup.data['id'] not in watermark['recent']:
+                backups.append(backup)
+                if len(backups) == max_items:
+                    break
+
+        created_at = [self.__timestamp(backup.data.get('created_at')) for backup in backups]
+        if any(created_at):
+            newest = calendar.timegm(time.strptime(max(value for value in created_at if value), self.TIME_FORMAT))
+            created_after = time.strftime(self.TIME_FORMAT, time.gmtime(newest - self.WATERMARK_OVERLAP)) + 'Z'
+            watermark['created_after'] = max(created_after, watermark['created_after'] or '')
+
+        # The backups of the overlap are returned again by the next run, they are skipped by their IDs
+        recent = dict(watermark['recent'])
+        recent.update((backup.data['id'], value) for backup, value in zip(backups, created_at))
+        watermark['recent'] = dict((backup_id, value) for backup_id, value in recent.items()
+                                   if value and value >= self.__timestamp(watermark['created_after']))
+        return backups
+
+    def __check_pending_backups(self, watermark, params):
+        pending_ids = sorted(watermark['pending'])
+        found = {}
+
+        for index in range(0, len(pending_ids), self.ID_BATCH_SIZE):
+            batch = pending_ids[index:index + self.ID_BATCH_SIZE]
+            for backup in self.resource_client.get_all(filters=dict(id=','.join(batch)), limit=len(batch), **params):
+                found[backup.data['id']] = backup
+
+        changed_backups, removed_ids = [], []
+        for backup_id in pending_ids:
+            backup = found.get(backup_id)
+            if not backup:
+                removed_ids.append(backup_id)
+                del watermark['pending'][backup_id]
+            elif backup.data.get('state') != watermark['pending'][backup_id]:
+                changed_backups.append(backup)
+
+        return changed_backups, removed_ids
+
+    def __expire_backups(self, watermark):
+        # The expirations are sorted, so the expired backups are the first ones
+        now = time.strftime(self.TIME_FORMAT, time.gmtime())
+        count = bisect.bisect_right(watermark['expirations'], [now, u'\uffff'])
+        expired_ids = [backup_id for _, backup_id in watermark['expirations'][:count]]
+        del watermark['expirations'][:count]
+        return expired_ids
+
+    def __remove_deleted_backups(self, watermark, new_backups, removed_ids):
+        """
+        Finds the backups deleted from the OVC before they expire, such as the ones deleted by hand.
+
+        The OVC count of backups is requested with a single member, and all the IDs are only listed when it is
+        lower than the number of backups seen. The expired backups are counted by the OVC until it removes them,
+        so a backup deleted meanwhile is found by a later run.
+
+        :return: list: IDs of the deleted backups
+        """
+        ids = set(watermark['ids'])
+        ids.update(backup.data['id'] for backup in new_backups)
+        ids.difference_update(removed_ids)
+
+        deleted_ids = []
+        count = self.__count_backups()
+        if count is None or count < len(ids):
+            deleted_ids = sorted(ids - self.__get_backup_ids())
+            ids.difference_update(deleted_ids)
+            deleted = set(deleted_ids)
+            watermark['expirations'] = [entry for entry in watermark['expirations'] if entry[1] not in deleted]
+
+        watermark['ids'] = sorted(ids)
+        return deleted_ids
+
+    def __count_backups(self):
+        """
+        Gets the number of backups matching the filters, or None when the OVC does not send it.
+        """
+        query = dict(self.facts_params.get('filters') or {}, limit=1, offset=0, fields='id')
+        body = self.ovc_client.connection.get('/backups?{0}'.format(urlencode(sorted(query.items()))))
+        return body.get('count')
+
+    def __get_backup_ids(self):
+        backups = self.get_all_resources(fields='id', sort='id', order='ascending', max_items=None,
+                                         page_size=self.DEFAULT_PAGE_SIZE)
+        return set(backup.data['id'] for backup in backups)
+
+    def __track_backup(self, watermark, data):
+        # Only the backups in a final state have an expiration entry, so a backup is never in both
+        if data.get('state') not in self.FINAL_STATES:
+            watermark['pending'][data['id']] = data.get('state')
+            return
+
+        watermark['pending'].pop(data['id'], None)
+        if data.get('expiration_time'):
+            bisect.insort(watermark['expirations'], [self.__timestamp(data['expiration_time']), data['id']])
+
+    def __timestamp(self, value):
+        # The OVC times are UTC ISO-8601, the fractions of second and the zone designator are dropped
+        return value[:19] if value else None
+
 
 def main():
     BackupFactsModule().run()
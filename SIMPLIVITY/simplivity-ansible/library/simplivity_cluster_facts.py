@@ -39,6 +39,59 @@ options:
     options:
       description:
         - 'List with options to gather additional facts about a OmniStack cluster'
+    fields:
+      description:
+        - List with the names of the fields of the OmniStack clusters to gather. Default is all of them. The OVC only sends
+          these fields when getting all the OmniStack clusters.
+    max_items:
+      description:
+        - Maximum number of OmniStack clusters to gather. The OmniStack clusters are requested page by page, and the requests stop once
+          this number is reached.
+    page_size:
+      description:
+        - Number of OmniStack clusters requested per page. When C(page_size) or C(max_items) is set, the pages are requested
+          one after the other, starting at the C(offset) of C(params), until the last one. Default is 500.
+    cache_ttl:
+      description:
+        - Seconds the gathered facts are cached on the controller. While they are cached, the tasks gathering
+          the same facts from the same OVC get them without connecting to it. The cached facts of an OVC are
+          discarded when a module changes it, such as simplivity_virtual_machine. It can also be set with the
+          environment variable SIMPLIVITY_FACTS_CACHE_TTL. Default is no cache.
+    cache_refresh:
+      description:
+        - Gathers the facts from the OVC even when they are cached, and caches them again. Default is false.
+    output_file:
+      description:
+        - Path of a file the OmniStack clusters are written to, in JSON Lines format, instead of returning them in
+          C(clusters). The OmniStack clusters are requested page by page and written as they arrive, and the file is
+          replaced once they are all written. Only the path, count and checksum of the file are returned, in
+          C(clusters_output_file). The facts cache is not used with this option.
+    output_format:
+      description:
+        - Format of C(clusters). With C(records), it is a list with one dict per resource. With C(columnar), it is a
+          dict with the C(keys) of the resources, one list of values per key in C(columns), with null where a
+          resource does not have the key, and the C(count) of resources. A column of strings repeating their values
+          is a dict with the distinct C(values) and, for each resource, the index of its value in C(indexes). It is
+          smaller and faster to parse for many resources. Default is records.
+      choices: ['records', 'columnar']
+    metrics:
+      description:
+        - Gathers the performance metrics of the clusters, such as iops, throughput and latency, in C(cluster_metrics).
+          The metrics are requested for each cluster gathered. Default is false.
+    metrics_range:
+      description:
+        - Seconds of metrics to gather, ending C(metrics_time_offset) seconds ago. Default is 43200.
+    metrics_resolution:
+      description:
+        - Resolution of the metrics. Default is MINUTE.
+      choices: ['SECOND', 'MINUTE', 'HOUR', 'DAY']
+    metrics_time_offset:
+      description:
+        - Seconds between now and the end of the metrics. Default is 0.
+    metrics_aggregations:
+      description:
+        - Aggregations computed for each metric over the range. Default is none.
+      choices: ['min', 'max', 'avg', 'p95']
 '''
 
 EXAMPLES = '''
@@ -65,13 +118,35 @@ EXAMPLES = '''
     password: <password>
     name: '{{ name }}'
   delegate_to: localhost
+
+- name: Gather a week of hourly metrics of the OmniStack clusters, with their peaks
+  simplivity_cluster_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    metrics: true
+    metrics_range: 604800
+    metrics_resolution: HOUR
+    metrics_aggregations: ['max', 'p95']
+  delegate_to: localhost
 '''
 
 RETURN = '''
 clusters:
-    description: Facts about the SimpliVity OmniStack clusters
-    returned: Always, but can be empty list.
+    description: Facts about the SimpliVity OmniStack clusters. A dict of columns with the columnar output_format.
+    returned: When output_file is not set, but can be empty list.
+    type: list
+cluster_metrics:
+    description: Performance metrics of the SimpliVity clusters, when C(metrics) is true. One dict per cluster, with its
+                 id and name, the timestamps, the columns with one value per timestamp, named after the metric and
+                 the value, such as iops_reads, and the aggregations of each column.
+    returned: When metrics is true, but can be empty list.
     type: list
+clusters_output_file:
+    description: Path, count of OmniStack clusters and SHA-1 checksum of the output file, the same as the checksum
+                 of the stat module.
+    returned: When output_file is set.
+    type: dict
 '''
 
 from ansible.module_utils.simplivity import SimplivityModule
@@ -83,19 +158,28 @@ class ClusterFactsModule(SimplivityModule):
         argument_spec = dict(name=dict(type='str'),
                              options=dict(type='list'),
                              params=dict(type='dict'))
+        argument_spec.update(self.FACTS_ARGS)
+        argument_spec.update(self.METRICS_ARGS)
 
         super(ClusterFactsModule, self).__init__(additional_arg_spec=argument_spec)
         self.set_resource_object(self.ovc_client.omnistack_clusters)
 
     def execute_module(self):
-        facts = {'clusters': []}
+        clusters = []
 
         if self.module.params['name'] and self.active_resource:
-            facts["clusters"].append(self.active_resource.data)
+            clusters = [self.active_resource]
         elif not self.module.params['name']:
-            clusters = self.resource_client.get_all(**self.facts_params)
-            for cluster in clusters:
-                facts["clusters"].append(cluster.data)
+            clusters = self.get_all_resources()
+
+        if self.module.params.get('metrics'):
+            # The metrics are requested per cluster once the clusters are gathered
+            clusters = list(clusters)
+
+        facts = self.get_records_facts('clusters', (self.get_facts_data(cluster) for cluster in clusters))
+
+        if self.module.params.get('metrics'):
+            facts['cluster_metrics'] = self.get_metrics_facts('/omnistack_clusters', clusters)
 
         return dict(changed=False, ansible_facts=facts)
 
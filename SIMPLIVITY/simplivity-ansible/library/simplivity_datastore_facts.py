@@ -39,6 +39,41 @@ options:
     options:
       description:
         - 'List with options to gather additional facts about a Datastores'
+    fields:
+      description:
+        - List with the names of the fields of the datastores to gather. Default is all of them. The OVC only sends
+          these fields when getting all the datastores.
+    max_items:
+      description:
+        - Maximum number of datastores to gather. The datastores are requested page by page, and the requests stop once
+          this number is reached.
+    page_size:
+      description:
+        - Number of datastores requested per page. When C(page_size) or C(max_items) is set, the pages are requested
+          one after the other, starting at the C(offset) of C(params), until the last one. Default is 500.
+    cache_ttl:
+      description:
+        - Seconds the gathered facts are cached on the controller. While they are cached, the tasks gathering
+          the same facts from the same OVC get them without connecting to it. The cached facts of an OVC are
+          discarded when a module changes it, such as simplivity_virtual_machine. It can also be set with the
+          environment variable SIMPLIVITY_FACTS_CACHE_TTL. Default is no cache.
+    cache_refresh:
+      description:
+        - Gathers the facts from the OVC even when they are cached, and caches them again. Default is false.
+    output_file:
+      description:
+        - Path of a file the datastores are written to, in JSON Lines format, instead of returning them in
+          C(datastores). The datastores are requested page by page and written as they arrive, and the file is replaced
+          once they are all written. Only the path, count and checksum of the file are returned, in
+          C(datastores_output_file). The facts cache is not used with this option.
+    output_format:
+      description:
+        - Format of C(datastores). With C(records), it is a list with one dict per resource. With C(columnar), it is
+          a dict with the C(keys) of the resources, one list of values per key in C(columns), with null where a
+          resource does not have the key, and the C(count) of resources. A column of strings repeating their values
+          is a dict with the distinct C(values) and, for each resource, the index of its value in C(indexes). It is
+          smaller and faster to parse for many resources. Default is records.
+      choices: ['records', 'columnar']
 '''
 
 EXAMPLES = '''
@@ -69,9 +104,14 @@ EXAMPLES = '''
 
 RETURN = '''
 datastores:
-    description: Facts about the SimpliVity datastores
-    returned: Always, but can be empty list.
+    description: Facts about the SimpliVity datastores. A dict of columns with the columnar output_format.
+    returned: When output_file is not set, but can be empty list.
     type: list
+datastores_output_file:
+    description: Path, count of datastores and SHA-1 checksum of the output file, the same as the checksum of the
+                 stat module.
+    returned: When output_file is set.
+    type: dict
 '''
 
 from ansible.module_utils.simplivity import SimplivityModule
@@ -83,20 +123,20 @@ class DatastoreFactsModule(SimplivityModule):
         argument_spec = dict(name=dict(type='str'),
                              options=dict(type='list'),
                              params=dict(type='dict'))
+        argument_spec.update(self.FACTS_ARGS)
 
         super(DatastoreFactsModule, self).__init__(additional_arg_spec=argument_spec)
         self.set_resource_object(self.ovc_client.datastores)
 
     def execute_module(self):
-        facts = {'datastores': []}
+        datastores = []
 
         if self.module.params['name'] and self.active_resource:
-            facts["datastores"].append(self.active_resource.data)
+            datastores = [self.active_resource]
         elif not self.module.params['name']:
-            datastores = self.resource_client.get_all(**self.facts_params)
-            for datastore in datastores:
-                facts["datastores"].append(datastore.data)
+            datastores = self.get_all_resources()
 
+        facts = self.get_records_facts('datastores', (self.get_facts_data(datastore) for datastore in datastores))
         return dict(changed=False, ansible_facts=facts)
 
 
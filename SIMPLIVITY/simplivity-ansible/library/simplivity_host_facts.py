@@ -39,6 +39,59 @@ options:
     options:
       description:
         - 'List with options to gather additional facts about a Host'
+    fields:
+      description:
+        - List with the names of the fields of the hosts to gather. Default is all of them. The OVC only sends
+          these fields when getting all the hosts.
+    max_items:
+      description:
+        - Maximum number of hosts to gather. The hosts are requested page by page, and the requests stop once
+          this number is reached.
+    page_size:
+      description:
+        - Number of hosts requested per page. When C(page_size) or C(max_items) is set, the pages are requested
+          one after the other, starting at the C(offset) of C(params), until the last one. Default is 500.
+    cache_ttl:
+      description:
+        - Seconds the gathered facts are cached on the controller. While they are cached, the tasks gathering
+          the same facts from the same OVC get them without connecting to it. The cached facts of an OVC are
+          discarded when a module changes it, such as simplivity_virtual_machine. It can also be set with the
+          environment variable SIMPLIVITY_FACTS_CACHE_TTL. Default is no cache.
+    cache_refresh:
+      description:
+        - Gathers the facts from the OVC even when they are cached, and caches them again. Default is false.
+    output_file:
+      description:
+        - Path of a file the hosts are written to, in JSON Lines format, instead of returning them in C(hosts). The
+          hosts are requested page by page and written as they arrive, and the file is replaced once they are all
+          written. Only the path, count and checksum of the file are returned, in C(hosts_output_file). The facts cache
+          is not used with this option.
+    output_format:
+      description:
+        - Format of C(hosts). With C(records), it is a list with one dict per resource. With C(columnar), it is a
+          dict with the C(keys) of the resources, one list of values per key in C(columns), with null where a
+          resource does not have the key, and the C(count) of resources. A column of strings repeating their values
+          is a dict with the distinct C(values) and, for each resource, the index of its value in C(indexes). It is
+          smaller and faster to parse for many resources. Default is records.
+      choices: ['records', 'columnar']
+    metrics:
+      description:
+        - Gathers the performance metrics of the hosts, such as iops, throughput and latency, in C(host_metrics).
+          The metrics are requested for each host gathered. Default is false.
+    metrics_range:
+      description:
+        - Seconds of metrics to gather, ending C(metrics_time_offset) seconds ago. Default is 43200.
+    metrics_resolution:
+      description:
+        - Resolution of the metrics. Default is MINUTE.
+      choices: ['SECOND', 'MINUTE', 'HOUR', 'DAY']
+    metrics_time_offset:
+      description:
+        - Seconds between now and the end of the metrics. Default is 0.
+    metrics_aggregations:
+      description:
+        - Aggregations computed for each metric over the range. Default is none.
+      choices: ['min', 'max', 'avg', 'p95']
 '''
 
 EXAMPLES = '''
@@ -65,13 +118,35 @@ EXAMPLES = '''
     password: <password>
     name: '{{ name }}'
   delegate_to: localhost
+
+- name: Gather a week of hourly metrics of the Hosts, with their peaks
+  simplivity_host_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    metrics: true
+    metrics_range: 604800
+    metrics_resolution: HOUR
+    metrics_aggregations: ['max', 'p95']
+  delegate_to: localhost
 '''
 
 RETURN = '''
 hosts:
-    description: Facts about the SimpliVity hosts
-    returned: Always, but can be empty list.
+    description: Facts about the SimpliVity hosts. A dict of columns with the columnar output_format.
+    returned: When output_file is not set, but can be empty list.
+    type: list
+host_metrics:
+    description: Performance metrics of the SimpliVity hosts, when C(metrics) is true. One dict per host, with its
+                 id and name, the timestamps, the columns with one value per timestamp, named after the metric and
+                 the value, such as iops_reads, and the aggregations of each column.
+    returned: When metrics is true, but can be empty list.
     type: list
+hosts_output_file:
+    description: Path, count of hosts and SHA-1 checksum of the output file, the same as the checksum of the stat
+                 module.
+    returned: When output_file is set.
+    type: dict
 '''
 
 from ansible.module_utils.simplivity import SimplivityModule
@@ -83,19 +158,28 @@ class HostFactsModule(SimplivityModule):
         argument_spec = dict(name=dict(type='str'),
                              options=dict(type='list'),
                              params=dict(type='dict'))
+        argument_spec.update(self.FACTS_ARGS)
+        argument_spec.update(self.METRICS_ARGS)
 
         super(HostFactsModule, self).__init__(additional_arg_spec=argument_spec)
         self.set_resource_object(self.ovc_client.hosts)
 
     def execute_module(self):
-        facts = {'hosts': []}
+        hosts = []
 
         if self.module.params['name'] and self.active_resource:
-            facts["hosts"].append(self.active_resource.data)
+            hosts = [self.active_resource]
         elif not self.module.params['name']:
-            hosts = self.resource_client.get_all(**self.facts_params)
-            for host in hosts:
-                facts["hosts"].append(host.data)
+            hosts = self.get_all_resources()
+
+        if self.module.params.get('metrics'):
+            # The metrics are requested per host once the hosts are gathered
+            hosts = list(hosts)
+
+        facts = self.get_records_facts('hosts', (self.get_facts_data(host) for host in hosts))
+
+        if self.module.params.get('metrics'):
+            facts['host_metrics'] = self.get_metrics_facts('/hosts', hosts)
 
         return dict(changed=False, ansible_facts=facts)
 
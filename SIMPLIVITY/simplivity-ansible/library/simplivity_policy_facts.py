@@ -39,6 +39,41 @@ options:
     options:
       description:
         - 'List with options to gather additional facts about a Policy'
+    fields:
+      description:
+        - List with the names of the fields of the policies to gather. Default is all of them. The OVC only sends
+          these fields when getting all the policies.
+    max_items:
+      description:
+        - Maximum number of policies to gather. The policies are requested page by page, and the requests stop once
+          this number is reached.
+    page_size:
+      description:
+        - Number of policies requested per page. When C(page_size) or C(max_items) is set, the pages are requested
+          one after the other, starting at the C(offset) of C(params), until the last one. Default is 500.
+    cache_ttl:
+      description:
+        - Seconds the gathered facts are cached on the controller. While they are cached, the tasks gathering
+          the same facts from the same OVC get them without connecting to it. The cached facts of an OVC are
+          discarded when a module changes it, such as simplivity_virtual_machine. It can also be set with the
+          environment variable SIMPLIVITY_FACTS_CACHE_TTL. Default is no cache.
+    cache_refresh:
+      description:
+        - Gathers the facts from the OVC even when they are cached, and caches them again. Default is false.
+    output_file:
+      description:
+        - Path of a file the policies are written to, in JSON Lines format, instead of returning them in C(policies).
+          The policies are requested page by page and written as they arrive, and the file is replaced once they are all
+          written. Only the path, count and checksum of the file are returned, in C(policies_output_file). The facts
+          cache is not used with this option.
+    output_format:
+      description:
+        - Format of C(policies). With C(records), it is a list with one dict per resource. With C(columnar), it is a
+          dict with the C(keys) of the resources, one list of values per key in C(columns), with null where a
+          resource does not have the key, and the C(count) of resources. A column of strings repeating their values
+          is a dict with the distinct C(values) and, for each resource, the index of its value in C(indexes). It is
+          smaller and faster to parse for many resources. Default is records.
+      choices: ['records', 'columnar']
 '''
 
 EXAMPLES = '''
@@ -69,9 +104,14 @@ EXAMPLES = '''
 
 RETURN = '''
 policies:
-    description: Facts about the SimpliVity policies
-    returned: Always, but can be empty list.
+    description: Facts about the SimpliVity policies. A dict of columns with the columnar output_format.
+    returned: When output_file is not set, but can be empty list.
     type: list
+policies_output_file:
+    description: Path, count of policies and SHA-1 checksum of the output file, the same as the checksum of the stat
+                 module.
+    returned: When output_file is set.
+    type: dict
 '''
 
 from ansible.module_utils.simplivity import SimplivityModule
@@ -83,20 +123,20 @@ class PolicyFactsModule(SimplivityModule):
         argument_spec = dict(name=dict(type='str'),
                              options=dict(type='list'),
                              params=dict(type='dict'))
+        argument_spec.update(self.FACTS_ARGS)
 
         super(PolicyFactsModule, self).__init__(additional_arg_spec=argument_spec)
         self.set_resource_object(self.ovc_client.policies)
 
     def execute_module(self):
-        facts = {'policies': []}
+        policies = []
 
         if self.module.params['name'] and self.active_resource:
-            facts["policies"].append(self.active_resource.data)
+            policies = [self.active_resource]
         elif not self.module.params['name']:
-            policies = self.resource_client.get_all(**self.facts_params)
-            for policy in policies:
-                facts["policies"].append(policy.data)
+            policies = self.get_all_resources()
 
+        facts = self.get_records_facts('policies', (self.get_facts_data(policy) for policy in policies))
         return dict(changed=False, ansible_facts=facts)
 
 
@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: simplivity_task_facts
+short_description: Retrieves the facts about one or more OVC tasks
+description:
+    - Retrieves the facts about one or more OVC tasks from SimpliVity, optionally waiting for them to finish.
+      It follows the tasks started by simplivity_virtual_machine with C(wait) set to false.
+version_added: 1.1.0
+requirements:
+    - python >= 3.3
+    - simplivity >= 1.0.0
+author:
+    - Sijeesh Kattumunda (@sijeesh)
+options:
+    task_ids:
+      description:
+        - List with the IDs of the tasks.
+      required: true
+    wait:
+      description:
+        - Waits until all the tasks are finished, or until C(timeout). The running tasks are polled, starting
+          every second and backing off to every 10 seconds. Default is false.
+    timeout:
+      description:
+        - Maximum number of seconds to wait for the tasks. The tasks still running are returned in
+          C(pending_tasks). Default is 3600.
+'''
+
+EXAMPLES = '''
+- name: Start the clones without waiting for them
+  simplivity_virtual_machine:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    state: clone
+    wait: false
+    data:
+      name: '{{ item }}'
+      new_name: '{{ item }}-clone'
+  loop: '{{ vm_names }}'
+  delegate_to: localhost
+  register: clones
+
+- name: Wait for all the clone tasks
+  simplivity_task_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    task_ids: "{{ clones.results | selectattr('ansible_facts', 'defined') | map(attribute='ansible_facts.task.id') | list }}"
+    wait: true
+    timeout: 1800
+  delegate_to: localhost
+
+- debug: var=tasks
+'''
+
+RETURN = '''
+tasks:
+    description: Facts about the SimpliVity tasks, in the order of task_ids. A task that can not be retrieved has
+                 the state UNKNOWN and the error message.
+    returned: Always, but can be empty list.
+    type: list
+pending_tasks:
+    description: IDs of the tasks still running when the module returns.
+    returned: Always, but can be empty list.
+    type: list
+'''
+
+import time
+
+from ansible.module_utils._text import to_native
+from ansible.module_utils.simplivity import SimplivityModule
+
+
+class TaskFactsModule(SimplivityModule):
+    # Same states and polling intervals as the SDK Task.wait_for_task
+    PENDING_STATES = ['IN_PROGRESS']
+    MAX_POLL_INTERVAL = 10
+
+    def __init__(self):
+        argument_spec = dict(task_ids=dict(type='list', required=True),
+                             wait=dict(type='bool', default=False),
+                             timeout=dict(type='int', default=3600))
+
+        super(TaskFactsModule, self).__init__(additional_arg_spec=argument_spec)
+
+    def execute_module(self):
+        task_ids = [str(task_id) for task_id in self.module.params['task_ids']]
+        tasks = {}
+        for task_id in task_ids:
+            if task_id not in tasks:
+                tasks[task_id] = self.__get_task(task_id)
+        pending_ids = self.__get_pending_ids(tasks)
+
+        if self.module.params.get('wait'):
+            deadline = time.time() + self.module.params['timeout']
+            poll_interval = 0
+
+            while pending_ids and time.time() < deadline:
+                poll_interval = min(poll_interval + 1, self.MAX_POLL_INTERVAL)
+                time.sleep(max(min(poll_interval, deadline - time.time()), 0))
+
+                # Only the running tasks are requested again
+                tasks.update((task_id, self.__get_task(task_id)) for task_id in pending_ids)
+                pending_ids = self.__get_pending_ids(tasks)
+
+        facts = {'tasks': [tasks[task_id] for task_id in task_ids],
+                 'pending_tasks': [task_id for task_id in task_ids if task_id in pending_ids]}
+
+        return dict(changed=False, ansible_facts=facts)
+
+    def __get_task(self, task_id):
+        from simplivity.exceptions import HPESimpliVityException
+
+        try:
+            return self.ovc_client.connection.get("/tasks/{0}".format(task_id))["task"]
+        except HPESimpliVityException as error:
+            return dict(id=task_id, state='UNKNOWN', message=to_native(error))
+
+    def __get_pending_ids(self, tasks):
+        return [task_id for task_id, task in tasks.items() if task.get("state") in self.PENDING_STATES]
+
+
+def main():
+    TaskFactsModule().run()
+
+
+if __name__ == '__main__':
+    main()
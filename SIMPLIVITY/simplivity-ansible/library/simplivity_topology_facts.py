@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: simplivity_topology_facts
+short_description: Retrieves the topology of the SimpliVity federation
+description:
+    - Retrieves the OmniStack clusters, hosts, datastores, policies and VMs of the federation, and joins them into
+      a tree of clusters, with their hosts and datastores, and the VMs of each datastore.
+    - The five listings are requested at the same time, with one connection per request sharing one access token.
+version_added: 1.1.0
+requirements:
+    - python >= 3.3
+    - simplivity >= 1.0.0
+author:
+    - Sijeesh Kattumunda (@sijeesh)
+options:
+    max_workers:
+      description:
+        - Maximum number of requests sent to the OVC at the same time. Default is 4.
+    page_size:
+      description:
+        - Number of resources requested per page. The pages after the first one of each listing are requested at
+          the same time. Default is 500.
+    params:
+      description:
+        - Query params of each listing, by name of listing, such as C(virtual_machines) with C(filters) and
+          C(fields), sent as the params of the facts modules.
+'''
+
+EXAMPLES = '''
+- name: Gather the topology of the federation
+  simplivity_topology_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+  delegate_to: localhost
+
+- debug:
+    msg: "{{ item.0.name }}: {{ item.1.virtual_machines | map(attribute='name') | list }}"
+  loop: "{{ topology.clusters | subelements('datastores') }}"
+
+- name: Gather the topology with the VMs that are alive only, and 8 requests at the same time
+  simplivity_topology_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    max_workers: 8
+    params:
+      virtual_machines:
+        filters:
+          state: ALIVE
+  delegate_to: localhost
+'''
+
+RETURN = '''
+topology:
+    description: The OmniStack clusters, each one with its C(hosts) and C(datastores). Each host has the
+                 C(virtual_machine_ids) running on it, and each datastore has its C(policy_name) and its
+                 C(virtual_machines). The policies have the C(datastore_ids) and C(virtual_machine_ids) using them.
+                 The hosts, datastores and VMs whose cluster or datastore is not found are in C(unassigned).
+    returned: Always.
+    type: dict
+'''
+
+from ansible.module_utils._text import to_native
+from ansible.module_utils.simplivity import SimplivityModule, SimplivityModuleException
+
+
+class TopologyFactsModule(SimplivityModule):
+    # Fields the join needs, even when they are not in the fields of the params
+    JOIN_FIELDS = dict(omnistack_clusters=['id'],
+                       hosts=['id', 'omnistack_cluster_id'],
+                       datastores=['id', 'omnistack_cluster_id', 'policy_id'],
+                       policies=['id', 'name'],
+                       virtual_machines=['id', 'datastore_id', 'host_id', 'policy_id'])
+
+    def __init__(self):
+        argument_spec = dict(max_workers=dict(type='int'),
+                             page_size=dict(type='int'),
+                             params=dict(type='dict'))
+
+        super(TopologyFactsModule, self).__init__(additional_arg_spec=argument_spec)
+
+    def _create_simplivity_client(self):
+        # The listings are requested by the fetch engine, with one connection per thread
+        self.ovc_client = None
+
+    def execute_module(self):
+        from ansible.module_utils.simplivity_fetch import FetchEngine
+        from simplivity.exceptions import HPESimpliVityException
+
+        listings = dict((name, self.__get_query_params(name)) for name in self.JOIN_FIELDS)
+        engine = FetchEngine(self._create_connection_factory(), max_workers=self.module.params.get('max_workers'),
+                             page_size=self.module.params.get('page_size'))
+        try:
+            resources = engine.fetch(listings)
+        except HPESimpliVityException as error:
+            raise SimplivityModuleException(to_native(error))
+
+        return dict(changed=False, ansible_facts=dict(topology=self.__join(resources)))
+
+    def __get_query_params(self, name):
+        params = dict((self.module.params.get('params') or {}).get(name) or {})
+        query = params.pop('filters', None) or {}
+        query.update(params)
+        if query.get('fields'):
+            query['fields'] = ','.join(sorted(set(query['fields'].split(',')) | set(self.JOIN_FIELDS[name])))
+        # Same default sort as the SDK, the pages are requested at the same time, so the order must not change
+        query.setdefault('sort', 'name')
+        query.setdefault('order', 'ascending')
+        return query
+
+    def __join(self, resources):
+        """
+        Joins the listings with hash tables by ID, visiting each resource once.
+        """
+        clusters = dict((cluster['id'], dict(cluster, hosts=[], datastores=[]))
+                        for cluster in resources['omnistack_clusters'])
+        policies = dict((policy['id'], dict(policy, datastore_ids=[], virtual_machine_ids=[]))
+                        for policy in resources['policies'])
+        unassigned = dict(hosts=[], datastores=[], virtual_machines=[])
+
+        hosts = {}
+        for host in resources['hosts']:
+            host = hosts[host['id']] = dict(host, virtual_machine_ids=[])
+            self.__attach(clusters, host.get('omnistack_cluster_id'), 'hosts', host, unassigned)
+
+        datastores = {}
+        for datastore in resources['datastores']:
+            policy = policies.get(datastore.get('policy_id'))
+            datastore = datastores[datastore['id']] = dict(datastore, virtual_machines=[])
+            if policy:
+                datastore['policy_name'] = policy['name']
+                policy['datastore_ids'].append(datastore['id'])
+            self.__attach(clusters, datastore.get('omnistack_cluster_id'), 'datastores', datastore, unassigned)
+
+        for vm in resources['virtual_machines']:
+            self.__attach(datastores, vm.get('datastore_id'), 'virtual_machines', vm, unassigned)
+            if vm.get('host_id') in hosts:
+                hosts[vm['host_id']]['virtual_machine_ids'].append(vm['id'])
+            if vm.get('policy_id') in policies:
+                policies[vm['policy_id']]['virtual_machine_ids'].append(vm['id'])
+
+        return dict(clusters=list(clusters.values()), policies=list(policies.values()), unassigned=unassigned)
+
+    def __attach(self, parents, parent_id, field, child, unassigned):
+        if parent_id in parents:
+            parents[parent_id][field].append(child)
+        else:
+            unassigned[field].append(child)
+
+
+def main():
+    TopologyFactsModule().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -51,8 +51,34 @@ options:
         description:
             - Dict with Virtual Machine properties
         required: true
+    wait:
+        description:
+            - Waits for the OVC task of the C(clone), C(move) and C(backup) states to finish. When it is false,
+              the module returns the task right after starting it, and simplivity_task_facts can wait for many
+              tasks at once. C(clone) with a C(datastore) needs to wait, as the clone is moved once it is created.
+        type: bool
+        default: true
+    max_concurrent:
+        description:
+            - Maximum number of tasks running at the same time, when C(backup) gets a list of VMs in C(vm_names)
+              or C(vm_ids), C(clone) gets a list of clone names in C(new_names), or a C(new_name_pattern) such as
+              C(vdi-{0:03d}) and a C(count), or C(move) gets a list of C(vms). The next task starts as soon as one
+              finishes. When C(wait) is false, the module returns once the last tasks are started.
+        type: int
+        default: 10
+    max_concurrent_per_datastores:
+        description:
+            - Maximum number of moves running at the same time between the same source and destination datastores,
+              when C(move) gets a list of C(vms), each one with its C(name) or C(id), C(datastore_name) and optional
+              C(new_name). As the VM names are only unique in a datastore, a VM with the same name as another one
+              needs its C(id), or its C(source_datastore_name). A VM is already moved when a VM with its new name is
+              on its datastore.
+        type: int
+        default: 2
 notes:
     - 'This resource does not support create and update operations'
+    - In diff mode, a changed VM returns the differences of its data, and the other states the resources created or
+      the tasks started, with values limited to 16 KiB of JSON.
 '''
 
 EXAMPLES = '''
@@ -80,6 +106,19 @@ EXAMPLES = '''
       new_name: 'vm2'
   delegate_to: localhost
 
+- name: 'Simplivity create 100 clones vdi-001 to vdi-100, 20 at a time'
+  simplivity_virtual_machine:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    state: clone
+    max_concurrent: 20
+    data:
+      name: 'golden'
+      new_name_pattern: 'vdi-{0:03d}'
+      count: 100
+  delegate_to: localhost
+
 - name: 'Simplivity clone and move to another datastore'
   simplivity_virtual_machine:
     ovc_ip: <ip>
@@ -104,6 +143,35 @@ EXAMPLES = '''
       datastore_name: 'Datastore name'
   delegate_to: localhost
 
+- name: 'Simplivity clone without waiting for the OVC task'
+  simplivity_virtual_machine:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    state: clone
+    wait: false
+    data:
+      name: 'vm1'
+      new_name: 'vm2'
+  delegate_to: localhost
+  register: clone_result
+
+- name: 'Simplivity move many VMs, evacuating a datastore'
+  simplivity_virtual_machine:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    state: move
+    max_concurrent_per_datastores: 4
+    data:
+      vms:
+        - name: 'vm1'
+          datastore_name: 'Datastore name'
+        - name: 'vm2'
+          new_name: 'vm2-moved'
+          datastore_name: 'Datastore name'
+  delegate_to: localhost
+
 - name: 'Simplivity create VM backup'
   simplivity_virtual_machine:
     ovc_ip: <ip>
@@ -116,6 +184,18 @@ EXAMPLES = '''
       cluster_name: null
       app_consistent: false
       consistency_type: null
+
+- name: 'Simplivity create backups of many VMs, 20 at a time'
+  simplivity_virtual_machine:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    state: backup
+    max_concurrent: 20
+    data:
+      vm_names: '{{ vm_names }}'
+      backup_name: 'nightly'
+  delegate_to: localhost
 '''
 
 RETURN = '''
@@ -126,6 +206,11 @@ virtual_machine:
 
 policy_updated_vms:
     description: Has the SimpliVity facts about the policy updated VMs
+    returned: On states 'set_policy_for_multiple_vms', 'backup' with C(vm_names) or C(vm_ids), and 'move' with C(vms).
+    type: list
+
+not_found_vms:
+    description: Names or IDs of the requested VMs that were not found, the action is done for the other ones.
     returned: On states 'set_policy_for_multiple_vms'.
     type: list
 
@@ -143,16 +228,45 @@ backup:
     description: Has the SimpliVity facts about the backup of a VM.
     returned: On states 'backup'.
     type: dict
+
+moved_vms:
+    description: Result of each VM, by name, or by ID for the VMs with the same name, with its C(status) MOVED,
+                 EXISTS, STARTED or FAILED, and the C(virtual_machine) or the C(task) facts. A failed move also has
+                 the C(error), and the module fails with the results of all the VMs.
+    returned: On states 'move' with C(vms).
+    type: dict
+
+cloned_vms:
+    description: Result of each clone, by name, with its C(status) CREATED, EXISTS, STARTED or FAILED, and the
+                 C(virtual_machine) or the C(task) facts. A failed clone also has the C(error), and the module fails
+                 with the results of all the clones.
+    returned: On states 'clone' with C(new_names) or C(new_name_pattern).
+    type: dict
+
+vm_backups:
+    description: Result of each VM, by name, or by ID for the VMs with the same name, with its C(status) CREATED,
+                 EXISTS, STARTED or FAILED, and the C(backup) or the C(task) facts. A failed backup also has the
+                 C(error), and the module fails with the results of all the VMs.
+    returned: On states 'backup' with C(vm_names) or C(vm_ids).
+    type: dict
+
+task:
+    description: Has the SimpliVity facts about the started OVC task, its id can be given to simplivity_task_facts.
+    returned: On states 'clone', 'move' and 'backup' when wait is false and the action is started.
+    type: dict
 '''
 
-from ansible.module_utils.simplivity import SimplivityModule
-from simplivity import exceptions
+import collections
+import time
+
+from ansible.module_utils._text import to_native
+from ansible.module_utils.simplivity import SimplivityModule, SimplivityModuleTaskError, SimplivityModuleValueError, diff
 
 
 class VirtualMachineModule(SimplivityModule):
 
     MSG_UPDATED_POLICY_OF_MULTIPLE_VMS = "Updated policy of the VMs successfully."
-    MSG_POLICY_ALREADY_APPLIED = "Policy has allready been applied to all of the requested VMs."
+    MSG_POLICY_ALREADY_APPLIED = "Policy has already been applied to all of the requested VMs."
     MSG_CLONED_SUCCESSFULLY = "Cloned successfully."
     MSG_VM_WITH_SAME_NAME_EXISTS = "VM with the same name already exists."
     MSG_MOVED_SUCCESSFULLY = "Moved VM to datastore successfully"
@@ -160,7 +274,35 @@ class VirtualMachineModule(SimplivityModule):
     MSG_BACKUP_EXISTS = "Backup exists with the same name"
     MSG_CREATED_BACKUP_PARAMETERS = "Successfully set the backup parameters"
     MSG_SET_VM_POLICY = "Successfully set the VM policy"
-    MSG_VM_POLICY_ALREADY_APPLIED = "Policy has allready been applied to this VM"
+    MSG_VM_POLICY_ALREADY_APPLIED = "Policy has already been applied to this VM"
+    MSG_TASK_STARTED = "Started the OVC task successfully"
+    MSG_CLONE_TO_DATASTORE_NEEDS_WAIT = "Cloning to a datastore needs to wait for the clone task"
+    MSG_BACKUPS_CREATED = "Created the backups successfully"
+    MSG_BACKUPS_STARTED = "Started the backups successfully"
+    MSG_BACKUPS_EXIST = "Backups exist with the same name for all of the requested VMs"
+    MSG_CLONES_CREATED = "Created the clones successfully"
+    MSG_CLONES_STARTED = "Started the clones successfully"
+    MSG_CLONES_EXIST = "VMs exist with all of the clone names"
+    MSG_CLONES_TO_DATASTORE = "Cloning many VMs to a datastore is not supported, the clones can be moved afterwards"
+    MSG_CLONE_NAME_PATTERN = "The new_name_pattern must contain the clone number, such as vm-{0:03d}"
+    MSG_CLONE_COUNT = "The new_name_pattern needs the number of clones in count, a positive integer"
+    MSG_VMS_MOVED = "Moved the VMs successfully"
+    MSG_MOVES_STARTED = "Started the moves successfully"
+    MSG_VMS_ALREADY_MOVED = "All of the requested VMs are already on their datastore"
+    MSG_DATASTORES_NOT_FOUND = "Datastores not found: {0}"
+    MSG_VMS_NOT_FOUND = "VMs not found: {0}"
+    MSG_VM_NAME_WILDCARD = "The VM names cannot contain the * wildcard of the OVC filters: {0}"
+    MSG_AMBIGUOUS_VMS = "Several VMs are named {0}, set the id or the source_datastore_name of their entries"
+    MSG_TASKS_FAILED = "The OVC tasks failed for: {0}"
+
+    # Same states and polling intervals as the SDK Task.wait_for_task
+    TASK_PENDING_STATES = ['IN_PROGRESS']
+    MAX_POLL_INTERVAL = 10
+    # Polls of a task failing in a row before its VM action is reported as failed
+    MAX_POLL_ERRORS = 3
+
+    # Number of VM names resolved per request, they go in the query string
+    NAME_BATCH_SIZE = 100
 
     argument_spec = dict(
         state=dict(
@@ -173,6 +315,9 @@ class VirtualMachineModule(SimplivityModule):
                      'set_policy']
         ),
         data=dict(required=True, type='dict'),
+        wait=dict(type='bool', default=True),
+        max_concurrent=dict(type='int', default=10),
+        max_concurrent_per_datastores=dict(type='int', default=2),
     )
 
     def __init__(self):
@@ -183,8 +328,13 @@ class VirtualMachineModule(SimplivityModule):
         params = self.module.params.get("params")
         self.params = params if params else {}
 
+        # The VM data before the action, for the diff mode
+        vm_data = dict(self.active_resource.data) if self.active_resource else None
+
         if self.active_resource:
-            if self.state == 'clone':
+            if self.state == 'clone' and ('new_names' in self.data or 'new_name_pattern' in self.data):
+                changed, msg, fact = self.__clone_many()
+            elif self.state == 'clone':
                 changed, msg, fact = self.__clone()
             elif self.state == 'move':
                 changed, msg, fact = self.__move()
@@ -197,10 +347,33 @@ class VirtualMachineModule(SimplivityModule):
         else:
             if self.state == 'set_policy_for_multiple_vms':
                 changed, msg, fact = self.__set_policy_for_multiple_vms()
-
-        return dict(changed=changed,
-                    msg=msg,
-                    ansible_facts=fact)
+            elif self.state == 'move' and 'vms' in self.data:
+                changed, msg, fact = self.__move_many()
+            elif self.state == 'backup' and ('vm_names' in self.data or 'vm_ids' in self.data):
+                changed, msg, fact = self.__create_backups()
+
+        result = dict(changed=changed,
+                      msg=msg,
+                      ansible_facts=fact)
+        if changed and self.module._diff:
+            result['diff'] = self.build_diff(self.__get_differences(vm_data, fact))
+        return result
+
+    def __get_differences(self, vm_data, fact):
+        """
+        Gets the differences of the VM for the states updating it, or the resources created and the tasks started by
+        the other states.
+
+        :arg dict vm_data: VM data before the action
+        :arg dict fact: Facts returned by the state
+        :return: list: Differences returned by diff() with their values
+        """
+        for key in ('virtual_machine', 'moved_vm'):
+            if key in fact:
+                return diff({key: vm_data}, {key: fact[key]}, values=True)
+
+        changes = dict((key, value) for key, value in fact.items() if key != 'not_found_vms')
+        return diff({}, changes, values=True)
 
     def __set_policy_for_multiple_vms(self):
         changed = True
@@ -210,11 +383,15 @@ class VirtualMachineModule(SimplivityModule):
         vm_name_list = self.data["vm_names"]
 
         policy = self.ovc_client.policies.get_by_name(policy_name)
-        vms = [self.resource_client.get_by_name(vm_name) for vm_name in vm_name_list]
+        vms, not_found_vm_names = self.__get_vms_by_name(vm_name_list)
+        if not vms:
+            raise SimplivityModuleValueError(self.MSG_VMS_NOT_FOUND.format(', '.join(not_found_vm_names)))
 
-        vms_using_policy = policy.get_vms()
-        vms_to_exclude = [vm.data["id"] for vm in vms_using_policy]
-        final_vm_list = [vm for vm in vms if vm.data["id"] not in vms_to_exclude]
+        if all("policy_id" in vm.data for vm in vms):
+            final_vm_list = [vm for vm in vms if vm.data["policy_id"] != policy.data["id"]]
+        else:
+            vms_to_exclude = set(vm.data["id"] for vm in policy.get_vms())
+            final_vm_list = [vm for vm in vms if vm.data["id"] not in vms_to_exclude]
 
         if final_vm_list:
             self.resource_client.set_policy_for_multiple_vms(policy, final_vm_list)
@@ -222,10 +399,56 @@ class VirtualMachineModule(SimplivityModule):
             changed = False
             message = self.MSG_POLICY_ALREADY_APPLIED
 
+        if not_found_vm_names:
+            message = '{0} {1}'.format(message, self.MSG_VMS_NOT_FOUND.format(', '.join(not_found_vm_names)))
+
         updated_vm_names = [vm.data["name"] for vm in final_vm_list]
-        return changed, message, {'policy_updated_vms': updated_vm_names}
+        return changed, message, {'policy_updated_vms': updated_vm_names, 'not_found_vms': not_found_vm_names}
+
+    def __get_vms_by_name(self, vm_names, field="name"):
+        """
+        Gets VMs by name, with one request per batch of names instead of one request per VM.
+
+        :arg list vm_names: Names of the VMs
+        :arg str field: VM field to look the names up, name or id
+        :return: Tuple (VMs found, in the order of the names, names of the VMs not found)
+        """
+        from simplivity.exceptions import HPESimpliVityResourceNotFound
+
+        # The OVC filters match * as a wildcard, and it cannot be escaped
+        wildcard_names = [name for name in vm_names if field == "name" and '*' in name]
+        if wildcard_names:
+            raise SimplivityModuleValueError(self.MSG_VM_NAME_WILDCARD.format(', '.join(wildcard_names)))
+
+        names, seen_names = [], set()
+        for name in vm_names:
+            if name not in seen_names:
+                seen_names.add(name)
+                names.append(name)
+
+        # The name filter takes a comma-separated list, so the names with a comma are requested alone
+        batched_names = [name for name in names if ',' not in name]
+        vms_by_name = {}
+
+        for index in range(0, len(batched_names), self.NAME_BATCH_SIZE):
+            batch = batched_names[index:index + self.NAME_BATCH_SIZE]
+            for vm in self.resource_client.get_all(filters={field: ','.join(batch)}):
+                # The first match, as get_by_name does for duplicated names
+                vms_by_name.setdefault(vm.data[field], vm)
+
+        for name in names:
+            if ',' in name and field == "name":
+                try:
+                    vms_by_name[name] = self.resource_client.get_by_name(name)
+                except HPESimpliVityResourceNotFound:
+                    pass
+
+        vms = [vms_by_name[name] for name in names if name in vms_by_name]
+        return vms, [name for name in names if name not in vms_by_name]
 
     def __clone(self):
+        from simplivity.exceptions import HPESimpliVityResourceNotFound
+
         changed = True
         message = self.MSG_CLONED_SUCCESSFULLY
 
@@ -238,12 +461,62 @@ class VirtualMachineModule(SimplivityModule):
             changed = False
             message = self.MSG_VM_WITH_SAME_NAME_EXISTS
             data = {}
-        except exceptions.HPESimpliVityResourceNotFound:
+        except HPESimpliVityResourceNotFound:
+            if not self.module.params.get('wait', True):
+                if datastore:
+                    raise SimplivityModuleValueError(self.MSG_CLONE_TO_DATASTORE_NEEDS_WAIT)
+                return self.__start_task('clone', {"virtual_machine_name": new_vm_name,
+                                                   "app_consistent": app_consistent})
+
             cloned_vm = self.active_resource.clone(new_vm_name, app_consistent, datastore)
             data = cloned_vm.data
 
         return changed, message, {'cloned_vm': data}
 
+    def __clone_many(self):
+        """
+        Clones the VM many times, keeping up to max_concurrent clone tasks running, and skipping the clone names
+        already used by a VM.
+        """
+        if self.data.get("datastore"):
+            raise SimplivityModuleValueError(self.MSG_CLONES_TO_DATASTORE)
+
+        new_names = self.data.get("new_names")
+        if not new_names:
+            pattern = self.data["new_name_pattern"]
+            count = self.data.get("count")
+            if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+                raise SimplivityModuleValueError(self.MSG_CLONE_COUNT)
+            try:
+                new_names = [pattern.format(number) for number in range(1, count + 1)]
+            except (IndexError, KeyError, ValueError):
+                raise SimplivityModuleValueError(self.MSG_CLONE_NAME_PATTERN)
+            if len(set(new_names)) < len(new_names):
+                raise SimplivityModuleValueError(self.MSG_CLONE_NAME_PATTERN)
+        new_names = list(collections.OrderedDict.fromkeys(new_names))
+
+        # One listing request per batch of names, instead of one get_by_name per clone
+        existing_vms, missing_names = self.__get_vms_by_name(new_names)
+        results = dict((vm.data["name"], dict(status='EXISTS')) for vm in existing_vms)
+
+        app_consistent = self.data.get("app_consistent", False)
+        tasks = self.__run_tasks('clone', [(name, self.active_resource, {"virtual_machine_name": name,
+                                                                         "app_consistent": app_consistent})
+                                           for name in missing_names])
+        created = self.__get_task_results(tasks, 'virtual_machine', self.resource_client, results)
+
+        if created:
+            message = self.MSG_CLONES_CREATED
+        elif tasks:
+            message = self.MSG_CLONES_STARTED
+        else:
+            message = self.MSG_CLONES_EXIST
+
+        cloned_vms = collections.OrderedDict((name, results[name]) for name in new_names if name in results)
+        facts = {'cloned_vms': cloned_vms}
+        self.__check_task_results(cloned_vms, facts)
+        return bool(tasks), message, facts
+
     def __move(self):
         changed = True
         message = self.MSG_MOVED_SUCCESSFULLY
@@ -258,6 +531,11 @@ class VirtualMachineModule(SimplivityModule):
 
         result = self.resource_client.get_all(filters=filters)
         if not result:
+            if not self.module.params.get('wait', True):
+                datastore = self.ovc_client.datastores.get_by_name(datastore_name)
+                return self.__start_task('move', {"virtual_machine_name": new_vm_name,
+                                                  "destination_datastore_id": datastore.data["id"]})
+
             moved_vm = self.active_resource.move(new_vm_name, datastore_name)
             data = moved_vm.data
         else:
@@ -267,7 +545,102 @@ class VirtualMachineModule(SimplivityModule):
 
         return changed, message, {'moved_vm': data}
 
+    def __move_many(self):
+        """
+        Moves many VMs. Each entry is resolved to one VM, by its id, or by its name and, when it is set, its
+        source_datastore_name, as the VM names are only unique in a datastore. A VM is already moved when a VM with
+        its new name is on its datastore. The moves are started in the order of the list, keeping up to
+        max_concurrent tasks running, and up to max_concurrent_per_datastores tasks per pair of source and
+        destination datastores.
+        """
+        entries = self.data["vms"]
+
+        datastore_names = set(entry["datastore_name"] for entry in entries)
+        datastores = dict((datastore.data["name"], datastore) for datastore in self.ovc_client.datastores.get_all(
+            filters={'name': ','.join(sorted(datastore_names))}))
+        missing_datastores = sorted(datastore_names - set(datastores))
+        if missing_datastores:
+            raise SimplivityModuleValueError(self.MSG_DATASTORES_NOT_FOUND.format(', '.join(missing_datastores)))
+
+        # One listing of the VMs and the moved VMs, by name, and of the VMs requested by ID
+        vms_by_name = collections.defaultdict(list)
+        names = list(collections.OrderedDict.fromkeys(
+            name for entry in entries if not entry.get("id") for name in (entry["name"], entry.get("new_name") or entry["name"])))
+        for index in range(0, len(names), self.NAME_BATCH_SIZE):
+            batch = names[index:index + self.NAME_BATCH_SIZE]
+            for vm in self.resource_client.get_all(filters={'name': ','.join(batch)}):
+                vms_by_name[vm.data["name"]].append(vm)
+        vms_by_id = dict((vm.data["id"], vm) for vm in self.__get_vms_by_name(
+            [entry["id"] for entry in entries if entry.get("id")], field="id")[0])
+
+        # The results are keyed by VM ID, with the name they are reported by
+        names_by_id = collections.OrderedDict()
+        results = {}
+        requests = []
+        groups = {}
+        not_found_vms = []
+        ambiguous_names = []
+        for entry in entries:
+            datastore = datastores[entry["datastore_name"]]
+
+            if entry.get("id"):
+                vm = vms_by_id.get(entry["id"])
+                if not vm:
+                    not_found_vms.append(entry["id"])
+                    continue
+                new_name = entry.get("new_name") or vm.data["name"]
+                moved = vm.data["datastore_id"] == datastore.data["id"] and vm.data["name"] == new_name
+            else:
+                new_name = entry.get("new_name") or entry["name"]
+                moved_vms = [vm for vm in vms_by_name[new_name] if vm.data["datastore_id"] == datastore.data["id"]]
+                source = entry.get("source_datastore_name")
+                vms = [vm for vm in vms_by_name[entry["name"]] if vm.data["datastore_id"] != datastore.data["id"]]
+                if source:
+                    vms = [vm for vm in vms if vm.data.get("datastore_name") == source]
+                moved = bool(moved_vms)
+                if moved:
+                    vm = moved_vms[0]
+                elif not vms:
+                    not_found_vms.append(entry["name"])
+                    continue
+                elif len(vms) > 1:
+                    ambiguous_names.append(entry["name"])
+                    continue
+                else:
+                    vm = vms[0]
+
+            if vm.data["id"] in names_by_id:
+                continue
+            names_by_id[vm.data["id"]] = entry.get("name") or vm.data["name"]
+
+            if moved:
+                results[vm.data["id"]] = dict(status='EXISTS')
+            else:
+                requests.append((vm.data["id"], vm, {"virtual_machine_name": new_name,
+                                                     "destination_datastore_id": datastore.data["id"]}))
+                groups[vm.data["id"]] = (vm.data["datastore_id"], datastore.data["id"])
+
+        if ambiguous_names:
+            raise SimplivityModuleValueError(self.MSG_AMBIGUOUS_VMS.format(', '.join(sorted(set(ambiguous_names)))))
+
+        tasks = self.__run_tasks('move', requests, groups, self.module.params.get('max_concurrent_per_datastores'))
+        moved = self.__get_task_results(tasks, 'virtual_machine', self.resource_client, results, status='MOVED')
+
+        if moved:
+            message = self.MSG_VMS_MOVED
+        elif tasks:
+            message = self.MSG_MOVES_STARTED
+        else:
+            message = self.MSG_VMS_ALREADY_MOVED
+
+        moved_vms = self.__get_results_by_vm(names_by_id, results)
+        facts = {'moved_vms': moved_vms, 'not_found_vms': not_found_vms}
+        self.__check_task_results(moved_vms, facts)
+        return bool(tasks), message, facts
+
     def __create_backup(self):
+        from simplivity.exceptions import HPESimpliVityResourceNotFound
+
         changed = True
         message = self.MSG_BACKUP_CREATED
 
@@ -282,7 +655,16 @@ class VirtualMachineModule(SimplivityModule):
             changed = False
             message = self.MSG_BACKUP_EXISTS
             data = {}
-        except exceptions.HPESimpliVityResourceNotFound:
+        except HPESimpliVityResourceNotFound:
+            if not self.module.params.get('wait', True):
+                body = {"backup_name": backup_name,
+                        "app_consistent": app_consistent,
+                        "consistency_type": consistency_type,
+                        "retention": retention}
+                if cluster_name:
+                    body["destination_id"] = self.ovc_client.omnistack_clusters.get_by_name(cluster_name).data["id"]
+                return self.__start_task('backup', body)
+
             backup = self.active_resource.create_backup(backup_name,
                                                         cluster_name,
                                                         app_consistent,
@@ -292,6 +674,230 @@ class VirtualMachineModule(SimplivityModule):
 
         return changed, message, {'backup': data}
 
+    def __create_backups(self):
+        """
+        Backs up many VMs, keeping up to max_concurrent backup tasks running, and skipping the VMs that already
+        have a backup with the same name.
+        """
+        backup_name = self.data["backup_name"]
+        cluster_name = self.data.get("cluster_name", None)
+        body = {"backup_name": backup_name,
+                "app_consistent": self.data.get("app_consistent", False),
+                "consistency_type": self.data.get("consistency_type", None),
+                "retention": self.data.get("retention", 0)}
+        if cluster_name:
+            body["destination_id"] = self.ovc_client.omnistack_clusters.get_by_name(cluster_name).data["id"]
+
+        vms, not_found_vms = self.__get_vms_by_name(self.data.get("vm_names") or [])
+        vms_by_id, not_found_ids = self.__get_vms_by_name(self.data.get("vm_ids") or [], field="id")
+        # A VM requested both by name and by ID is backed up once
+        vms = list(collections.OrderedDict((vm.data["id"], vm) for vm in vms + vms_by_id).values())
+
+        # The results are keyed by VM ID, as the VM names are only unique in a datastore
+        results = {}
+        backed_up_vm_ids = self.__get_backed_up_vm_ids(backup_name, [vm.data["id"] for vm in vms])
+        for vm in vms:
+            if vm.data["id"] in backed_up_vm_ids:
+                results[vm.data["id"]] = dict(status='EXISTS')
+
+        tasks = self.__run_tasks('backup', [(vm.data["id"], vm, body) for vm in vms
+                                            if vm.data["id"] not in backed_up_vm_ids])
+        created = self.__get_task_results(tasks, 'backup', self.ovc_client.backups, results)
+
+        if created:
+            message = self.MSG_BACKUPS_CREATED
+        elif tasks:
+            message = self.MSG_BACKUPS_STARTED
+        else:
+            message = self.MSG_BACKUPS_EXIST
+
+        vm_backups = self.__get_results_by_vm(collections.OrderedDict((vm.data["id"], vm.data["name"]) for vm in vms),
+                                              results)
+        facts = {'vm_backups': vm_backups, 'not_found_vms': not_found_vms + not_found_ids}
+        self.__check_task_results(vm_backups, facts)
+        return bool(tasks), message, facts
+
+    def __get_task_results(self, tasks, object_type, resource_client, results, status='CREATED'):
+        """
+        Adds the results of the tasks run by __run_tasks, getting the resources they created with one request per
+        batch.
+
+        :arg list tasks: Tuples (key, task facts)
+        :arg str object_type: Type of the created resources, in the affected objects of the tasks
+        :arg resource_client: SDK client of the created resources
+        :arg dict results: Results by key, updated with the status, and the resource facts in the object type
+            field, with the status STARTED and the task facts, or with the status FAILED, the error and the task facts.
+        :arg str status: Status of the finished tasks, such as CREATED
+        :return: int: Number of created resources
+        """
+        keys_by_id = {}
+        for key, task in tasks:
+            if task["state"] in self.TASK_PENDING_STATES:
+                results[key] = dict(status='STARTED', task=task)
+            elif task["state"] == 'COMPLETED':
+                keys_by_id.update((item["object_id"], key) for item in task["affected_objects"]
+                                  if item["object_type"] == object_type)
+            else:
+                results[key] = dict(status='FAILED', error=task.get("message"), task=task)
+
+        ids = list(keys_by_id)
+        for index in range(0, len(ids), self.NAME_BATCH_SIZE):
+            batch = ids[index:index + self.NAME_BATCH_SIZE]
+            for resource in resource_client.get_all(filters={'id': ','.join(batch)}):
+                results[keys_by_id[resource.data["id"]]] = {'status': status, object_type: resource.data}
+
+        return len(keys_by_id)
+
+    def __get_results_by_vm(self, names_by_id, results):
+        """
+        Gets the results keyed by VM ID by name instead, or by ID for the VMs with the same name.
+
+        :arg OrderedDict names_by_id: VM names by VM ID, in the order of the results
+        :arg dict results: Results by VM ID
+        :return: OrderedDict: Results by VM name or ID
+        """
+        name_counts = collections.Counter(names_by_id.values())
+        return collections.OrderedDict((name if name_counts[name] == 1 else vm_id, results[vm_id])
+                                       for vm_id, name in names_by_id.items() if vm_id in results)
+
+    def __check_task_results(self, results, facts):
+        """
+        Fails when a task failed, returning the facts with the result of each task, as the other tasks may have
+        changed the OVC.
+
+        :arg dict results: Results by key, from __get_task_results
+        :arg dict facts: Facts returned by the state
+        """
+        errors = ['{0}: {1}'.format(key, result["error"]) for key, result in results.items() if result["status"] == 'FAILED']
+        if errors:
+            changed = any(result["status"] not in ('EXISTS', 'FAILED') for result in results.values())
+            raise SimplivityModuleTaskError(self.MSG_TASKS_FAILED.format('; '.join(errors)),
+                                            result=dict(changed=changed, ansible_facts=facts))
+
+    def __get_backed_up_vm_ids(self, backup_name, vm_ids):
+        """
+        Gets the VMs having a backup with a name, with one request per batch of VMs and page of backups. A VM may
+        have many backups with the same name, such as the ones of a recurring backup, so a batch may have more
+        backups than the OVC sends at once.
+
+        :return: set: IDs of the VMs
+        """
+        vm_id_set = set()
+        for index in range(0, len(vm_ids), self.NAME_BATCH_SIZE):
+            batch = vm_ids[index:index + self.NAME_BATCH_SIZE]
+            offset = 0
+            while True:
+                backups = self.ovc_client.backups.get_all(filters={'name': backup_name, 'virtual_machine_id': ','.join(batch)},
+                                                          fields='virtual_machine_id', limit=self.DEFAULT_PAGE_SIZE, offset=offset)
+                vm_id_set.update(backup.data["virtual_machine_id"] for backup in backups)
+                if len(backups) < self.DEFAULT_PAGE_SIZE:
+                    break
+                offset += len(backups)
+        return vm_id_set
+
+    def __run_tasks(self, action, requests, groups=None, max_per_group=None):
+        """
+        Runs many VM actions, keeping up to max_concurrent tasks running. The running tasks are polled together,
+        and the next VM action starts as soon as one of them finishes. A VM action that fails to start gets a task
+        in the ERROR state.
+
+        :arg str action: VM action, as in the REST API path
+        :arg list requests: Tuples (key identifying the request, VM, request body same as the SDK one)
+        :arg dict groups: Group of each request key, such as its pair of datastores
+        :arg int max_per_group: Maximum number of tasks running at the same time in a group. The next request
+            started is the first one of the queue whose group is below the limit.
+        :return: list: Tuples (key, last task facts). The tasks are still running when wait is false. A task whose
+            polls failed MAX_POLL_ERRORS times in a row is in the ERROR state, the other tasks are still polled.
+        """
+        from simplivity.exceptions import HPESimpliVityException
+
+        wait = self.module.params.get('wait', True)
+        max_concurrent = max(self.module.params.get('max_concurrent') or 1, 1)
+        groups = groups or {}
+        max_per_group = max(max_per_group or max_concurrent, 1)
+        queue = collections.deque(requests)
+        running = collections.OrderedDict()
+        running_per_group = collections.Counter()
+        poll_errors = collections.Counter()
+        tasks = []
+        poll_interval = 0
+
+        while queue or running:
+            while queue and len(running) < max_concurrent:
+                request = next((request for request in queue if running_per_group[groups.get(request[0])] < max_per_group), None)
+                if request is None:
+                    break
+                queue.remove(request)
+
+                key, vm, body = request
+                try:
+                    task = self.__post_vm_action(vm, action, body)
+                except (HPESimpliVityException, SimplivityModuleTaskError) as error:
+                    task = dict(state='ERROR', message=to_native(error))
+
+                if task["state"] in self.TASK_PENDING_STATES:
+                    running[task["id"]] = key
+                    running_per_group[groups.get(key)] += 1
+                else:
+                    tasks.append((key, task))
+
+            if not wait and not queue:
+                break
+
+            if running:
+                poll_interval = min(poll_interval + 1, self.MAX_POLL_INTERVAL)
+                time.sleep(poll_interval)
+
+                for task_id in list(running):
+                    try:
+                        task = self.ovc_client.connection.get("/tasks/{0}".format(task_id))["task"]
+                    except HPESimpliVityException as error:
+                        # A transient error, such as a dropped connection, the task is polled again
+                        poll_errors[task_id] += 1
+                        if poll_errors[task_id] < self.MAX_POLL_ERRORS:
+                            continue
+                        task = dict(id=task_id, state='ERROR', message=to_native(error))
+                    else:
+                        poll_errors.pop(task_id, None)
+
+                    if task["state"] not in self.TASK_PENDING_STATES:
+                        key = running.pop(task_id)
+                        running_per_group[groups.get(key)] -= 1
+                        tasks.append((key, task))
+                        # A slot is free, the next poll comes early
+                        poll_interval = 0
+
+        for task_id, key in running.items():
+            tasks.append((key, dict(id=task_id, state=self.TASK_PENDING_STATES[0])))
+
+        return tasks
+
+    def __post_vm_action(self, vm, action, body):
+        """
+        Starts a VM action, without waiting for its OVC task as the SDK does.
+
+        :arg vm: VM
+        :arg str action: VM action, as in the REST API path
+        :arg dict body: Request body, same as the SDK one
+        :return: dict: Task facts
+        """
+        uri = "/virtual_machines/{0}/{1}".format(vm.data["id"], action)
+        task, body = self.ovc_client.connection.post(uri, body)
+        if not task:
+            raise SimplivityModuleTaskError(body)
+
+        return task["task"]
+
+    def __start_task(self, action, body):
+        """
+        Starts an action of the VM, without waiting for its OVC task.
+
+        :arg str action: VM action, as in the REST API path
+        :arg dict body: Request body, same as the SDK one
+        :return: Tuple (changed, message, facts with the task)
+        """
+        return True, self.MSG_TASK_STARTED, {'task': self.__post_vm_action(self.active_resource, action, body)}
+
     def __set_backup_parameters(self):
         changed = True
         message = self.MSG_CREATED_BACKUP_PARAMETERS
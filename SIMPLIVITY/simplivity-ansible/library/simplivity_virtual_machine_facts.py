@@ -40,6 +40,59 @@ options:
       description:
         - 'List with options to gather additional facts about a Virtual Machine
           Options allowed: C(bakups)'
+    fields:
+      description:
+        - List with the names of the fields of the virtual machines to gather. Default is all of them. The OVC only sends
+          these fields when getting all the virtual machines.
+    max_items:
+      description:
+        - Maximum number of virtual machines to gather. The virtual machines are requested page by page, and the requests stop once
+          this number is reached.
+    page_size:
+      description:
+        - Number of virtual machines requested per page. When C(page_size) or C(max_items) is set, the pages are requested
+          one after the other, starting at the C(offset) of C(params), until the last one. Default is 500.
+    cache_ttl:
+      description:
+        - Seconds the gathered facts are cached on the controller. While they are cached, the tasks gathering
+          the same facts from the same OVC get them without connecting to it. The cached facts of an OVC are
+          discarded when a module changes it, such as simplivity_virtual_machine. It can also be set with the
+          environment variable SIMPLIVITY_FACTS_CACHE_TTL. Default is no cache.
+    cache_refresh:
+      description:
+        - Gathers the facts from the OVC even when they are cached, and caches them again. Default is false.
+    output_file:
+      description:
+        - Path of a file the VMs are written to, in JSON Lines format, instead of returning them in C(virtual_machines).
+          The VMs are requested page by page and written as they arrive, and the file is replaced once they are all
+          written. Only the path, count and checksum of the file are returned, in C(virtual_machines_output_file). The
+          facts cache is not used with this option.
+    output_format:
+      description:
+        - Format of C(virtual_machines). With C(records), it is a list with one dict per resource. With C(columnar),
+          it is a dict with the C(keys) of the resources, one list of values per key in C(columns), with null where
+          a resource does not have the key, and the C(count) of resources. A column of strings repeating their
+          values is a dict with the distinct C(values) and, for each resource, the index of its value in C(indexes).
+          It is smaller and faster to parse for many resources. Default is records.
+      choices: ['records', 'columnar']
+    metrics:
+      description:
+        - Gathers the performance metrics of the VMs, such as iops, throughput and latency, in C(vm_metrics).
+          The metrics are requested for each VM gathered. Default is false.
+    metrics_range:
+      description:
+        - Seconds of metrics to gather, ending C(metrics_time_offset) seconds ago. Default is 43200.
+    metrics_resolution:
+      description:
+        - Resolution of the metrics. Default is MINUTE.
+      choices: ['SECOND', 'MINUTE', 'HOUR', 'DAY']
+    metrics_time_offset:
+      description:
+        - Seconds between now and the end of the metrics. Default is 0.
+    metrics_aggregations:
+      description:
+        - Aggregations computed for each metric over the range. Default is none.
+      choices: ['min', 'max', 'avg', 'p95']
 '''
 
 EXAMPLES = '''
@@ -61,6 +114,33 @@ EXAMPLES = '''
       filters:
         name: '{{ name }}'
 
+- name: Gather the id, name and state of all the VMs
+  simplivity_virtual_machine_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    fields:
+      - id
+      - name
+      - state
+  delegate_to: localhost
+
+- name: Gather facts about all VMs, reusing the facts gathered less than 5 minutes ago
+  simplivity_virtual_machine_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    cache_ttl: 300
+  delegate_to: localhost
+
+- name: Gather facts about all VMs as columns, with the repeated names stored once
+  simplivity_virtual_machine_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    output_format: columnar
+  delegate_to: localhost
+
 - name: Gather facts about a VM by name
   simplivity_virtual_machine_facts:
     ovc_ip: <ip>
@@ -78,18 +158,40 @@ EXAMPLES = '''
     options:
       - backups
   delegate_to: localhost
+
+- name: Gather a week of hourly metrics of the Virtual Machines, with their peaks
+  simplivity_virtual_machine_facts:
+    ovc_ip: <ip>
+    username: <username>
+    password: <password>
+    metrics: true
+    metrics_range: 604800
+    metrics_resolution: HOUR
+    metrics_aggregations: ['max', 'p95']
+  delegate_to: localhost
 '''
 
 RETURN = '''
 virtual_machines:
-    description: Facts about the SimpliVity Virtual Machines
-    returned: Always, but can be empty list.
+    description: Facts about the SimpliVity Virtual Machines. A dict of columns with the columnar output_format.
+    returned: When output_file is not set, but can be empty list.
     type: list
 
 backups:
     description: Facts about all the backups of a SimpliVity Virtual Machine.
     returned: Always, but can be empty list
     type: list
+vm_metrics:
+    description: Performance metrics of the SimpliVity VMs, when C(metrics) is true. One dict per VM, with its
+                 id and name, the timestamps, the columns with one value per timestamp, named after the metric and
+                 the value, such as iops_reads, and the aggregations of each column.
+    returned: When metrics is true, but can be empty list.
+    type: list
+virtual_machines_output_file:
+    description: Path, count of VMs and SHA-1 checksum of the output file, the same as the checksum of the stat
+                 module.
+    returned: When output_file is set.
+    type: dict
 '''
 
 from ansible.module_utils.simplivity import SimplivityModule
@@ -101,27 +203,38 @@ class VirtualMachineFactsModule(SimplivityModule):
         argument_spec = dict(name=dict(type='str'),
                              options=dict(type='list'),
                              params=dict(type='dict'))
+        argument_spec.update(self.FACTS_ARGS)
+        argument_spec.update(self.METRICS_ARGS)
 
         super(VirtualMachineFactsModule, self).__init__(additional_arg_spec=argument_spec)
         self.set_resource_object(self.ovc_client.virtual_machines)
 
     def execute_module(self):
-        facts = {'virtual_machines': []}
+        vms = []
+        backup_data_list = None
 
         if self.module.params['name'] and self.active_resource:
-            facts["virtual_machines"].append(self.active_resource.data)
+            vms = [self.active_resource]
 
             if self.options.get("backups"):
                 backup_data_list = []
                 backups = self.active_resource.get_backups()
                 for backup in backups:
                     backup_data_list.append(backup.data)
-                facts["backups"] = backup_data_list
 
         elif not self.module.params['name']:
-            vms = self.resource_client.get_all(**self.facts_params)
-            for vm in vms:
-                facts["virtual_machines"].append(vm.data)
+            vms = self.get_all_resources()
+
+        if self.module.params.get('metrics'):
+            # The metrics are requested per VM once the VMs are gathered
+            vms = list(vms)
+
+        facts = self.get_records_facts('virtual_machines', (self.get_facts_data(vm) for vm in vms))
+        if backup_data_list is not None:
+            facts["backups"] = backup_data_list
+
+        if self.module.params.get('metrics'):
+            facts['vm_metrics'] = self.get_metrics_facts('/virtual_machines', vms)
 
         return dict(changed=False, ansible_facts=facts)
 
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+DOCUMENTATION = '''
+---
+author:
+    - Sijeesh Kattumunda (@sijeesh)
+httpapi: simplivity
+short_description: HttpApi plugin for the HPE SimpliVity OVC REST API
+description:
+    - Keeps one authenticated session with the OVC, shared by all the simplivity_* tasks of a host.
+    - The modules detect the persistent connection and send their REST calls through it,
+      instead of logging in to the OVC on every task.
+version_added: 1.1.0
+'''
+
+import json
+
+from ansible.errors import AnsibleAuthenticationFailure
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.plugins.httpapi import HttpApiBase
+
+API_PATH = '/api'
+LOGIN_URL = '/oauth/token'
+ACCEPT = 'application/vnd.simplivity.v1+json'
+CONTENT_TYPE = 'application/vnd.simplivity.v1.8+json'
+# The OVC OAuth client is always 'simplivity' with an empty secret
+CLIENT_AUTHORIZATION = 'Basic c2ltcGxpdml0eTo='
+
+
+class HttpApi(HttpApiBase):
+
+    def login(self, username, password):
+        """
+        Gets an OAuth access token, used by all the following requests of the connection.
+        """
+        headers = {'Accept': ACCEPT,
+                   'Content-type': 'application/x-www-form-urlencoded',
+                   'Authorization': CLIENT_AUTHORIZATION}
+        data = urlencode(dict(grant_type='password', username=username, password=password))
+
+        response, response_data = self.connection.send(API_PATH + LOGIN_URL, to_bytes(data), method='POST', headers=headers)
+        body = self._load_body(response_data)
+
+        if 'access_token' not in body:
+            raise AnsibleAuthenticationFailure('Invalid credentials for the OVC {0}'.format(self.connection.get_option('host')))
+
+        self.connection._auth = {'Authorization': 'Bearer ' + body['access_token']}
+
+    def logout(self):
+        self.connection._auth = None
+
+    def update_auth(self, response, response_text):
+        # The token only comes from the login, the OVC responses carry no authentication data
+        return None
+
+    def send_request(self, data, path, method='GET', headers=None):
+        """
+        Sends a request to the OVC REST API. The token is renewed by handle_httperror when the OVC answers 401.
+
+        :arg str data: Request body
+        :arg str path: Resource path, relative to the API root
+        :arg str method: HTTP method
+        :arg dict headers: Headers to append or update on the default ones
+        :return: Tuple (HTTP status, response body)
+        """
+        request_headers = {'Accept': ACCEPT, 'Content-type': CONTENT_TYPE}
+        if headers:
+            request_headers.update(headers)
+
+        response, response_data = self.connection.send(API_PATH + path, to_bytes(data) if data else None,
+                                                       method=method, headers=request_headers)
+
+        return response.getcode(), self._load_body(response_data)
+
+    @staticmethod
+    def _load_body(response_data):
+        content = to_text(response_data.getvalue())
+        try:
+            return json.loads(content) if content else {}
+        except ValueError:
+            return {'message': content}
@@ -0,0 +1,241 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+DOCUMENTATION = '''
+---
+author:
+    - Sijeesh Kattumunda (@sijeesh)
+name: simplivity
+plugin_type: inventory
+short_description: HPE SimpliVity VMs inventory source
+description:
+    - Gets the VMs of an OVC, grouped by OmniStack cluster, datastore, policy and host.
+    - The configuration file name must end with simplivity.yml or simplivity.yaml.
+    - The inventory host name is the VM name, and the fields of the VM are set as host variables prefixed with
+      simplivity_, such as simplivity_id and simplivity_policy_name.
+    - The VM names are only unique in a datastore, so the VMs with the same name are added as distinct hosts named
+      after the VM and datastore names, such as vm1_datastore1, or the VM name and ID when they are in the same
+      datastore, with a warning.
+    - With the inventory cache, the VMs are only requested from the OVC once per C(cache_timeout).
+version_added: 1.1.0
+requirements:
+    - python >= 3.3
+    - simplivity >= 1.0.0
+extends_documentation_fragment:
+    - constructed
+    - inventory_cache
+options:
+    plugin:
+      description: Token that ensures this is a source file for the simplivity plugin.
+      required: true
+      choices: ['simplivity']
+    ovc_ip:
+      description: IP address or hostname of the OVC.
+      required: true
+      env:
+        - name: SIMPLIVITYSDK_OVC_IP
+    username:
+      description: OVC username.
+      required: true
+      env:
+        - name: SIMPLIVITYSDK_USERNAME
+    password:
+      description: OVC password.
+      required: true
+      env:
+        - name: SIMPLIVITYSDK_PASSWORD
+    ssl_certificate:
+      description: Trusted CA bundle. The OVC certificate is not verified when it is not set.
+      env:
+        - name: SIMPLIVITYSDK_SSL_CERTIFICATE
+    timeout:
+      description: Connection timeout in seconds.
+      env:
+        - name: SIMPLIVITYSDK_CONNECTION_TIMEOUT
+    token_cache:
+      description: Shares the OVC access token with the simplivity_* modules through the on-disk token cache.
+      type: bool
+      default: false
+      env:
+        - name: SIMPLIVITY_TOKEN_CACHE
+    filters:
+      description: Filters of the VMs sent to the OVC, such as C(state) or C(omnistack_cluster_name).
+      type: dict
+      default: {}
+    page_size:
+      description: Number of VMs requested per page.
+      type: int
+      default: 500
+    group_by:
+      description: Groups of VMs added to the inventory, named after the prefix, the group type and the name of the
+                   OmniStack cluster, datastore, policy or host, such as simplivity_cluster_cluster1.
+      type: list
+      default: ['cluster', 'datastore', 'policy', 'host']
+      choices: ['cluster', 'datastore', 'policy', 'host']
+    group_prefix:
+      description: Prefix of the names of the groups.
+      default: simplivity_
+'''
+
+EXAMPLES = '''
+# simplivity.yml, with the credentials in the SIMPLIVITYSDK_* environment variables
+plugin: simplivity
+group_by:
+  - cluster
+  - policy
+filters:
+  state: ALIVE
+cache: true
+cache_plugin: jsonfile
+cache_connection: ~/.ansible/simplivity_inventory
+cache_timeout: 600
+keyed_groups:
+  - key: simplivity_hypervisor_virtual_machine_power_state
+    prefix: power
+'''
+
+import os
+import sys
+
+from collections import Counter
+
+from ansible.errors import AnsibleError
+from ansible.inventory.group import to_safe_group_name
+from ansible.module_utils._text import to_native
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+from ansible.utils.display import Display
+
+try:
+    from ansible.module_utils.simplivity_connection import create_plugin_session, get_all_pages
+except ImportError:
+    # The module_utils are not installed with Ansible, they are imported from the library directory next to the
+    # plugins, as the OVC broker does
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 'library'))
+    from module_utils import simplivity
+    sys.modules.setdefault('ansible.module_utils.simplivity', simplivity)
+    from module_utils.simplivity_connection import create_plugin_session, get_all_pages
+
+display = Display()
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+
+    NAME = 'simplivity'
+    HOST_VARS_PREFIX = 'simplivity_'
+    # Field of the VMs holding the name of each group type, the hosts are only referenced by ID
+    GROUP_FIELDS = dict(cluster='omnistack_cluster_name', datastore='datastore_name', policy='policy_name',
+                        host='host_name')
+
+    def verify_file(self, path):
+        """
+        Accepts the configuration files named simplivity.yml or simplivity.yaml, with any prefix.
+        """
+        return super(InventoryModule, self).verify_file(path) and path.endswith(('simplivity.yml', 'simplivity.yaml'))
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        vms = None
+        if attempt_to_read_cache:
+            try:
+                vms = self._cache[cache_key]
+            except KeyError:
+                cache_needs_update = True
+
+        if vms is None:
+            vms = self._get_vms()
+
+        if cache_needs_update:
+            self._cache[cache_key] = vms
+
+        self._populate(vms)
+
+    def _get_all(self, resource_client, **params):
+        return (resource.data for resource in get_all_pages(resource_client, self.get_option('page_size'), **params))
+
+    def _get_vms(self):
+        """
+        Gets the VMs from the OVC, with the name of their host, as the data cached between runs.
+
+        :return: list: VMs data
+        """
+        from simplivity.exceptions import HPESimpliVityException
+
+        ovc_client = create_plugin_session(self.get_option)
+        try:
+            host_names = dict((host['id'], host['name']) for host in self._get_all(ovc_client.hosts, fields='id,name'))
+            vms = list(self._get_all(ovc_client.virtual_machines, filters=self.get_option('filters') or None))
+        except HPESimpliVityException as error:
+            raise AnsibleError('Failed to get the VMs from the OVC {0}: {1}'.format(self.get_option('ovc_ip'), to_native(error)))
+        finally:
+            ovc_client.connection.close()
+
+        for vm in vms:
+            vm['host_name'] = host_names.get(vm.get('host_id'))
+        return vms
+
+    def _get_host_names(self, vms):
+        """
+        Gets the inventory host name of each VM, as add_host would merge the VMs with the same name.
+
+        :return: list: Host names, in the order of the VMs
+        """
+        name_counts = Counter(vm['name'] for vm in vms)
+        datastore_counts = Counter((vm['name'], vm.get('datastore_name')) for vm in vms)
+
+        duplicated_names = sorted(name for name, count in name_counts.items() if count > 1)
+        if duplicated_names:
+            display.warning('Several SimpliVity VMs are named {0}, their inventory hosts are named after their '
+                            'datastore or ID'.format(', '.join(duplicated_names)))
+
+        host_names = []
+        for vm in vms:
+            if name_counts[vm['name']] == 1:
+                host_names.append(vm['name'])
+            elif datastore_counts[(vm['name'], vm.get('datastore_name'))] == 1:
+                host_names.append('{0}_{1}'.format(vm['name'], vm.get('datastore_name')))
+            else:
+                host_names.append('{0}_{1}'.format(vm['name'], vm['id']))
+        return host_names
+
+    def _populate(self, vms):
+        strict = self.get_option('strict')
+        prefix = self.get_option('group_prefix')
+
+        for vm, host_name in zip(vms, self._get_host_names(vms)):
+            host = self.inventory.add_host(host_name)
+            for key, value in vm.items():
+                self.inventory.set_variable(host, self.HOST_VARS_PREFIX + key, value)
+
+            for group_type in self.get_option('group_by'):
+                name = vm.get(self.GROUP_FIELDS[group_type])
+                if name:
+                    group = self.inventory.add_group(to_safe_group_name('{0}{1}_{2}'.format(prefix, group_type, name)))
+                    self.inventory.add_child(group, host)
+
+            hostvars = self.inventory.get_host(host).get_vars()
+            self._set_composite_vars(self.get_option('compose'), hostvars, host, strict=strict)
+            self._add_host_to_composed_groups(self.get_option('groups'), hostvars, host, strict=strict)
+            self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, host, strict=strict)
@@ -0,0 +1,279 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+DOCUMENTATION = '''
+---
+author:
+    - Sijeesh Kattumunda (@sijeesh)
+name: simplivity
+short_description: Looks up a field of SimpliVity resources by name
+description:
+    - Returns a field of the SimpliVity resources matching the terms, such as the ID of a policy from its name, or the
+      host of a VM.
+    - The resources are requested from the OVC once per C(resource), C(key), C(field) and C(filters), by pages, and
+      kept in memory in an LRU cache until C(cache_ttl) expires, so the following lookups do not connect to the OVC.
+    - Ansible evaluates the templates of each task in a separate process, so the resources are also kept in the facts
+      cache of the controller, shared with the next tasks, and discarded when a module changes the OVC, such as
+      simplivity_virtual_machine.
+version_added: 1.1.0
+requirements:
+    - python >= 3.3
+    - simplivity >= 1.0.0
+options:
+    _terms:
+      description: Values of C(key) of the resources to look up, such as policy names.
+      required: true
+    resource:
+      description: Type of the resources.
+      default: virtual_machines
+      choices: ['virtual_machines', 'policies', 'datastores', 'hosts', 'omnistack_clusters']
+    key:
+      description: Field of the resources matching the terms.
+      default: name
+    field:
+      description: Field of the resources returned. The whole resources are returned when it is empty.
+      default: id
+    filters:
+      description: Filters of the resources sent to the OVC, such as C(datastore_name), to tell apart the VMs with
+                   the same name.
+      type: dict
+      default: {}
+    default:
+      description: Value returned for the terms matching no resource. The lookup fails when it is not set.
+    ovc_ip:
+      description: IP address or hostname of the OVC.
+      required: true
+      env:
+        - name: SIMPLIVITYSDK_OVC_IP
+    username:
+      description: OVC username.
+      required: true
+      env:
+        - name: SIMPLIVITYSDK_USERNAME
+    password:
+      description: OVC password.
+      required: true
+      env:
+        - name: SIMPLIVITYSDK_PASSWORD
+    ssl_certificate:
+      description: Trusted CA bundle. The OVC certificate is not verified when it is not set.
+      env:
+        - name: SIMPLIVITYSDK_SSL_CERTIFICATE
+    timeout:
+      description: Connection timeout in seconds.
+      env:
+        - name: SIMPLIVITYSDK_CONNECTION_TIMEOUT
+    token_cache:
+      description: Shares the OVC access token with the simplivity_* modules through the on-disk token cache.
+      type: bool
+      default: false
+      env:
+        - name: SIMPLIVITY_TOKEN_CACHE
+    page_size:
+      description: Number of resources requested per page.
+      type: int
+      default: 500
+    cache_ttl:
+      description: Seconds the resources are cached. The resources are requested by each lookup when it is 0.
+      type: int
+      default: 300
+      env:
+        - name: SIMPLIVITY_LOOKUP_CACHE_TTL
+    cache_size:
+      description: Maximum number of listings kept in memory, the least recently used ones are discarded first.
+      type: int
+      default: 64
+'''
+
+EXAMPLES = '''
+# The credentials are in the SIMPLIVITYSDK_* environment variables
+- name: Set the policy of the VMs, the policies are requested once for all the items
+  simplivity_virtual_machine:
+    state: present
+    data:
+      name: "{{ item.name }}"
+      policy_id: "{{ lookup('simplivity', item.policy, resource='policies') }}"
+  loop: "{{ vms }}"
+  delegate_to: localhost
+
+- name: Get the IDs of two datastores
+  debug:
+    msg: "{{ query('simplivity', 'datastore1', 'datastore2', resource='datastores') }}"
+
+- name: Get the name of the host of a VM, from the host ID of the VM
+  debug:
+    msg: "{{ lookup('simplivity', lookup('simplivity', 'vm1', field='host_id'), resource='hosts', key='id', field='name') }}"
+
+- name: Get a VM of a datastore, as the VM names are not unique across datastores
+  debug:
+    msg: "{{ lookup('simplivity', 'vm1', field='', filters={'datastore_name': 'datastore1'}) }}"
+'''
+
+RETURN = '''
+_raw:
+    description: Value of C(field) of the resource matching each term, or the whole resource when C(field) is empty.
+    type: list
+'''
+
+import os
+import sys
+import time
+
+from collections import OrderedDict
+
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_native, to_text
+from ansible.plugins.lookup import LookupBase
+
+try:
+    from ansible.module_utils.simplivity import credentials_fingerprint
+    from ansible.module_utils.simplivity_connection import create_plugin_session, get_all_pages
+    from ansible.module_utils.simplivity_facts_cache import FactsCache
+except ImportError:
+    # The module_utils are not installed with Ansible, they are imported from the library directory next to the
+    # plugins, as the inventory plugin does
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 'library'))
+    from module_utils import simplivity
+    sys.modules.setdefault('ansible.module_utils.simplivity', simplivity)
+    from module_utils.simplivity import credentials_fingerprint
+    from module_utils.simplivity_connection import create_plugin_session, get_all_pages
+    from module_utils.simplivity_facts_cache import FactsCache
+
+
+class LRUCache(object):
+    """
+    Entries expiring at a given time, at most maxsize of them, discarding the least recently used ones first.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        :return: Value, or None when it is missing or expired.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[0] <= time.time():
+            return None
+
+        # Reinserted as the most recently used one
+        self._entries[key] = entry
+        return entry[1]
+
+    def set(self, key, value, expires_at):
+        self._entries.pop(key, None)
+        self._entries[key] = (expires_at, value)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Kept for the life of the process, across the lookups of its templates
+_LISTINGS = LRUCache(64)
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+
+        listing = self._get_listing()
+        default = self.get_option('default')
+        resource = self.get_option('resource')
+
+        values = []
+        for term in terms:
+            matches = listing.get(to_text(term), [])
+            if len(matches) > 1:
+                raise AnsibleError("{0} {1} match {2}='{3}', set filters to tell them apart".format(
+                    len(matches), resource, self.get_option('key'), to_native(term)))
+            elif matches:
+                values.append(matches[0])
+            elif default is not None:
+                values.append(default)
+            else:
+                raise AnsibleError("No {0} match {1}='{2}'".format(resource, self.get_option('key'), to_native(term)))
+
+        return values
+
+    def _get_listing(self):
+        """
+        Gets the resources, from the memory, the facts cache of the controller or the OVC.
+
+        :return: dict: List of values of field by value of key, as text
+        """
+        ovc_ip, username = self.get_option('ovc_ip'), self.get_option('username')
+        query = dict(resource=self.get_option('resource'), key=self.get_option('key'),
+                     field=self.get_option('field') or None, filters=self.get_option('filters') or {})
+        ttl = self.get_option('cache_ttl')
+        if not ttl:
+            return self._index(self._get_resources(**query), query['key'], query['field'])
+
+        key = (ovc_ip, username, credentials_fingerprint(ovc_ip, username, self.get_option('password')),
+               'simplivity_lookup', query)
+        facts_cache = FactsCache()
+        facts_cache_key = FactsCache.key(*key)
+        # Read before getting the resources, so an OVC change made meanwhile makes them stale. The memory entries
+        # of an older generation are not found anymore, once a module changed the OVC.
+        generation = facts_cache.generation(ovc_ip)
+        memory_key = repr((generation, key))
+        _LISTINGS.maxsize = self.get_option('cache_size')
+
+        listing = _LISTINGS.get(memory_key)
+        if listing is not None:
+            return listing
+
+        entry = facts_cache.get(facts_cache_key, generation)
+        if entry is None:
+            listing = self._index(self._get_resources(**query), query['key'], query['field'])
+            entry = dict(expires_at=time.time() + ttl, listing=listing)
+            facts_cache.set(facts_cache_key, generation, ttl, entry)
+
+        _LISTINGS.set(memory_key, entry['listing'], entry['expires_at'])
+        return entry['listing']
+
+    @staticmethod
+    def _index(resources, key, field):
+        listing = {}
+        for resource in resources:
+            value = resource.get(field) if field else resource
+            listing.setdefault(to_text(resource.get(key)), []).append(value)
+        return listing
+
+    def _get_resources(self, resource, key, field, filters):
+        """
+        Gets the resources from the OVC, page by page, with the key and field only when the field is set.
+
+        :return: list: Resources data
+        """
+        from simplivity.exceptions import HPESimpliVityException
+
+        ovc_client = create_plugin_session(self.get_option)
+        fields = ','.join(sorted(set([key, field]))) if field else None
+
+        try:
+            return [member.data for member in get_all_pages(getattr(ovc_client, resource), self.get_option('page_size'),
+                                                            filters=filters or None, fields=fields)]
+        except HPESimpliVityException as error:
+            raise AnsibleError('Failed to get the {0} from the OVC {1}: {2}'.format(resource, self.get_option('ovc_ip'), to_native(error)))
+        finally:
+            ovc_client.connection.close()
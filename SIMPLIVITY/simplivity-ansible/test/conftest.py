@@ -33,5 +33,7 @@ def mock_ansible_module():
     patcher_ansible = patch(SIMPLIVITY_MODULE_UTILS_PATH + '.AnsibleModule')
     patcher_ansible = patcher_ansible.start()
     ansible_module = Mock()
+    # As AnsibleModule without --diff
+    ansible_module._diff = False
     patcher_ansible.return_value = ansible_module
     return ansible_module
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Benchmark of the resource comparison of module_utils/simplivity.py, on VMs with long nested lists of disks, NICs
+and backups, as returned by the OVC.
+
+Scenarios, comparing each VM with a copy of it:
+    same_order: the copy is equal, with the lists in the same order
+    reordered: the copy is equal, with all the lists reversed
+    normalized: the copy is reversed and has its numbers as floats or strings, equal for compare()
+    one_difference: the copy is reversed and one backup of the last VM is changed
+
+Times are reported in milliseconds, as the median of the rounds, for compare() and for diff(), which looks for all
+the differences.
+
+Usage:
+    PYTHONPATH=.:test:library python test/simplivity_compare_benchmark.py [--rounds N] [--vms N] [--entries N]
+"""
+
+import argparse
+import copy
+import json
+import statistics
+import time
+
+from simplivity_module_loader import simplivity
+
+SCENARIOS = ['same_order', 'reordered', 'normalized', 'one_difference']
+
+
+def sample_vms(vm_count, entry_count):
+    """
+    Builds VMs with entry_count disks, NICs and backups each.
+
+    :return: list: VMs
+    """
+    return [dict(id='vm{0}'.format(vm_index),
+                 name='vm{0}'.format(vm_index),
+                 state='ALIVE',
+                 policy_id=None,
+                 disks=[dict(id='disk{0}'.format(index), capacity_gib=float(index % 64 + 1), thin=index % 2 == 0,
+                             datastore=dict(id='datastore{0}'.format(index % 4), tags=['ssd', 'tier{0}'.format(index % 3)]))
+                        for index in range(entry_count)],
+                 nics=[dict(mac='00:50:56:{0:02x}:{1:02x}:{2:02x}'.format(vm_index % 256, index // 256, index % 256),
+                            network='vlan{0}'.format(index % 16), ips=['10.{0}.{1}.{2}'.format(vm_index % 256, index // 256, index % 256)],
+                            gateway=None)
+                       for index in range(entry_count)],
+                 backups=[dict(id='backup{0}'.format(index), name='daily', size=index * 1024, expires=None,
+                               rule=dict(frequency=1440, days=['mon', 'tue', 'wed', 'thu', 'fri']))
+                          for index in range(entry_count)])
+            for vm_index in range(vm_count)]
+
+
+def _reverse_lists(value, convert_numbers=False):
+    if isinstance(value, dict):
+        return dict((key, _reverse_lists(item, convert_numbers)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_reverse_lists(item, convert_numbers) for item in reversed(value)]
+    if convert_numbers and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(int(value)) if isinstance(value, float) else float(value)
+    return value
+
+
+def build_scenario(scenario, vms):
+    """
+    Builds the copies of the VMs to compare with.
+
+    :return: list: VMs
+    """
+    if scenario == 'same_order':
+        return copy.deepcopy(vms)
+    if scenario == 'reordered':
+        return [_reverse_lists(vm) for vm in vms]
+    if scenario == 'normalized':
+        return [_reverse_lists(vm, convert_numbers=True) for vm in vms]
+
+    others = [_reverse_lists(vm) for vm in vms]
+    others[-1]['backups'][0]['rule']['days'] = ['sat']
+    return others
+
+
+def median_time(function, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.time()
+        function()
+        samples.append(time.time() - start)
+    return statistics.median(samples) * 1000
+
+
+def run_benchmark(rounds=5, vm_count=10, entry_count=2000):
+    """
+    Runs all the scenarios.
+
+    :return: list: One dict per scenario, with the median times in milliseconds.
+    """
+    vms = sample_vms(vm_count, entry_count)
+    report = []
+
+    for scenario in SCENARIOS:
+        others = build_scenario(scenario, vms)
+        pairs = list(zip(vms, others))
+        equal = [simplivity.compare(vm, other) for vm, other in pairs]
+        differences = [path for vm, other in pairs for path in simplivity.diff(vm, other)]
+
+        report.append(dict(scenario=scenario, equal=all(equal), differences=differences,
+                           compare=median_time(lambda: [simplivity.compare(vm, other) for vm, other in pairs], rounds),
+                           diff=median_time(lambda: [simplivity.diff(vm, other) for vm, other in pairs], rounds)))
+
+    return report
+
+
+def format_report(report):
+    lines = ['{0:<16}{1:>8}{2:>12}{3:>12}  {4}'.format('scenario', 'equal', 'compare', 'diff', 'differences')]
+    for row in report:
+        differences = ', '.join(row['differences'][:5]) + (', ...' if len(row['differences']) > 5 else '')
+        lines.append('{scenario:<16}{equal!s:>8}{compare:>12.2f}{diff:>12.2f}  {0}'.format(differences, **row))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the resource comparison.')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--vms', type=int, default=10, help='Number of VMs compared.')
+    parser.add_argument('--entries', type=int, default=2000, help='Number of disks, NICs and backups of each VM.')
+    parser.add_argument('--json', action='store_true', help='Prints the report as JSON.')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.rounds, args.vms, args.entries)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,15 +22,34 @@ So, to avoid merging issues, and maintaining the tests code equal, we create a u
 configure the imports that change from one repository to another.
 """
 
+import importlib.util
+import os
 import sys
 from module_utils import simplivity
 
 SIMPLIVITY_MODULE_UTILS_PATH = 'module_utils.simplivity'
+SIMPLIVITY_PLUGINS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'plugins')
 
 sys.modules['ansible.module_utils.simplivity'] = simplivity
 
+from module_utils import simplivity_connection
+
+sys.modules['ansible.module_utils.simplivity_connection'] = simplivity_connection
+
+from module_utils import simplivity_facts_cache
+
+sys.modules['ansible.module_utils.simplivity_facts_cache'] = simplivity_facts_cache
+
+from module_utils import simplivity_metrics
+
+sys.modules['ansible.module_utils.simplivity_metrics'] = simplivity_metrics
+
+from module_utils import simplivity_fetch
+
+sys.modules['ansible.module_utils.simplivity_fetch'] = simplivity_fetch
+
+from simplivity.ovc_client import OVC
 from module_utils.simplivity import (SimplivityModule,
-                                     OVC,
                                      SimplivityModuleException,
                                      SimplivityModuleTaskError,
                                      SimplivityModuleValueError,
@@ -38,6 +57,7 @@ from module_utils.simplivity import (SimplivityModule,
                                      transform_list_to_dict,
                                      compare,
                                      get_logger)
+from module_utils.simplivity_connection import OVCConnection
 
 from simplivity_virtual_machine import VirtualMachineModule
 from simplivity_virtual_machine_facts import VirtualMachineFactsModule
@@ -46,3 +66,17 @@ from simplivity_datastore_facts import DatastoreFactsModule
 from simplivity_host_facts import HostFactsModule
 from simplivity_cluster_facts import ClusterFactsModule
 from simplivity_policy_facts import PolicyFactsModule
+from simplivity_task_facts import TaskFactsModule
+from simplivity_topology_facts import TopologyFactsModule
+
+
+def load_plugin(plugin_type, plugin_name):
+    """
+    Loads an Ansible plugin from the plugins directory, which is not a Python package.
+    """
+    module_name = 'simplivity_{0}_{1}'.format(plugin_type, plugin_name)
+    spec = importlib.util.spec_from_file_location(module_name,
+                                                  os.path.join(SIMPLIVITY_PLUGINS_PATH, plugin_type, plugin_name + '.py'))
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    return plugin
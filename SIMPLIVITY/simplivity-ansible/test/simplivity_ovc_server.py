@@ -0,0 +1,351 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+"""
+Local stand-in for the OVC REST API, used to exercise the real HTTP code paths without an OVC.
+It keeps the resources in memory and serves them over plain HTTP on localhost.
+"""
+
+import json
+import socket
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from simplivity_module_loader import OVCConnection
+
+from ansible.module_utils.six.moves import http_client
+
+
+class HTTPOVCConnection(OVCConnection):
+    """OVCConnection speaking plain HTTP, so it can reach the stand-in server."""
+
+    def _open_connection(self):
+        return http_client.HTTPConnection(self.ovc_ip, timeout=self._timeout)
+
+
+class InProcessOVCConnection(OVCConnection):
+    """OVCConnection calling the stand-in server in the same thread, without HTTP."""
+
+    def __init__(self, ovc, *args, **kwargs):
+        super(InProcessOVCConnection, self).__init__(*args, **kwargs)
+        self.ovc = ovc
+
+    def _send(self, method, path, body, headers):
+        status, response = self.ovc.serve(method, self.API_PATH + path, body, headers)
+        # Same serialization as a response read from the network
+        return status, json.loads(json.dumps(response))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _OVCRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # Headers and body are written separately, Nagle's algorithm would delay the body until the client ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.ovc.lock:
+            self.server.ovc.stats['connections'] += 1
+
+    def _reply(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8') if length else ''
+
+    def _dispatch(self, method):
+        status, response = self.server.ovc.serve(method, self.path, self._read_body(), self.headers)
+        self._reply(status, response)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+
+class OVCStandInServer(object):
+    """
+    In-memory OVC REST API.
+
+    Resources are kept per collection (virtual_machines, backups, ...) and the GET listings support the
+    limit, offset, sort, order, fields, name/id and time range filters used by the SDK. The VM actions start tasks that
+    are completed right away.
+    """
+    QUERY_PARAMS = ['limit', 'offset', 'sort', 'order', 'case', 'fields', 'show_optional_fields']
+    FOREIGN_KEYS = dict(policies='policy_id', virtual_machines='virtual_machine_id')
+    # Filter: (field, True for the earliest time, False for the latest)
+    TIME_FILTERS = dict(created_after=('created_at', True), created_before=('created_at', False),
+                        expires_after=('expiration_time', True), expires_before=('expiration_time', False))
+
+    METRICS_RESOLUTIONS = dict(SECOND=1, MINUTE=60, HOUR=3600, DAY=86400)
+    # The metrics are relative to this time, 2019-06-01T00:00:00Z
+    METRICS_END = 1559347200
+
+    def __init__(self, resources=None, username='admin', password='password'):
+        self.resources = resources or {}
+        self.credentials = {username: password}
+        self.tokens = set()
+        self.tasks = {}
+        self.stats = dict(connections=0, requests=0, logins=0, api_calls=0)
+        self.lock = threading.Lock()
+        self._server = None
+
+    @property
+    def address(self):
+        return '{0}:{1}'.format(*self._server.server_address)
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _OVCRequestHandler)
+        self._server.ovc = self
+        thread = threading.Thread(target=self._server.serve_forever, kwargs=dict(poll_interval=0.01))
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve(self, method, url, body, headers):
+        """
+        Handles a REST API request.
+
+        :return: Tuple (HTTP status, response body)
+        """
+        url = urlsplit(url)
+        path = url.path[len(OVCConnection.API_PATH):]
+
+        with self.lock:
+            self.stats['requests'] += 1
+
+        if path == OVCConnection.LOGIN_URL:
+            return self.login(dict(parse_qsl(body)))
+
+        if headers.get('Authorization', '')[len('Bearer '):] not in self.tokens:
+            return 401, {'error': 'invalid_token'}
+
+        with self.lock:
+            self.stats['api_calls'] += 1
+        return self.handle(method, path, dict(parse_qsl(url.query)), json.loads(body) if body else None)
+
+    def revoke_tokens(self):
+        self.tokens.clear()
+
+    def login(self, form):
+        if self.credentials.get(form.get('username')) != form.get('password'):
+            return 400, {'error': 'invalid_grant'}
+
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.stats['logins'] += 1
+            self.tokens.add(token)
+        return 200, {'access_token': token, 'expires_in': 86400}
+
+    def handle(self, method, path, query, body):
+        parts = path.strip('/').split('/')
+
+        if parts[0] == 'tasks' and len(parts) == 2 and parts[1] in self.tasks:
+            return 200, {'task': self.tasks[parts[1]]}
+
+        collection = self.resources.get(parts[0])
+        if collection is None:
+            return 404, {'message': 'Not found: ' + path}
+
+        if len(parts) == 1:
+            return (200, self.list_members(parts[0], collection, query)) if method == 'GET' else (405, {})
+
+        if len(parts) == 2 and method == 'POST' and hasattr(self, '_{0}_{1}'.format(*parts)):
+            # Collection action, such as /virtual_machines/set_policy
+            with self.lock:
+                return getattr(self, '_{0}_{1}'.format(*parts))(None, body)
+
+        members = [member for member in collection if member['id'] == parts[1]]
+        if not members:
+            return 404, {'message': 'Not found: ' + path}
+
+        if len(parts) == 2 and method == 'GET':
+            return 200, members[0]
+
+        if len(parts) == 3 and method == 'GET' and parts[2] == 'metrics':
+            return 200, self.metrics(members[0], query)
+
+        if len(parts) == 3 and method == 'GET' and parts[0] in self.FOREIGN_KEYS and parts[2] in self.resources:
+            foreign_key = self.FOREIGN_KEYS[parts[0]]
+            related = [member for member in self.resources[parts[2]] if member.get(foreign_key) == parts[1]]
+            return 200, {parts[2]: related}
+
+        if len(parts) == 3 and method == 'POST' and hasattr(self, '_{0}_{2}'.format(*parts)):
+            with self.lock:
+                return getattr(self, '_{0}_{2}'.format(*parts))(members[0], body)
+
+        return 404, {'message': 'Not found: ' + path}
+
+    def find(self, collection, member_id):
+        return [member for member in self.resources[collection] if member['id'] == member_id][0]
+
+    def start_task(self, object_type, object_ids):
+        """Starts a task, it is completed right away."""
+        task = dict(id=uuid.uuid4().hex,
+                    state='COMPLETED',
+                    error_code=0,
+                    affected_objects=[dict(object_id=object_id, object_type=object_type) for object_id in object_ids])
+        self.tasks[task['id']] = task
+        return 202, {'task': task}
+
+    def _virtual_machines_set_policy(self, vm, body):
+        vm_ids = body['virtual_machine_id'] if vm is None else [vm['id']]
+        policy = self.find('policies', body['policy_id'])
+
+        for vm_id in vm_ids:
+            self.find('virtual_machines', vm_id).update(policy_id=policy['id'], policy_name=policy['name'])
+        return self.start_task('virtual_machine', vm_ids)
+
+    def _virtual_machines_clone(self, vm, body):
+        clone = dict(vm, id=uuid.uuid4().hex, name=body['virtual_machine_name'])
+        self.resources['virtual_machines'].append(clone)
+        return self.start_task('virtual_machine', [clone['id']])
+
+    def _virtual_machines_move(self, vm, body):
+        datastore = self.find('datastores', body['destination_datastore_id'])
+        vm.update(name=body['virtual_machine_name'], datastore_id=datastore['id'], datastore_name=datastore['name'])
+        return self.start_task('virtual_machine', [vm['id']])
+
+    def _virtual_machines_backup(self, vm, body):
+        backup = dict(id=uuid.uuid4().hex,
+                      name=body['backup_name'],
+                      virtual_machine_id=vm['id'],
+                      virtual_machine_name=vm['name'],
+                      omnistack_cluster_id=body.get('destination_id') or vm['omnistack_cluster_id'],
+                      datastore_id=vm['datastore_id'],
+                      created_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                      state='PROTECTED',
+                      type='MANUAL',
+                      app_consistent=body.get('app_consistent'),
+                      consistency_type=body.get('consistency_type') or 'NONE')
+        self.resources.setdefault('backups', []).append(backup)
+        return self.start_task('backup', [backup['id']])
+
+    def _virtual_machines_backup_parameters(self, vm, body):
+        vm.update(guest_username=body['guest_username'],
+                  override_guest_validation=body.get('override_guest_validation'),
+                  app_aware_type=body.get('app_aware_type'))
+        return self.start_task('virtual_machine', [vm['id']])
+
+    def metrics(self, member, query):
+        """
+        Builds the iops, throughput and latency of a resource, with one data point per resolution step in the range.
+        The values only depend on the resource and the time, so they are the same on every request.
+        """
+        step = self.METRICS_RESOLUTIONS[query.get('resolution', 'MINUTE')]
+        end = self.METRICS_END - int(query.get('time_offset', 0))
+        seed = sum(ord(char) for char in member['id'])
+        times = range(end - int(query.get('range', 43200)) + step, end + 1, step)
+
+        def data_points(scale):
+            return [dict(date=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp)),
+                         reads=scale * ((timestamp // step + seed) % 97),
+                         writes=scale * ((timestamp // step * 7 + seed) % 89)) for timestamp in times]
+
+        return {'metrics': [dict(name='iops', data_points=data_points(1)),
+                            dict(name='throughput', data_points=data_points(4096)),
+                            dict(name='latency', data_points=data_points(10))]}
+
+    def list_members(self, name, collection, query):
+        filters = dict((key, unquote(value)) for key, value in query.items() if key not in self.QUERY_PARAMS)
+        time_filters = [(self.TIME_FILTERS[key], filters.pop(key)) for key in list(filters) if key in self.TIME_FILTERS]
+        members = [member for member in collection
+                   if all(str(member.get(key)) in value.split(',') for key, value in filters.items())]
+        for (field, earliest), value in time_filters:
+            members = [member for member in members if member.get(field) and (member[field] >= value) == earliest]
+
+        sort = query.get('sort', 'name')
+        members = sorted(members, key=lambda member: str(member.get(sort)), reverse=query.get('order') == 'descending')
+
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', 500))
+        page = members[offset:offset + limit]
+
+        if query.get('fields'):
+            fields = unquote(query['fields']).split(',')
+            page = [dict((key, value) for key, value in member.items() if key in fields) for member in page]
+
+        return {name: page, 'count': len(members), 'limit': limit, 'offset': offset}
+
+
+def sample_resources(vm_count=10, backups_per_vm=2):
+    """
+    Builds an OVC inventory with the fields returned by the REST API.
+
+    :return: dict: Resources by collection, for OVCStandInServer.
+    """
+    clusters = [dict(id='cluster-{0}'.format(index), name='cluster{0}'.format(index), hypervisor_type='VSPHERE',
+                     version='Release 3.7.8', arbiter_connected=True) for index in range(2)]
+    hosts = [dict(id='host-{0}'.format(index), name='host{0}'.format(index), state='ALIVE',
+                  omnistack_cluster_id=clusters[index % 2]['id'], management_ip='10.0.0.{0}'.format(index + 1),
+                  model='HPE SimpliVity 380 Series 4000', version='Release 3.7.8') for index in range(4)]
+    policies = [dict(id='policy-{0}'.format(index), name='policy{0}'.format(index),
+                     rules=[dict(frequency=60 * (index + 1), retention=1440, destination_name='<Local>')])
+                for index in range(3)]
+    datastores = [dict(id='datastore-{0}'.format(index), name='datastore{0}'.format(index),
+                       omnistack_cluster_id=clusters[index % 2]['id'], policy_id=policies[0]['id'],
+                       size=1099511627776) for index in range(2)]
+
+    vms, backups = [], []
+    for index in range(vm_count):
+        cluster, datastore, policy = clusters[index % 2], datastores[index % 2], policies[index % 3]
+        vm = dict(id='vm-{0}'.format(index), name='vm{0}'.format(index), state='ALIVE',
+                  omnistack_cluster_id=cluster['id'], omnistack_cluster_name=cluster['name'],
+                  datastore_id=datastore['id'], datastore_name=datastore['name'],
+                  policy_id=policy['id'], policy_name=policy['name'],
+                  host_id=hosts[index % 4]['id'], hypervisor_type='VSPHERE',
+                  hypervisor_virtual_machine_power_state='ON', app_aware_vm_status='CAPABLE',
+                  created_at='2019-05-{0:02d}T10:00:00Z'.format(index % 28 + 1))
+        vms.append(vm)
+        for backup_index in range(backups_per_vm):
+            backups.append(dict(id='backup-{0}-{1}'.format(index, backup_index),
+                                name='{0}-backup{1}'.format(vm['name'], backup_index),
+                                virtual_machine_id=vm['id'], virtual_machine_name=vm['name'],
+                                omnistack_cluster_id=cluster['id'], datastore_id=datastore['id'],
+                                created_at='2019-06-{0:02d}T{1:02d}:00:00Z'.format(backup_index % 28 + 1, index % 24),
+                                expiration_time='2029-06-{0:02d}T{1:02d}:00:00Z'.format(backup_index % 28 + 1, index % 24),
+                                state='PROTECTED', type='POLICY', app_consistent=False, consistency_type='NONE',
+                                size=1073741824 * (index % 5 + 1)))
+
+    return dict(omnistack_clusters=clusters, hosts=hosts, policies=policies, datastores=datastores,
+                virtual_machines=vms, backups=backups)
@@ -17,13 +17,62 @@
 ###
 
 import importlib
+import json
+import os
 import pytest
 import re
+import subprocess
+import sys
 import yaml
 
 from mock import mock
 from distutils.version import StrictVersion
 
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'library')
+
+# Modules that must only be imported once the module has parsed its arguments and creates the OVC client
+DEFERRED_MODULES = ['simplivity', 'ssl', 'http.client', 'module_utils.simplivity_connection',
+                    'module_utils.simplivity_facts_cache', 'module_utils.simplivity_metrics',
+                    'module_utils.simplivity_fetch']
+
+STARTUP_SCRIPT = """
+import json, sys, time
+import ansible.module_utils.basic
+start = time.time()
+from module_utils import simplivity
+sys.modules['ansible.module_utils.simplivity'] = simplivity
+import {module}
+print(json.dumps(dict(seconds=time.time() - start, modules=list(sys.modules))))
+"""
+
+
+def underscore(word):
+    word = re.findall('[A-Z][^A-Z]*', word)
+    word = 'simplivity_' + str.join('_', word).lower()
+    return word
+
+
+def load_module(class_name):
+    """
+    Imports a SimpliVity module from the name of its class, e.g.: HostFactsModule from simplivity_host_facts.
+
+    :return: Tuple (Python module, module class)
+    """
+    module = importlib.import_module('library.' + underscore(class_name.replace('Module', '')))
+    return module, getattr(module, class_name)
+
+
+def measure_startup(module_name):
+    """
+    Imports a module in a fresh interpreter.
+
+    :return: Tuple (import time in seconds, names of the loaded modules)
+    """
+    env = dict(os.environ, PYTHONPATH=LIBRARY_PATH, PYTHONDONTWRITEBYTECODE='1')
+    output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT.format(module=module_name)], env=env)
+    result = json.loads(output.decode('utf-8'))
+    return result['seconds'], result['modules']
+
 
 class SimplivityModuleTest(object):
     EXAMPLES = None
@@ -45,10 +94,8 @@ class SimplivityModuleTest(object):
     @pytest.fixture
     def testing_module(self):
         resource_name = type(self).__name__.replace('Test', '')
-        resource_module_path_name = self.underscore(resource_name.replace('Module', ''))
 
-        testing_module = importlib.import_module('library.' + resource_module_path_name)
-        self.testing_class = getattr(testing_module, resource_name)
+        testing_module, self.testing_class = load_module(resource_name)
         try:
             # Load scenarios from module examples (Also checks if it is a valid yaml)
             self.EXAMPLES = yaml.load(testing_module.EXAMPLES, yaml.SafeLoader)
@@ -59,9 +106,7 @@ class SimplivityModuleTest(object):
         return testing_module
 
     def underscore(self, word):
-        word = re.findall('[A-Z][^A-Z]*', word)
-        word = 'simplivity_' + str.join('_', word).lower()
-        return word
+        return underscore(word)
 
     def test_main_function_should_call_run_method(self, testing_module, mock_ansible_module):
         mock_ansible_module.params = {'config': 'config.json'}
@@ -72,6 +117,12 @@ class SimplivityModuleTest(object):
             main_func()
             mock_run.assert_called_once()
 
+    def test_module_import_should_defer_the_sdk(self, testing_module):
+        # The import time itself is checked by simplivity_benchmark.py, as it depends on the load of the machine
+        modules = measure_startup(testing_module.__name__.split('.')[-1])[1]
+
+        assert [name for name in DEFERRED_MODULES if name in modules] == []
+
 
 class SimplivityModuleFactsTest(SimplivityModuleTest):
     def test_should_get_all_using_filters(self, testing_module):
@@ -101,3 +152,91 @@ class SimplivityModuleFactsTest(SimplivityModuleTest):
         self.testing_class().run()
 
         self.resource.get_all.assert_called_once_with()
+
+    def test_should_send_the_fields_to_get_all(self, testing_module):
+        self.resource.get_all.return_value = [mock.Mock(data={'id': '1', 'name': 'test'})]
+        self.mock_ansible_module.params = dict(config='config.json', name=None, fields=['id', 'name'])
+
+        self.testing_class().run()
+
+        self.resource.get_all.assert_called_once_with(fields='id,name')
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert list(facts.values()) == [[{'id': '1', 'name': 'test'}]]
+
+    def test_should_keep_the_fields_of_the_resource_found_by_name(self, testing_module):
+        self.resource.get_by_name.return_value = mock.Mock(data={'id': '1', 'name': 'test', 'state': 'ALIVE'})
+        self.mock_ansible_module.params = dict(config='config.json', name='test', fields=['name', 'missing'])
+
+        self.testing_class().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert list(facts.values()) == [[{'name': 'test'}]]
+
+    def _enable_facts_cache(self, tmpdir, monkeypatch, **params):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        config = tmpdir.join('config.json')
+        config.write(json.dumps(dict(ip='10.0.0.1', credentials=dict(username='admin', password='password'))))
+        self.mock_ansible_module.params = dict(config=str(config), name=None, cache_ttl=60, **params)
+
+    def test_should_exit_with_the_cached_facts_before_connecting(self, testing_module, tmpdir, monkeypatch):
+        self._enable_facts_cache(tmpdir, monkeypatch)
+        self.resource.get_all.return_value = [mock.Mock(data={'id': '1'})]
+        self.testing_class().run()
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+
+        self.mock_ansible_module.exit_json.side_effect = SystemExit
+        with mock.patch.object(self.testing_class, '_create_simplivity_client') as mock_create_client:
+            with pytest.raises(SystemExit):
+                self.testing_class()
+
+        mock_create_client.assert_not_called()
+        self.resource.get_all.assert_called_once_with()
+        self.mock_ansible_module.exit_json.assert_called_with(changed=False, ansible_facts=facts)
+
+    def test_should_gather_the_facts_again_when_cache_refresh_is_set(self, testing_module, tmpdir, monkeypatch):
+        self._enable_facts_cache(tmpdir, monkeypatch)
+        self.resource.get_all.return_value = [mock.Mock(data={'id': '1'})]
+        self.testing_class().run()
+
+        self._enable_facts_cache(tmpdir, monkeypatch, cache_refresh=True)
+        self.resource.get_all.return_value = [mock.Mock(data={'id': '2'})]
+        self.testing_class().run()
+
+        self.mock_ansible_module.params['cache_refresh'] = False
+        self.mock_ansible_module.exit_json.side_effect = SystemExit
+        with pytest.raises(SystemExit):
+            self.testing_class()
+
+        assert self.resource.get_all.call_count == 2
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert list(facts.values()) == [[{'id': '2'}]]
+
+    def test_should_get_the_pages_until_max_items(self, testing_module):
+        self.resource.get_all.side_effect = [[mock.Mock()] * 2, [mock.Mock()] * 2, [mock.Mock()]]
+        self.mock_ansible_module.params = dict(config='config.json', name=None, max_items=5, page_size=2)
+
+        self.testing_class().run()
+
+        assert self.resource.get_all.call_args_list == [mock.call(limit=2, offset=0),
+                                                        mock.call(limit=2, offset=2),
+                                                        mock.call(limit=1, offset=4)]
+
+    def test_should_stop_at_the_last_page(self, testing_module):
+        self.resource.get_all.side_effect = [[mock.Mock()] * 3, [mock.Mock()]]
+        self.mock_ansible_module.params = dict(config='config.json', name=None, page_size=3)
+
+        self.testing_class().run()
+
+        assert self.resource.get_all.call_count == 2
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [len(resources) for resources in facts.values()] == [4]
+
+    def test_should_get_the_pages_using_filters_offset_and_limit(self, testing_module):
+        self.resource.get_all.side_effect = [[mock.Mock()] * 2, [mock.Mock()]]
+        self.mock_ansible_module.params = dict(config='config.json', name=None, page_size=2,
+                                               params={'filters': {'name': 'test'}, 'offset': 10, 'limit': 3})
+
+        self.testing_class().run()
+
+        assert self.resource.get_all.call_args_list == [mock.call(limit=2, offset=10, filters={'name': 'test'}),
+                                                        mock.call(limit=1, offset=12, filters={'name': 'test'})]
@@ -16,10 +16,17 @@
 # limitations under the License.
 ###
 
+import errno
+import hashlib
+import json
 import mock
+import os
 import logging
 import pytest
+import socket
 import sys
+import threading
+import time
 
 from module_utils import simplivity
 
@@ -27,15 +34,30 @@ SIMPLIVITY_MODULE_UTILS_PATH = 'module_utils.simplivity'
 
 sys.modules['ansible.module_utils.simplivity'] = simplivity
 
+from module_utils import simplivity_connection
+
+sys.modules['ansible.module_utils.simplivity_connection'] = simplivity_connection
+
 from copy import deepcopy
+from ansible.module_utils.basic import env_fallback
+from simplivity.exceptions import HPESimpliVityAuthenticationError, HPESimpliVityException
+from simplivity.ovc_client import OVC
 from module_utils.simplivity import (SimplivityModule,
-                                     OVC,
                                      SimplivityModuleException,
                                      SimplivityModuleValueError,
                                      _str_sorted,
                                      transform_list_to_dict,
                                      compare,
-                                     get_logger)
+                                     compare_list,
+                                     diff,
+                                     dump_json_lines,
+                                     from_columnar,
+                                     get_logger,
+                                     make_private_dirs,
+                                     to_columnar)
+from module_utils.simplivity_connection import OVCConnection, OVCSession, RateLimiter, TokenCache
+from module_utils.simplivity_facts_cache import FactsCache
+from module_utils.simplivity_metrics import aggregate, to_columns
 
 MSG_GENERIC_ERROR = 'Generic error message'
 MSG_GENERIC = "Generic message"
@@ -73,7 +95,9 @@ class TestSimplivityModule():
     EXPECTED_ARG_SPEC = {'config': {'type': 'path'},
                          'ovc_ip': {'type': 'str'},
                          'password': {'type': 'str', 'no_log': True},
-                         'username': {'type': 'str'}}
+                         'username': {'type': 'str'},
+                         'token_cache': {'type': 'bool', 'fallback': (env_fallback, ['SIMPLIVITY_TOKEN_CACHE'])},
+                         'rate_limit': {'type': 'bool', 'fallback': (env_fallback, ['SIMPLIVITY_RATE_LIMIT'])}}
 
     @pytest.fixture(autouse=True)
     def setUp(self):
@@ -92,6 +116,7 @@ class TestSimplivityModule():
         patcher_ansible = mock.patch(SimplivityModule.__module__ + '.AnsibleModule')
         self.mock_ansible_module_init = patcher_ansible.start()
         self.mock_ansible_module = mock.Mock()
+        self.mock_ansible_module._diff = False
         self.mock_ansible_module_init.return_value = self.mock_ansible_module
 
         yield
@@ -167,6 +192,68 @@ class TestSimplivityModule():
         self.mock_ovc_client_from_json_file.not_been_called()
         mock_ovc_client_from_credentials.assert_called_once_with(params_for_expect)
 
+    def test_should_create_ovc_session_when_token_cache_is_enabled(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        self.mock_ansible_module.params = {'ovc_ip': '10.40.4.245', 'username': 'admin', 'password': 'mypass',
+                                           'token_cache': True}
+
+        with mock.patch('module_utils.simplivity.OVC') as mock_ovc:
+            base_mod = SimplivityModule()
+
+        mock_ovc.assert_not_called()
+        assert isinstance(base_mod.ovc_client, OVCSession)
+        assert base_mod.ovc_client.connection.ovc_ip == '10.40.4.245'
+        assert base_mod.ovc_client.connection.username == 'admin'
+
+    def test_should_limit_the_rate_of_requests_when_rate_limit_is_enabled(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        self.mock_ansible_module.params = {'ovc_ip': '10.40.4.245', 'username': 'admin', 'password': 'mypass',
+                                           'rate_limit': True}
+
+        with mock.patch('module_utils.simplivity.OVC') as mock_ovc:
+            base_mod = SimplivityModule()
+
+        mock_ovc.assert_not_called()
+        assert base_mod.ovc_client.connection._rate_limiter.ovc_ip == '10.40.4.245'
+        assert base_mod.ovc_client.connection._token_cache is None
+
+    def test_should_fail_when_token_cache_is_enabled_without_credentials(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        monkeypatch.delenv('SIMPLIVITYSDK_OVC_IP', raising=False)
+        self.mock_ansible_module.params = {'config': None, 'token_cache': True}
+        self.mock_ansible_module.fail_json.side_effect = SystemExit
+
+        with pytest.raises(SystemExit):
+            SimplivityModule()
+
+        self.mock_ansible_module.fail_json.assert_called_once_with(msg=SimplivityModule.MSG_OVC_CONFIG_MISSING)
+
+    def test_should_invalidate_the_cached_facts_when_the_ovc_is_changed(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        facts_cache = FactsCache()
+        self.mock_ansible_module.params = {'ovc_ip': '10.40.4.245', 'username': 'admin', 'password': 'mypass',
+                                           'state': 'present'}
+
+        with mock.patch('module_utils.simplivity.OVC'):
+            base_mod = SimplivityModule()
+        base_mod.execute_module = mock.Mock(return_value=dict(changed=True))
+        base_mod.run()
+
+        assert facts_cache.generation('10.40.4.245') == 1
+
+    def test_should_keep_the_cached_facts_when_the_ovc_is_not_changed(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        facts_cache = FactsCache()
+        self.mock_ansible_module.params = {'ovc_ip': '10.40.4.245', 'username': 'admin', 'password': 'mypass',
+                                           'state': 'present'}
+
+        with mock.patch('module_utils.simplivity.OVC'):
+            base_mod = SimplivityModule()
+        base_mod.execute_module = mock.Mock(return_value=dict(changed=False))
+        base_mod.run()
+
+        assert facts_cache.generation('10.40.4.245') == 0
+
     def test_should_call_fail_json_when_simplivity_sdk_not_installed(self):
         self.mock_ansible_module.params = {'config': 'config.json'}
 
@@ -290,6 +377,54 @@ class TestSimplivityModule():
         assert dict(changed=facts['changed'], msg=facts['msg']) == dict(changed=True,
                                                                         msg=SimplivityModule.MSG_UPDATED)
 
+    def test_resource_present_should_return_the_differences_in_diff_mode(self):
+        self.mock_ansible_module.params = self.PARAMS_FOR_PRESENT
+        self.mock_ansible_module._diff = True
+
+        ovc_base = SimplivityModule()
+        ovc_base.resource_client = mock.Mock()
+        ovc_base.resource_client.get_by_name.return_value = mock.Mock()
+        ovc_base.set_resource_object(ovc_base.resource_client)
+        ovc_base.active_resource.data = dict(self.RESOURCE_COMMON, rules=[{'id': '1', 'days': ['mon']}])
+
+        ovc_base.data = {'name': 'Resource Name New', 'rules': [{'id': '1', 'days': ['tue']}]}
+        facts = ovc_base.resource_present('resource')
+
+        assert facts['changed']
+        assert facts['diff'] == dict(before={'name': 'Resource Name', 'rules[0].days[0]': 'mon'},
+                                     after={'name': 'Resource Name New', 'rules[0].days[0]': 'tue'})
+
+    def test_resource_present_should_not_return_a_diff_when_data_is_equals(self):
+        self.mock_ansible_module.params = self.PARAMS_FOR_PRESENT
+        self.mock_ansible_module._diff = True
+
+        ovc_base = SimplivityModule()
+        ovc_base.resource_client = mock.Mock()
+        ovc_base.resource_client.get_by_name.return_value = mock.Mock()
+        ovc_base.set_resource_object(ovc_base.resource_client)
+        ovc_base.active_resource.data = self.RESOURCE_COMMON.copy()
+        ovc_base.data = self.RESOURCE_COMMON.copy()
+
+        facts = ovc_base.resource_present('resource')
+
+        assert not facts['changed']
+        assert 'diff' not in facts
+        ovc_base.active_resource.update.assert_not_called()
+
+    def test_build_diff_should_limit_the_size_of_the_values(self):
+        self.mock_ansible_module.params = self.PARAMS_FOR_PRESENT
+        ovc_base = SimplivityModule()
+
+        big_list = [{'id': str(index)} for index in range(2000)]
+        differences = [('disks', None, big_list)] + [('name{0}'.format(index), 'a' * 1000, 'b' * 1000) for index in range(20)]
+
+        result = ovc_base.build_diff(differences)
+
+        assert result['after']['disks'] == '<list of 2000 items>'
+        assert result['after']['name0'] == 'b' * 1000
+        assert result['after']['...'] == SimplivityModule.MSG_DIFF_TRUNCATED.format(len(differences) - len(result['before']))
+        assert len(json.dumps(result)) < 2 * SimplivityModule.DIFF_MAX_SIZE
+
     def test_resource_absent_should_remove(self):
         self.mock_ansible_module.params = self.PARAMS_FOR_PRESENT
 
@@ -318,5 +453,529 @@ class TestSimplivityModule():
                              msg=SimplivityModule.MSG_ALREADY_ABSENT)
 
 
+class TestMakePrivateDirs():
+    def test_should_create_the_directory_readable_by_the_owner_only(self, tmpdir):
+        path = str(tmpdir.join('state', 'facts'))
+
+        make_private_dirs(path)
+
+        assert os.stat(path).st_mode & 0o777 == 0o700
+
+    def test_should_keep_the_directory_created_by_a_parallel_fork(self, tmpdir):
+        path = str(tmpdir.join('state'))
+
+        with mock.patch('module_utils.simplivity.os.makedirs', side_effect=OSError(errno.EEXIST, 'File exists')):
+            make_private_dirs(path)
+
+    def test_should_raise_the_other_errors(self, tmpdir):
+        with mock.patch('module_utils.simplivity.os.makedirs', side_effect=OSError(errno.EACCES, 'Permission denied')):
+            with pytest.raises(OSError):
+                make_private_dirs(str(tmpdir.join('state')))
+
+
+class TestTokenCache():
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir):
+        self.token_cache = TokenCache(str(tmpdir))
+        self.login = mock.Mock(return_value=('token1', 3600))
+
+    def test_should_login_once_for_the_same_credentials(self):
+        first = self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+        second = TokenCache(self.token_cache.path.rsplit('/', 1)[0]).get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        assert first == second == 'token1'
+        self.login.assert_called_once_with()
+
+    def test_should_login_again_when_the_token_expired(self):
+        self.login.side_effect = [('token1', 3600), ('token2', 3600)]
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        with mock.patch('module_utils.simplivity_connection.time.time', return_value=time.time() + 3600):
+            token = self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        assert token == 'token2'
+
+    def test_should_login_again_when_the_token_was_idle(self):
+        self.login.side_effect = [('token1', 86400), ('token2', 86400)]
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        with mock.patch('module_utils.simplivity_connection.time.time', return_value=time.time() + TokenCache.IDLE_TIMEOUT):
+            token = self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        assert token == 'token2'
+
+    def test_should_not_share_token_with_different_password(self):
+        self.login.side_effect = [('token1', 3600), ('token2', 3600)]
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        assert self.token_cache.get_token('10.0.0.1', 'admin', 'wrong', self.login) == 'token2'
+
+    def test_should_keep_tokens_per_ovc_and_username(self):
+        self.login.side_effect = [('token1', 3600), ('token2', 3600), ('token3', 3600)]
+
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+        self.token_cache.get_token('10.0.0.2', 'admin', 'pass', self.login)
+        self.token_cache.get_token('10.0.0.1', 'user', 'pass', self.login)
+
+        assert self.token_cache.get_token('10.0.0.2', 'admin', 'pass', self.login) == 'token2'
+        assert self.login.call_count == 3
+
+    def test_invalidate_should_only_remove_the_rejected_token(self):
+        self.login.side_effect = [('token1', 3600), ('token2', 3600)]
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login)
+
+        self.token_cache.invalidate('10.0.0.1', 'admin', 'other')
+        assert self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login) == 'token1'
+
+        self.token_cache.invalidate('10.0.0.1', 'admin', 'token1')
+        assert self.token_cache.get_token('10.0.0.1', 'admin', 'pass', self.login) == 'token2'
+
+    def test_should_login_once_for_concurrent_tasks(self):
+        def slow_login():
+            time.sleep(0.1)
+            return 'token1', 3600
+
+        self.login.side_effect = slow_login
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(
+            TokenCache(self.token_cache.path.rsplit('/', 1)[0]).get_token('10.0.0.1', 'admin', 'pass', self.login)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert tokens == ['token1'] * 5
+        self.login.assert_called_once_with()
+
+
+class TestRateLimiter():
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir):
+        self.directory = str(tmpdir)
+        self.rate_limiter = RateLimiter('10.0.0.1', self.directory)
+        self.now = 1000.0
+
+        def sleep(seconds):
+            self.now += seconds
+
+        with mock.patch('module_utils.simplivity_connection.time.time', side_effect=lambda: self.now), \
+                mock.patch('module_utils.simplivity_connection.time.sleep', side_effect=sleep) as self.mock_sleep:
+            yield
+
+    def _rate(self, ovc_ip='10.0.0.1'):
+        with open(self.rate_limiter.path) as state_file:
+            return json.load(state_file)[ovc_ip]['rate']
+
+    def test_should_spread_the_requests_over_the_rate(self):
+        waits = [self.rate_limiter.acquire() for _ in range(3)]
+
+        assert waits == [0, pytest.approx(1 / RateLimiter.INITIAL_RATE), pytest.approx(1 / RateLimiter.INITIAL_RATE)]
+        assert self.now == pytest.approx(1000 + 2 / RateLimiter.INITIAL_RATE)
+
+    def test_should_reserve_the_next_tokens_for_the_tasks_waiting_at_the_same_time(self):
+        # The tasks take their token before any of them has finished waiting
+        self.mock_sleep.side_effect = None
+
+        waits = [RateLimiter('10.0.0.1', self.directory).acquire() for _ in range(3)]
+
+        assert waits == [0, pytest.approx(1 / RateLimiter.INITIAL_RATE), pytest.approx(2 / RateLimiter.INITIAL_RATE)]
+
+    def test_should_share_the_bucket_among_the_tasks(self):
+        self.rate_limiter.acquire()
+
+        assert RateLimiter('10.0.0.1', self.directory).acquire() == pytest.approx(1 / RateLimiter.INITIAL_RATE)
+        assert RateLimiter('10.0.0.2', self.directory).acquire() == 0
+
+    def test_should_double_the_rate_every_second_until_the_first_congestion(self):
+        for _ in range(int(RateLimiter.INITIAL_RATE)):
+            self.rate_limiter.record(0.1)
+
+        assert self._rate() == RateLimiter.INITIAL_RATE * 2
+
+    def test_should_increase_the_rate_additively_after_the_first_congestion(self):
+        self.rate_limiter.record(0.1, congested=True)
+        rate = self._rate()
+
+        for _ in range(int(rate)):
+            self.rate_limiter.record(0.1)
+
+        assert self._rate() == pytest.approx(rate + RateLimiter.ADDITIVE_INCREASE, rel=0.2)
+
+    def test_should_halve_the_rate_once_for_the_requests_reserved_at_the_same_rate(self):
+        self.mock_sleep.side_effect = None
+        for _ in range(5):
+            self.rate_limiter.acquire()
+        self.rate_limiter.record(0.1, congested=True)
+        self.rate_limiter.record(0.1, congested=True)
+
+        assert self._rate() == RateLimiter.INITIAL_RATE * RateLimiter.MULTIPLICATIVE_DECREASE
+
+        # Once the 4 requests reserved at the initial rate are sent and answered
+        self.now += 4 / RateLimiter.INITIAL_RATE + RateLimiter.INITIAL_LATENCY + 0.01
+        self.rate_limiter.record(0.1, congested=True)
+
+        assert self._rate() == RateLimiter.INITIAL_RATE * RateLimiter.MULTIPLICATIVE_DECREASE ** 2
+
+    def test_should_decrease_the_rate_when_the_ovc_answers_slowly(self):
+        self.rate_limiter.record(RateLimiter.TARGET_LATENCY + 1)
+
+        assert self._rate() == RateLimiter.INITIAL_RATE * RateLimiter.MULTIPLICATIVE_DECREASE
+
+    def test_should_keep_the_rate_within_its_bounds(self):
+        for _ in range(20):
+            self.now += 10
+            self.rate_limiter.record(0.1, congested=True)
+
+        assert self._rate() == RateLimiter.MIN_RATE
+
+    def test_should_start_again_from_the_initial_rate_after_being_idle(self):
+        self.rate_limiter.record(0.1, congested=True)
+        self.now += RateLimiter.IDLE_TIMEOUT + 1
+
+        self.rate_limiter.acquire()
+
+        assert self._rate() == RateLimiter.INITIAL_RATE
+
+
+class TestCompare():
+    RESOURCE = {'name': 'policy', 'size': 10, 'enabled': False, 'description': None,
+                'rules': [{'id': '1', 'frequency': 60, 'days': ['mon', 'tue']},
+                          {'id': '2', 'frequency': 120.0, 'days': []}]}
+
+    def test_should_ignore_the_order_of_the_lists(self):
+        other = deepcopy(self.RESOURCE)
+        other['rules'].reverse()
+        other['rules'][1]['days'].reverse()
+
+        assert compare(self.RESOURCE, other)
+        assert diff(self.RESOURCE, other) == []
+
+    def test_should_consider_none_empty_and_false_equal(self):
+        other = dict(deepcopy(self.RESOURCE), enabled=None, description='')
+
+        assert compare(self.RESOURCE, other)
+
+    def test_should_consider_a_missing_key_equal_to_none_only(self):
+        other = deepcopy(self.RESOURCE)
+        del other['description']
+        assert compare(self.RESOURCE, other)
+
+        del other['enabled']
+        assert not compare(self.RESOURCE, other)
+
+    def test_should_ignore_the_types_of_the_values(self):
+        other = dict(deepcopy(self.RESOURCE), size='10.0')
+        assert not compare(self.RESOURCE, other)
+
+        other['size'] = 10.0
+        other['rules'][1]['frequency'] = '120'
+        assert compare(self.RESOURCE, other)
+
+    def test_should_return_the_paths_of_the_differences(self):
+        other = deepcopy(self.RESOURCE)
+        other['size'] = 20
+        other['rules'][0]['days'] = ['mon', 'wed']
+        other['extra'] = 'value'
+
+        assert diff(self.RESOURCE, other) == ['size', 'rules[0].days[1]', 'extra']
+        assert diff(self.RESOURCE, other, first_only=True) == ['size']
+
+    def test_should_compare_lists_of_different_sizes(self):
+        assert not compare_list([1, 2], [1, 2, 3])
+        assert not compare_list([1], None)
+        assert compare_list([[], {'a': 1}], [{'a': 1.0}, []])
+
+    def test_should_match_the_elements_of_the_lists_in_any_order(self):
+        # Sorted by their str, the nested lists are not at the same position
+        assert compare_list([[0], ['True', 'True', {}]], [[0], [{}, 'True', 'True']])
+        assert compare_list([{'a': None, 'b': [1, 2]}, {'a': 1}], [{'a': 1.0}, {'b': ['2', 1.0]}])
+        assert not compare_list([[1, 2], [1, 2]], [[1, 2], [2, 3]])
+
+    def test_should_only_consider_the_empty_elements_of_the_lists_equal_with_the_same_type(self):
+        assert not compare_list([None], [''])
+        assert not compare_list([{}], [''])
+        assert not compare_list([{}], [None])
+        # The unmatched elements are compared as the other elements
+        assert not compare_list([None, 'b', {}], ['', 'b', None])
+        assert diff({'a': [None, 'b', {}]}, {'a': ['', 'b', None]}) == ['a[2]']
+        # The values of a dict set to None, empty or False are still equal
+        assert compare({'a': {}, 'b': None}, {'a': '', 'b': {}})
+
+    def test_should_return_the_paths_of_the_unmatched_elements_only(self):
+        first = {'disks': [{'id': str(index), 'size': index, 'tags': ['a', 'b']} for index in range(1000)]}
+        second = deepcopy(first)
+        second['disks'].reverse()
+        for disk in second['disks']:
+            disk['tags'].reverse()
+        second['disks'][0]['size'] = 0
+
+        assert diff(first, second) == ['disks[999].size']
+
+    def test_should_only_format_the_resources_when_debug_is_logged(self):
+        class UnformattableDict(dict):
+            def __repr__(self):
+                raise AssertionError('The resource was formatted')
+
+        with mock.patch.object(simplivity.logger, 'isEnabledFor', return_value=False):
+            assert diff(UnformattableDict(name='a', rules=[{'id': '1'}]), {'name': 'b', 'rules': [{'id': '2'}]}) == ['name', 'rules[0].id']
+
+        with mock.patch.object(simplivity.logger, 'isEnabledFor', return_value=True), \
+                mock.patch.object(simplivity.logger, 'debug') as mock_debug:
+            diff({'name': 'a'}, {'name': 'b'})
+
+        expected_message = SimplivityModule.MSG_DIFF_AT_KEY.format('name') + "resource1 = {'name': 'a'}, resource2 = {'name': 'b'}"
+        mock_debug.assert_called_once_with(expected_message)
+
+
+class TestDumpJsonLines():
+    def test_should_write_one_record_per_line(self, tmpdir):
+        path = str(tmpdir.join('backups.jsonl'))
+
+        result = dump_json_lines(path, iter([{'id': '1'}, {'id': '2'}]))
+
+        content = tmpdir.join('backups.jsonl').read_binary()
+        assert [json.loads(line) for line in content.splitlines()] == [{'id': '1'}, {'id': '2'}]
+        assert result == dict(path=path, count=2, checksum=hashlib.sha1(content).hexdigest())
+
+    def test_should_keep_the_previous_file_when_the_records_fail(self, tmpdir):
+        tmpdir.join('backups.jsonl').write('previous')
+
+        def records():
+            yield {'id': '1'}
+            raise IOError()
+
+        with pytest.raises(IOError):
+            dump_json_lines(str(tmpdir.join('backups.jsonl')), records())
+
+        assert tmpdir.listdir() == [tmpdir.join('backups.jsonl')]
+        assert tmpdir.join('backups.jsonl').read() == 'previous'
+
+
+class TestColumnar():
+    def test_should_convert_the_columns_back_to_the_records(self):
+        records = [{'id': '1', 'name': 'vm1', 'size': 10, 'cluster': 'c1'},
+                   {'id': '2', 'name': 'vm2', 'size': 20, 'cluster': 'c1'},
+                   {'id': '3', 'name': 'vm3', 'size': 30, 'cluster': 'c2'},
+                   {'id': '4', 'name': 'vm4', 'size': 40, 'cluster': 'c1'}]
+
+        assert from_columnar(to_columnar(iter(records))) == records
+
+    def test_should_store_the_repeated_strings_once(self):
+        table = to_columnar([{'cluster': 'c1'}, {'cluster': 'c2'}, {'cluster': 'c1'}, {'cluster': 'c1'}])
+
+        assert table == dict(keys=['cluster'], columns=[dict(values=['c1', 'c2'], indexes=[0, 1, 0, 0])], count=4)
+
+    def test_should_keep_the_distinct_values_and_the_numbers_as_lists(self):
+        table = to_columnar([{'id': '1', 'size': 1}, {'id': '2', 'size': 1}, {'id': '3', 'size': 1}])
+
+        assert table['columns'] == [['1', '2', '3'], [1, 1, 1]]
+
+    def test_should_set_none_where_the_records_do_not_have_the_key(self):
+        table = to_columnar([{'id': '1'}, {'id': '2', 'host_id': 'h2'}, {'id': '3'}])
+
+        assert table['keys'] == ['id', 'host_id']
+        assert table['columns'][1] == [None, 'h2', None]
+        assert from_columnar(table)[0] == {'id': '1', 'host_id': None}
+
+    def test_should_convert_no_records(self):
+        assert to_columnar([]) == dict(keys=[], columns=[], count=0)
+        assert from_columnar(to_columnar([])) == []
+
+
+class TestMetrics():
+    def test_should_align_the_columns_on_all_the_dates(self):
+        metrics = [{'name': 'iops', 'data_points': [{'date': 't1', 'reads': 1}, {'date': 't2', 'reads': 2}]},
+                   {'name': 'latency', 'data_points': [{'date': 't2', 'reads': 20}, {'date': 't3', 'reads': 30}]},
+                   {'name': 'throughput', 'data_points': []}]
+
+        timestamps, columns = to_columns(metrics)
+
+        assert timestamps == ['t1', 't2', 't3']
+        assert columns == {'iops_reads': [1, 2, None], 'latency_reads': [None, 20, 30]}
+
+    def test_should_aggregate_the_columns(self):
+        columns = {'iops_reads': list(range(100, 0, -1)) + [None], 'iops_writes': [None, None]}
+
+        result = aggregate(columns, ['min', 'max', 'avg', 'p95'])
+
+        assert result == {'iops_reads': {'min': 1, 'max': 100, 'avg': 50.5, 'p95': 95},
+                          'iops_writes': {'min': None, 'max': None, 'avg': None, 'p95': None}}
+
+
+class TestFactsCache():
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir):
+        self.facts_cache = FactsCache(str(tmpdir))
+        self.key = FactsCache.key('10.0.0.1', 'admin', 'HostFactsModule', {'name': None})
+
+    def test_should_get_the_cached_facts(self):
+        self.facts_cache.set(self.key, 0, 60, {'hosts': [{'id': '1'}]})
+
+        assert self.facts_cache.get(self.key, 0) == {'hosts': [{'id': '1'}]}
+
+    def test_should_not_get_missing_facts(self):
+        assert self.facts_cache.get(self.key, 0) is None
+
+    def test_should_not_get_expired_facts(self):
+        self.facts_cache.set(self.key, 0, 60, {'hosts': []})
+
+        with mock.patch('module_utils.simplivity_facts_cache.time.time', return_value=time.time() + 60):
+            assert self.facts_cache.get(self.key, 0) is None
+
+    def test_invalidate_should_only_make_the_facts_of_the_ovc_stale(self):
+        self.facts_cache.invalidate('10.0.0.1')
+        self.facts_cache.invalidate('10.0.0.1')
+
+        assert self.facts_cache.generation('10.0.0.1') == 2
+        assert self.facts_cache.generation('10.0.0.2') == 0
+
+    def test_should_not_get_facts_gathered_before_the_ovc_was_changed(self):
+        generation = self.facts_cache.generation('10.0.0.1')
+        self.facts_cache.invalidate('10.0.0.1')
+        self.facts_cache.set(self.key, generation, 60, {'hosts': []})
+
+        assert self.facts_cache.get(self.key, self.facts_cache.generation('10.0.0.1')) is None
+
+    def test_should_remove_the_expired_entries_when_caching_facts(self):
+        other_key = FactsCache.key('10.0.0.1', 'admin', 'PolicyFactsModule', {'name': None})
+        self.facts_cache.set(self.key, 0, 60, {'hosts': []})
+
+        with mock.patch('module_utils.simplivity_facts_cache.time.time', return_value=time.time() + 3600):
+            self.facts_cache.set(other_key, 0, 60, {'policies': []})
+
+        assert set(os.listdir(self.facts_cache.directory)) == set(['pruned', other_key + '.json'])
+
+    def test_should_remove_the_expired_entries_at_most_once_per_interval(self):
+        self.facts_cache.set(self.key, 0, 1, {'hosts': []})
+        path = os.path.join(self.facts_cache.directory, self.key + '.json')
+
+        with mock.patch('module_utils.simplivity_facts_cache.time.time', return_value=time.time() + 60):
+            self.facts_cache.set(FactsCache.key('other'), 0, 60, {})
+
+        assert os.path.exists(path)
+
+    def test_should_remove_the_stale_entry_when_it_is_read(self):
+        self.facts_cache.set(self.key, 0, 60, {'hosts': []})
+        self.facts_cache.invalidate('10.0.0.1')
+
+        assert self.facts_cache.get(self.key, self.facts_cache.generation('10.0.0.1')) is None
+        assert not os.path.exists(os.path.join(self.facts_cache.directory, self.key + '.json'))
+
+    def test_exists_should_be_false_until_the_cache_is_used(self, tmpdir):
+        assert not FactsCache.exists(str(tmpdir.join('unused')))
+        assert FactsCache.exists(str(tmpdir))
+
+    def test_key_should_not_depend_on_the_order_of_the_query(self):
+        assert FactsCache.key({'name': 'a', 'fields': ['id']}) == FactsCache.key({'fields': ['id'], 'name': 'a'})
+        assert FactsCache.key({'name': 'a'}) != FactsCache.key({'name': 'b'})
+
+
+class TestOVCConnection():
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir):
+        self.token_cache = TokenCache(str(tmpdir))
+        self.connection = OVCConnection('10.0.0.1', 'admin', 'pass', token_cache=self.token_cache)
+        self.mock_send = mock.Mock()
+        self.connection._send = self.mock_send
+
+    def test_should_login_before_the_first_request(self):
+        self.mock_send.side_effect = [(200, {'access_token': 'token1', 'expires_in': 3600}),
+                                      (200, {'virtual_machines': []})]
+
+        assert self.connection.get('/virtual_machines') == {'virtual_machines': []}
+
+        login_call, get_call = self.mock_send.call_args_list
+        assert login_call[0][:2] == ('POST', OVCConnection.LOGIN_URL)
+        assert get_call[0][3]['Authorization'] == 'Bearer token1'
+
+    def test_should_reuse_the_cached_token(self):
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', lambda: ('cached', 3600))
+        self.mock_send.return_value = (200, {})
+
+        self.connection.get('/hosts')
+
+        self.mock_send.assert_called_once_with('GET', '/hosts', '', mock.ANY)
+        assert self.mock_send.call_args[0][3]['Authorization'] == 'Bearer cached'
+
+    def test_should_login_again_and_retry_when_token_is_rejected(self):
+        self.token_cache.get_token('10.0.0.1', 'admin', 'pass', lambda: ('revoked', 3600))
+        self.mock_send.side_effect = [(401, {'error': 'invalid_token'}),
+                                      (200, {'access_token': 'token2', 'expires_in': 3600}),
+                                      (200, {'hosts': []})]
+
+        assert self.connection.get('/hosts') == {'hosts': []}
+        assert self.mock_send.call_args[0][3]['Authorization'] == 'Bearer token2'
+        assert self.token_cache.get_token('10.0.0.1', 'admin', 'pass', mock.Mock()) == 'token2'
+
+    def test_should_raise_authentication_error_with_invalid_credentials(self):
+        self.mock_send.return_value = (400, {'error': 'invalid_grant'})
+
+        with pytest.raises(HPESimpliVityAuthenticationError):
+            self.connection.get('/hosts')
+
+    def test_post_should_return_task(self):
+        task = {'task': {'id': '1', 'state': 'IN_PROGRESS'}}
+        self.connection._access_token = 'token1'
+        self.mock_send.return_value = (202, task)
+
+        assert self.connection.post('/virtual_machines/1/clone', {'virtual_machine_name': 'vm'}) == (task, task)
+
+    def test_should_send_the_request_again_when_the_idle_connection_was_closed(self):
+        connection = OVCConnection('10.0.0.1', 'admin', 'pass')
+        connection._http = mock.Mock()
+        connection._http.request.side_effect = socket.error(errno.ECONNRESET, 'Connection reset by peer')
+        new_http = mock.Mock()
+        new_http.getresponse.return_value.read.return_value = b'{"hosts": []}'
+        new_http.getresponse.return_value.status = 200
+        new_http.getresponse.return_value.getheader.return_value = ''
+
+        with mock.patch.object(connection, '_open_connection', return_value=new_http):
+            assert connection._send('GET', '/hosts', '', {}) == (200, {'hosts': []})
+
+    def test_should_not_send_the_request_again_when_it_timed_out(self):
+        connection = OVCConnection('10.0.0.1', 'admin', 'pass')
+        connection._http = mock.Mock()
+        connection._http.request.side_effect = socket.timeout('timed out')
+
+        with mock.patch.object(connection, '_open_connection') as mock_open_connection:
+            with pytest.raises(HPESimpliVityException):
+                connection._send('GET', '/hosts', '', {})
+
+        mock_open_connection.assert_not_called()
+
+    def test_should_send_the_throttled_requests_again_with_a_rate_limiter(self):
+        rate_limiter = mock.Mock()
+        connection = OVCConnection('10.0.0.1', 'admin', 'pass', rate_limiter=rate_limiter)
+        connection._access_token = 'token1'
+        connection._send = mock.Mock(side_effect=[(429, {}), (503, {}), (200, {'hosts': []})])
+
+        assert connection.get('/hosts') == {'hosts': []}
+        assert rate_limiter.acquire.call_count == 3
+        assert [record[1]['congested'] for record in rate_limiter.record.call_args_list] == [True, True, False]
+
+    def test_should_return_the_throttled_response_after_the_retries(self):
+        rate_limiter = mock.Mock()
+        connection = OVCConnection('10.0.0.1', 'admin', 'pass', rate_limiter=rate_limiter)
+        connection._access_token = 'token1'
+        connection._send = mock.Mock(return_value=(429, {'message': 'Too many requests'}))
+
+        with pytest.raises(HPESimpliVityException):
+            connection.get('/hosts')
+
+        assert connection._send.call_count == OVCConnection.MAX_THROTTLED_RETRIES + 1
+
+    def test_should_report_the_failed_requests_to_the_rate_limiter(self):
+        rate_limiter = mock.Mock()
+        connection = OVCConnection('10.0.0.1', 'admin', 'pass', rate_limiter=rate_limiter)
+        connection._access_token = 'token1'
+        connection._send = mock.Mock(side_effect=HPESimpliVityException('timed out'))
+
+        with pytest.raises(HPESimpliVityException):
+            connection.get('/hosts')
+
+        rate_limiter.record.assert_called_once_with(mock.ANY, congested=True)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
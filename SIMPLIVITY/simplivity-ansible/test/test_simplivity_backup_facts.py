@@ -15,12 +15,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 ###
+import hashlib
+import json
+import os
 import mock
 import pytest
 import yaml
 
 from simplivity_test_utils import SimplivityModuleFactsTest
 from simplivity_module_loader import BackupFactsModule
+from simplivity_ovc_server import InProcessOVCConnection, OVCStandInServer, sample_resources
+from module_utils.simplivity_connection import OVCSession
 
 
 PARAMS_GET_ALL = """
@@ -65,6 +70,278 @@ class TestBackupFactsModule(SimplivityModuleFactsTest):
             ansible_facts=dict(backups=[backup.data])
         )
 
+    def test_should_pass_the_sort_to_the_ovc(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_ALL)
+        self.mock_ansible_module.params.update(sort='created_at', order='ascending')
+        self.resource.get_all.return_value = []
+
+        BackupFactsModule().run()
+
+        self.resource.get_all.assert_called_once_with(sort='created_at', order='ascending')
+
+    def test_should_keep_the_newest_backups_of_each_vm(self):
+        backups = []
+        for vm_id, created_at in [('vm-1', '01'), ('vm-2', '05'), ('vm-1', '03'), ('vm-1', '02'), ('vm-2', '04')]:
+            backup = mock.Mock()
+            backup.data = dict(virtual_machine_id=vm_id, created_at='2019-06-{0}T10:00:00Z'.format(created_at))
+            backups.append(backup)
+
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_ALL)
+        self.mock_ansible_module.params['latest_per_vm'] = 2
+        self.resource.get_all.return_value = backups
+
+        BackupFactsModule().run()
+
+        self.resource.get_all.assert_called_once_with(sort='created_at', order='descending', limit=500, offset=0)
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=False,
+            ansible_facts=dict(backups=[backups[2].data, backups[3].data, backups[1].data, backups[4].data])
+        )
+
+    def test_should_write_the_backups_to_the_output_file(self, tmpdir):
+        backup = mock.Mock()
+        backup.data = {'name': 'TESTBACKUP', 'id': '1234'}
+        path = str(tmpdir.join('backups.jsonl'))
+
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_ALL)
+        self.mock_ansible_module.params['output_file'] = path
+        self.resource.get_all.return_value = [backup]
+
+        BackupFactsModule().run()
+
+        content = tmpdir.join('backups.jsonl').read_binary()
+        assert json.loads(content) == backup.data
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=False,
+            ansible_facts=dict(backups_output_file=dict(path=path, count=1, checksum=hashlib.sha1(content).hexdigest()))
+        )
+
+    def test_should_fail_when_the_directory_of_the_output_file_does_not_exist(self, tmpdir):
+        directory = str(tmpdir.join('missing'))
+
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_ALL)
+        self.mock_ansible_module.params['output_file'] = os.path.join(directory, 'backups.jsonl')
+        self.resource.get_all.return_value = [mock.Mock(data={'name': 'TESTBACKUP', 'id': '1234'})]
+
+        BackupFactsModule().run()
+
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            msg=BackupFactsModule.MSG_OUTPUT_DIRECTORY_NOT_FOUND.format(directory), exception=mock.ANY)
+        assert not self.resource.get_all.called
+
+    def test_should_return_the_backups_as_columns(self):
+        backups = [mock.Mock(data={'id': str(i), 'virtual_machine_name': 'vm1'}) for i in range(3)]
+
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_ALL)
+        self.mock_ansible_module.params['output_format'] = 'columnar'
+        self.resource.get_all.return_value = backups
+
+        BackupFactsModule().run()
+
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=False,
+            ansible_facts=dict(backups=dict(keys=['id', 'virtual_machine_name'],
+                                            columns=[['0', '1', '2'], dict(values=['vm1'], indexes=[0, 0, 0])],
+                                            count=3))
+        )
+
+
+class TestBackupFactsModuleLatestPerVm():
+    """
+    The latest_per_vm option runs against the OVC stand-in, which sorts the backups and sends them page by page.
+    """
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, mock_ansible_module, mock_ovc_client, tmpdir):
+        self.mock_ansible_module = mock_ansible_module
+        config = tmpdir.join('config.json')
+        config.write(json.dumps(dict(ip='ovc', credentials=dict(username='admin', password='password'))))
+        self.mock_ansible_module.params = dict(config=str(config), name=None, latest_per_vm=3, page_size=4,
+                                               fields=['name'])
+
+        self.ovc = OVCStandInServer(resources=sample_resources(vm_count=3, backups_per_vm=5))
+        connection = InProcessOVCConnection(self.ovc, 'ovc', 'admin', 'password')
+        mock_ovc_client.backups = OVCSession(connection).backups
+
+    def test_should_return_the_newest_backups_of_each_vm(self):
+        BackupFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        expected = ['vm{0}-backup{1}'.format(vm, backup) for vm in range(3) for backup in (4, 3, 2)]
+        assert sorted(backup['name'] for backup in facts['backups']) == sorted(expected)
+        assert [backup['name'] for backup in facts['backups'][:3]] == ['vm2-backup4', 'vm2-backup3', 'vm2-backup2']
+        # 15 backups, 4 per page
+        assert self.ovc.stats['api_calls'] == 4
+
+    def test_should_not_return_the_backups_of_each_vm_when_the_name_is_not_found(self):
+        self.mock_ansible_module.params['name'] = 'missing'
+
+        BackupFactsModule().run()
+
+        assert self.mock_ansible_module.exit_json.call_args[1]['ansible_facts'] == dict(backups=[])
+
+
+class TestBackupFactsModuleSince():
+    """
+    The since mode runs against the OVC stand-in, which applies the filters.
+    """
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, mock_ansible_module, mock_ovc_client, tmpdir, monkeypatch):
+        self.mock_ansible_module = mock_ansible_module
+        self.mock_ovc_client = mock_ovc_client
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        config = tmpdir.join('config.json')
+        config.write(json.dumps(dict(ip='ovc', credentials=dict(username='admin', password='password'))))
+        self.mock_ansible_module.params = dict(config=str(config), name=None, since='report')
+
+        self.ovc = OVCStandInServer(resources=sample_resources(vm_count=3))
+        connection = InProcessOVCConnection(self.ovc, 'ovc', 'admin', 'password')
+        self.mock_ovc_client.backups = OVCSession(connection).backups
+        self.mock_ovc_client.connection = connection
+
+    def _run(self):
+        BackupFactsModule().run()
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        return (sorted(backup['id'] for backup in facts['backups']),
+                sorted(backup['id'] for backup in facts['changed_backups']),
+                facts['removed_backups'])
+
+    def _add_backup(self, backup_id, state='PROTECTED', created_at='2019-07-01T10:00:00Z'):
+        backup = dict(id=backup_id, name=backup_id, created_at=created_at, state=state,
+                      expiration_time='2029-07-01T10:00:00Z')
+        self.ovc.resources['backups'].append(backup)
+        return backup
+
+    def test_should_return_all_the_backups_on_the_first_run_only(self):
+        new_ids, _, _ = self._run()
+
+        assert new_ids == sorted(backup['id'] for backup in self.ovc.resources['backups'])
+        assert self._run() == ([], [], [])
+
+    def test_should_return_the_new_backups_once(self):
+        self._run()
+        self._add_backup('new-1')
+        # Created before the newest backup seen, but within the overlap
+        self._add_backup('new-2', created_at='2019-06-30T23:58:00Z')
+
+        assert self._run() == (['new-1', 'new-2'], [], [])
+        assert self._run() == ([], [], [])
+
+    def test_should_only_request_the_new_backups_and_their_count(self):
+        self._run()
+        self._add_backup('new-1')
+        self.ovc.stats['api_calls'] = 0
+
+        self._run()
+
+        assert self.ovc.stats['api_calls'] == 2
+
+    def test_should_return_the_backups_whose_state_changed(self):
+        backup = self._add_backup('saving-1', state='SAVING')
+        self._run()
+
+        assert self._run() == ([], [], [])
+        backup['state'] = 'PROTECTED'
+        assert self._run() == ([], ['saving-1'], [])
+        assert self._run() == ([], [], [])
+
+    def test_should_return_the_pending_backups_removed_from_the_ovc(self):
+        backup = self._add_backup('saving-1', state='SAVING')
+        self._run()
+        self.ovc.resources['backups'].remove(backup)
+
+        assert self._run() == ([], [], ['saving-1'])
+        assert self._run() == ([], [], [])
+
+    def test_should_return_the_backups_deleted_from_the_ovc_before_they_expire(self):
+        backup = self._add_backup('new-1')
+        self._run()
+        self.ovc.resources['backups'].remove(backup)
+        self._add_backup('new-2', created_at='2019-07-02T10:00:00Z')
+
+        assert self._run() == (['new-2'], [], ['new-1'])
+        assert self._run() == ([], [], [])
+
+    def test_should_not_return_removed_backups_with_a_watermark_saved_without_their_ids(self, tmpdir):
+        self._run()
+        path = tmpdir.join('backup_watermarks').listdir(fil='*.json')[0]
+        watermark = json.loads(path.read())
+        del watermark['ids']
+        path.write(json.dumps(watermark))
+
+        assert self._run() == ([], [], [])
+        self.ovc.resources['backups'].pop()
+        assert len(self._run()[2]) == 1
+
+    def test_should_return_the_expired_backups(self):
+        self._add_backup('new-1')['expiration_time'] = '2019-07-02T10:00:00.000Z'
+        self._run()
+
+        assert self._run() == ([], [], ['new-1'])
+        assert self._run() == ([], [], [])
+
+    def test_should_track_the_backups_when_the_fields_option_leaves_out_their_state(self):
+        backup = self._add_backup('saving-1', state='SAVING')
+        self.mock_ansible_module.params['fields'] = ['name']
+
+        BackupFactsModule().run()
+        backup['state'] = 'PROTECTED'
+        BackupFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert facts == dict(backups=[], changed_backups=[{'name': 'saving-1'}], removed_backups=[])
+
+    def test_should_write_the_new_backups_to_the_output_file(self, tmpdir):
+        self._run()
+        self._add_backup('new-1')
+        self.mock_ansible_module.params['output_file'] = str(tmpdir.join('backups.jsonl'))
+
+        BackupFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert facts['backups_output_file']['count'] == 1
+        assert json.loads(tmpdir.join('backups.jsonl').read())['id'] == 'new-1'
+        assert 'backups' not in facts
+
+    def test_should_return_all_the_pages_of_backups(self):
+        self.ovc.resources['backups'] = []
+        for index in range(1200):
+            self._add_backup('new-{0:04}'.format(index))
+
+        new_ids, _, _ = self._run()
+
+        assert len(new_ids) == 1200
+        assert self.ovc.stats['api_calls'] == 4
+
+    def test_should_move_past_more_than_a_page_of_backups_created_at_the_same_time(self):
+        self.ovc.resources['backups'] = []
+        for index in range(1200):
+            self._add_backup('new-{0:04}'.format(index))
+        self.mock_ansible_module.params['max_items'] = 500
+
+        assert [len(self._run()[0]) for _ in range(4)] == [500, 500, 200, 0]
+        self._add_backup('new-1200')
+        assert self._run() == (['new-1200'], [], [])
+
+    def test_should_keep_a_watermark_per_name(self):
+        self._run()
+        self.mock_ansible_module.params['since'] = 'other_report'
+
+        new_ids, _, _ = self._run()
+
+        assert len(new_ids) == len(self.ovc.resources['backups'])
+
+    def test_should_not_move_the_watermark_when_the_task_fails(self):
+        self._run()
+        self._add_backup('new-1')
+
+        with mock.patch.object(BackupFactsModule, 'get_facts_data', side_effect=IOError):
+            with pytest.raises(IOError):
+                BackupFactsModule().run()
+
+        assert self._run() == (['new-1'], [], [])
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import pytest
+
+from simplivity_benchmark import BACKENDS, PHASES, SCENARIOS, STARTUP_BUDGET, format_report, over_startup_budget, run_benchmark
+
+
+@pytest.fixture(scope='module')
+def report():
+    return run_benchmark(rounds=1, vm_count=5)
+
+
+class TestSimplivityBenchmark():
+    def test_should_run_every_scenario_on_every_backend(self, report):
+        assert [(row['backend'], row['module'], row['scenario']) for row in report] == \
+            [(backend, class_name, scenario) for backend in BACKENDS for class_name, scenario, _ in SCENARIOS]
+
+    def test_scenarios_should_succeed(self, report):
+        assert [row for row in report if row['failures']] == []
+
+    def test_virtual_machine_scenarios_should_change_the_ovc(self, report):
+        assert all(row['changed'] for row in report if row['module'] == 'VirtualMachineModule')
+
+    def test_should_report_every_phase(self, report):
+        for row in report:
+            assert all(row[phase] >= 0 for phase in PHASES)
+            assert row['total'] >= row['client'] + row['api'] + row['exit_json']
+
+    def test_should_format_one_line_per_scenario(self, report):
+        assert len(format_report(report).splitlines()) == len(report) + 1
+
+    def test_should_report_the_modules_over_the_startup_budget(self, report):
+        rows = [dict(report[0], module='HostFactsModule', failures=[], **{'import': STARTUP_BUDGET * 1000 + 1}),
+                dict(report[0], module='PolicyFactsModule', failures=[], **{'import': STARTUP_BUDGET * 1000 - 1})]
+
+        assert over_startup_budget(rows) == ['HostFactsModule']
+        assert 'OVER THE STARTUP BUDGET' in format_report(rows).splitlines()[1]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import mock
+import os
+import pytest
+import threading
+
+from simplivity_module_loader import SimplivityModule
+from simplivity_ovc_server import HTTPOVCConnection, OVCStandInServer
+from simplivity.exceptions import HPESimpliVityAuthenticationError
+from module_utils.simplivity_connection import BrokerConnection, OVCSession, RateLimiter, TokenCache
+from module_utils.simplivity import load_json_file
+from module_utils.simplivity_broker import OVCBroker
+
+HOSTS = [{'id': '1', 'name': 'host1'}, {'id': '2', 'name': 'host2'}]
+
+
+class TestOVCBroker():
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        self.socket_path = str(tmpdir.join('broker.sock'))
+
+        self.ovc = OVCStandInServer(resources={'hosts': HOSTS}).start()
+        self.broker = OVCBroker(self.socket_path, connection_class=HTTPOVCConnection, token_cache=TokenCache())
+        thread = threading.Thread(target=self.broker.serve_forever, kwargs=dict(poll_interval=0.01))
+        thread.daemon = True
+        thread.start()
+
+        yield
+        self.broker.shutdown()
+        self.broker.close()
+        self.ovc.stop()
+
+    def _connect(self, password='password'):
+        return BrokerConnection(self.socket_path, self.ovc.address, 'admin', password)
+
+    def test_should_forward_requests_to_the_ovc(self):
+        session = OVCSession(self._connect())
+
+        hosts = session.hosts.get_all()
+
+        assert [host.data for host in hosts] == sorted(HOSTS, key=lambda host: host['name'], reverse=True)
+
+    def test_should_share_login_and_connection_among_module_processes(self):
+        for _ in range(3):
+            connection = self._connect()
+            OVCSession(connection).hosts.get_by_name('host1')
+            connection.close()
+
+        assert self.ovc.stats['logins'] == 1
+        assert self.ovc.stats['connections'] == 1
+        assert self.ovc.stats['api_calls'] == 3
+
+    def test_should_login_again_when_the_ovc_revokes_the_token(self):
+        connection = self._connect()
+        connection.get('/hosts')
+        self.ovc.revoke_tokens()
+
+        assert connection.get('/hosts/1') == HOSTS[0]
+        assert self.ovc.stats['logins'] == 2
+
+    def test_should_raise_authentication_error_with_invalid_credentials(self):
+        with pytest.raises(HPESimpliVityAuthenticationError):
+            self._connect(password='wrong').get('/hosts')
+
+    def test_should_stop_and_remove_the_socket_when_idle(self, tmpdir):
+        broker = OVCBroker(str(tmpdir.join('idle.sock')), connection_class=HTTPOVCConnection)
+
+        broker.serve(idle_timeout=0.1)
+
+        assert not os.path.exists(broker.socket_path)
+
+    def test_module_should_use_the_broker_when_it_is_running(self, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_BROKER_SOCKET', self.socket_path)
+        module = self._create_module()
+
+        assert isinstance(module.ovc_client.connection, BrokerConnection)
+        assert module.ovc_client.hosts.get_by_name('host2').data == HOSTS[1]
+
+    def test_module_should_limit_the_rate_of_the_requests_sent_through_the_broker(self, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_BROKER_SOCKET', self.socket_path)
+        module = self._create_module(rate_limit=True)
+
+        with mock.patch.object(RateLimiter, 'acquire') as mock_acquire, mock.patch.object(RateLimiter, 'record') as mock_record:
+            module.ovc_client.hosts.get_all()
+            connection = module._create_connection_factory()()
+            connection.get('/hosts')
+
+        assert isinstance(connection, BrokerConnection)
+        assert mock_acquire.call_count == 2
+        assert [call[1]['congested'] for call in mock_record.call_args_list] == [False, False]
+
+    def test_should_send_the_throttled_requests_through_the_broker_again(self, tmpdir):
+        rate_limiter = RateLimiter(self.ovc.address, directory=str(tmpdir))
+        connection = BrokerConnection(self.socket_path, self.ovc.address, 'admin', 'password', rate_limiter=rate_limiter)
+        serve = self.ovc.serve
+        statuses = [429]
+        # The login of the broker is not throttled
+        self.ovc.serve = lambda method, url, *args: (
+            (statuses.pop(), {}) if statuses and '/hosts' in url else serve(method, url, *args))
+
+        with mock.patch('module_utils.simplivity_connection.time.sleep'):
+            assert connection.get('/hosts/1') == HOSTS[0]
+
+        assert not statuses
+        # Decreased by the throttled request
+        rate = load_json_file(rate_limiter.path)[self.ovc.address]['rate']
+        assert RateLimiter.INITIAL_RATE * RateLimiter.MULTIPLICATIVE_DECREASE <= rate < RateLimiter.INITIAL_RATE
+
+    def test_module_should_connect_directly_when_the_broker_is_not_running(self, monkeypatch, tmpdir):
+        stale_socket = str(tmpdir.join('stale.sock'))
+        open(stale_socket, 'w').close()
+        monkeypatch.setenv('SIMPLIVITY_BROKER_SOCKET', stale_socket)
+
+        with mock.patch('module_utils.simplivity.OVC') as mock_ovc:
+            module = self._create_module()
+
+        assert module.ovc_client == mock_ovc.return_value
+
+    def _create_module(self, **params):
+        with mock.patch(SimplivityModule.__module__ + '.AnsibleModule') as mock_ansible_module:
+            mock_ansible_module.return_value.params = dict(ovc_ip=self.ovc.address,
+                                                           username='admin',
+                                                           password='password',
+                                                           **params)
+            return SimplivityModule()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
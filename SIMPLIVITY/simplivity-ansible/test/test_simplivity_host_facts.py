@@ -33,6 +33,22 @@ PARAMS_GET_BY_NAME = """
     name: "HostBackup"
 """
 
+PARAMS_GET_METRICS = """
+    config: "{{ config.json }}"
+    name: null
+    metrics: true
+    metrics_range: 120
+    metrics_resolution: MINUTE
+    metrics_time_offset: 0
+    metrics_aggregations: ['max', 'p95']
+"""
+
+METRICS = {'metrics': [
+    {'name': 'iops', 'data_points': [{'date': '2019-06-01T00:00:00Z', 'reads': 10, 'writes': 2},
+                                     {'date': '2019-06-01T00:01:00Z', 'reads': 30, 'writes': 4}]},
+    {'name': 'latency', 'data_points': [{'date': '2019-06-01T00:00:00Z', 'reads': 500, 'writes': 800},
+                                        {'date': '2019-06-01T00:01:00Z', 'reads': 700, 'writes': 600}]}]}
+
 
 @pytest.mark.resource(TestHostFactsModule='hosts')
 class TestHostFactsModule(SimplivityModuleFactsTest):
@@ -65,6 +81,31 @@ class TestHostFactsModule(SimplivityModuleFactsTest):
             ansible_facts=dict(hosts=[host.data])
         )
 
+    def test_should_get_the_metrics_in_columns(self):
+        host = mock.Mock()
+        host.data = {'name': 'TESTHOST', 'id': '1234'}
+
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_METRICS)
+        self.resource.get_all.return_value = [host]
+        self.mock_ovc_client.connection.get.return_value = METRICS
+
+        HostFactsModule().run()
+
+        self.mock_ovc_client.connection.get.assert_called_once_with(
+            '/hosts/1234/metrics?range=120&resolution=MINUTE&time_offset=0')
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=False,
+            ansible_facts=dict(hosts=[host.data],
+                               host_metrics=[dict(id='1234', name='TESTHOST',
+                                                  timestamps=['2019-06-01T00:00:00Z', '2019-06-01T00:01:00Z'],
+                                                  columns=dict(iops_reads=[10, 30], iops_writes=[2, 4],
+                                                               latency_reads=[500, 700], latency_writes=[800, 600]),
+                                                  aggregations=dict(iops_reads=dict(max=30, p95=30),
+                                                                    iops_writes=dict(max=4, p95=4),
+                                                                    latency_reads=dict(max=700, p95=700),
+                                                                    latency_writes=dict(max=800, p95=800)))])
+        )
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import io
+import json
+import mock
+import pytest
+
+from ansible.errors import AnsibleAuthenticationFailure
+from ansible.module_utils.connection import ConnectionError
+from simplivity_module_loader import SimplivityModule, load_plugin
+from simplivity.exceptions import HPESimpliVityException
+from module_utils.simplivity_connection import OVCSession, PersistentConnection
+
+httpapi_simplivity = load_plugin('httpapi', 'simplivity')
+
+
+def _response(status, body):
+    response = mock.Mock()
+    response.getcode.return_value = status
+    return response, io.BytesIO(json.dumps(body).encode('utf-8'))
+
+
+class TestSimplivityHttpApi():
+    @pytest.fixture(autouse=True)
+    def setUp(self):
+        self.connection = mock.Mock()
+        self.connection._auth = None
+        self.httpapi = httpapi_simplivity.HttpApi(self.connection)
+
+    def test_login_should_set_the_bearer_token(self):
+        self.connection.send.return_value = _response(200, {'access_token': 'token1', 'expires_in': 600})
+
+        self.httpapi.login('admin', 'password')
+
+        path, data = self.connection.send.call_args[0]
+        assert path == '/api/oauth/token'
+        assert b'username=admin' in data
+        assert self.connection._auth == {'Authorization': 'Bearer token1'}
+
+    def test_login_should_fail_with_invalid_credentials(self):
+        self.connection.send.return_value = _response(400, {'error': 'invalid_grant'})
+
+        with pytest.raises(AnsibleAuthenticationFailure):
+            self.httpapi.login('admin', 'wrong')
+
+    def test_send_request_should_return_status_and_body(self):
+        self.connection.send.return_value = _response(200, {'hosts': []})
+
+        assert self.httpapi.send_request('', '/hosts?limit=500') == (200, {'hosts': []})
+        self.connection.send.assert_called_once_with('/api/hosts?limit=500', None, method='GET', headers=mock.ANY)
+
+    def test_send_request_should_keep_custom_headers(self):
+        self.connection.send.return_value = _response(202, {'task': {}})
+
+        self.httpapi.send_request('{}', '/virtual_machines/1/clone', method='POST', headers={'Custom': 'value'})
+
+        headers = self.connection.send.call_args[1]['headers']
+        assert headers['Custom'] == 'value'
+        assert headers['Content-type'] == httpapi_simplivity.CONTENT_TYPE
+
+
+class TestPersistentConnection():
+    @pytest.fixture(autouse=True)
+    def setUp(self):
+        patcher = mock.patch('module_utils.simplivity_connection.Connection')
+        self.mock_connection = patcher.start().return_value
+        self.mock_connection.get_option.side_effect = {'host': '10.0.0.1', 'remote_user': 'admin'}.get
+        yield
+        patcher.stop()
+
+    def test_should_send_requests_through_the_persistent_connection(self):
+        self.mock_connection.send_request.return_value = [200, {'hosts': [{'id': '1'}]}]
+
+        hosts = OVCSession(PersistentConnection('/tmp/socket')).hosts.get_all()
+
+        assert [host.data for host in hosts] == [{'id': '1'}]
+        assert self.mock_connection.send_request.call_args[1]['method'] == 'GET'
+
+    def test_should_raise_simplivity_exception_on_connection_errors(self):
+        self.mock_connection.send_request.side_effect = ConnectionError('socket closed')
+
+        with pytest.raises(HPESimpliVityException):
+            PersistentConnection('/tmp/socket').get('/hosts')
+
+    def test_module_should_use_the_persistent_connection_when_available(self):
+        with mock.patch(SimplivityModule.__module__ + '.AnsibleModule') as mock_ansible_module:
+            mock_ansible_module.return_value._socket_path = '/tmp/socket'
+            mock_ansible_module.return_value.params = {'config': None}
+
+            with mock.patch('module_utils.simplivity.OVC') as mock_ovc:
+                module = SimplivityModule()
+
+        mock_ovc.from_environment_variables.assert_not_called()
+        assert isinstance(module.ovc_client.connection, PersistentConnection)
+        assert module.ovc_client.connection.ovc_ip == '10.0.0.1'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
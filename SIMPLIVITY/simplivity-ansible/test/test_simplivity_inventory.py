@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import mock
+import os
+import pytest
+import sys
+import yaml
+
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+from simplivity_module_loader import SIMPLIVITY_PLUGINS_PATH
+from simplivity_ovc_server import InProcessOVCConnection, OVCStandInServer, sample_resources
+
+# The plugin options are read through the Ansible configuration, so it is loaded by the Ansible plugin loader
+inventory_loader.add_directory(os.path.join(SIMPLIVITY_PLUGINS_PATH, 'inventory'))
+
+
+class TestSimplivityInventory():
+    """
+    The inventory plugin runs against the OVC stand-in.
+    """
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir):
+        self.tmpdir = tmpdir
+        self.config = dict(plugin='simplivity', ovc_ip='ovc', username='admin', password='password')
+        self.ovc = OVCStandInServer(resources=sample_resources(vm_count=4))
+
+        self.plugin_module = sys.modules[type(inventory_loader.get('simplivity')).__module__]
+        # The connection module imported by the plugin
+        connection_module = sys.modules[self.plugin_module.create_plugin_session.__module__]
+        patcher = mock.patch.object(connection_module, 'OVCConnection',
+                                    lambda *args, **kwargs: InProcessOVCConnection(self.ovc, *args, **kwargs))
+        patcher.start()
+        yield
+        patcher.stop()
+
+    def _parse(self, cache=False):
+        path = self.tmpdir.join('ovc.simplivity.yml')
+        path.write(yaml.safe_dump(self.config))
+        inventory = InventoryData()
+        plugin = inventory_loader.get('simplivity')
+
+        plugin.parse(inventory, DataLoader(), str(path), cache=cache)
+        # As the Ansible inventory manager, once the source is parsed
+        if getattr(plugin, '_cache', None):
+            plugin.update_cache_if_changed()
+        return inventory
+
+    def test_should_group_the_vms_by_cluster_datastore_policy_and_host(self):
+        inventory = self._parse()
+
+        assert sorted(inventory.hosts) == ['vm0', 'vm1', 'vm2', 'vm3']
+        assert sorted(host.name for host in inventory.groups['simplivity_cluster_cluster1'].get_hosts()) == ['vm1', 'vm3']
+        assert [host.name for host in inventory.groups['simplivity_policy_policy2'].get_hosts()] == ['vm2']
+        assert [host.name for host in inventory.groups['simplivity_host_host3'].get_hosts()] == ['vm3']
+        assert 'simplivity_datastore_datastore0' in inventory.groups
+
+    def test_should_set_the_vm_fields_as_host_variables(self):
+        host_vars = self._parse().get_host('vm1').get_vars()
+
+        assert host_vars['simplivity_id'] == 'vm-1'
+        assert host_vars['simplivity_policy_name'] == 'policy1'
+        assert host_vars['simplivity_host_name'] == 'host1'
+
+    def test_should_only_add_the_groups_of_group_by(self):
+        self.config.update(group_by=['policy'], group_prefix='svt_',
+                           keyed_groups=[dict(key='simplivity_omnistack_cluster_name', prefix='cluster')])
+
+        groups = set(self._parse().groups) - set(['all', 'ungrouped'])
+
+        assert groups == set(['svt_policy_policy0', 'svt_policy_policy1', 'svt_policy_policy2',
+                              'cluster_cluster0', 'cluster_cluster1'])
+
+    def test_should_add_the_vms_with_the_same_name_as_distinct_hosts(self):
+        vms = self.ovc.resources['virtual_machines']
+        vms[1]['name'] = 'vm0'
+        vms[2]['name'] = vms[3]['name'] = 'vm2'
+        vms[3]['datastore_name'] = vms[2]['datastore_name']
+
+        with mock.patch.object(self.plugin_module.display, 'warning') as mock_warning:
+            inventory = self._parse()
+
+        assert sorted(inventory.hosts) == ['vm0_datastore0', 'vm0_datastore1', 'vm2_vm-2', 'vm2_vm-3']
+        assert inventory.get_host('vm0_datastore1').get_vars()['simplivity_id'] == 'vm-1'
+        assert inventory.get_host('vm2_vm-3').get_vars()['simplivity_name'] == 'vm2'
+        assert 'vm0, vm2' in mock_warning.call_args[0][0]
+
+    def test_should_send_the_filters_to_the_ovc(self):
+        self.ovc.resources['virtual_machines'][0]['state'] = 'REMOVED'
+        self.config['filters'] = dict(state='ALIVE')
+
+        assert sorted(self._parse().hosts) == ['vm1', 'vm2', 'vm3']
+
+    def test_should_not_request_the_ovc_while_the_vms_are_cached(self):
+        self.config.update(cache=True, cache_plugin='jsonfile', cache_connection=str(self.tmpdir.join('cache')))
+        self._parse()
+        self.ovc.stats['api_calls'] = 0
+
+        inventory = self._parse(cache=True)
+
+        assert self.ovc.stats['api_calls'] == 0
+        assert sorted(inventory.hosts) == ['vm0', 'vm1', 'vm2', 'vm3']
+
+    def test_should_refresh_the_cache_when_the_inventory_is_refreshed(self):
+        self.config.update(cache=True, cache_plugin='jsonfile', cache_connection=str(self.tmpdir.join('cache')))
+        self._parse()
+        self.ovc.resources['virtual_machines'].pop()
+
+        assert sorted(self._parse(cache=False).hosts) == ['vm0', 'vm1', 'vm2']
+        assert sorted(self._parse(cache=True).hosts) == ['vm0', 'vm1', 'vm2']
+
+    def test_should_only_verify_the_simplivity_configuration_files(self):
+        plugin = inventory_loader.get('simplivity')
+        self.tmpdir.join('hosts.yml').write('')
+        self.tmpdir.join('lab.simplivity.yaml').write('')
+
+        assert not plugin.verify_file(str(self.tmpdir.join('hosts.yml')))
+        assert plugin.verify_file(str(self.tmpdir.join('lab.simplivity.yaml')))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
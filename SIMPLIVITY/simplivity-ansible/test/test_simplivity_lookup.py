@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import mock
+import os
+import pytest
+import sys
+
+from ansible.errors import AnsibleError
+from ansible.plugins.loader import lookup_loader
+from module_utils.simplivity_facts_cache import FactsCache
+from simplivity_module_loader import SIMPLIVITY_PLUGINS_PATH
+from simplivity_ovc_server import InProcessOVCConnection, OVCStandInServer, sample_resources
+
+# The plugin options are read through the Ansible configuration, so it is loaded by the Ansible plugin loader
+lookup_loader.add_directory(os.path.join(SIMPLIVITY_PLUGINS_PATH, 'lookup'))
+
+
+class TestSimplivityLookup():
+    """
+    The lookup plugin runs against the OVC stand-in.
+    """
+
+    @pytest.fixture(autouse=True)
+    def setUp(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('SIMPLIVITY_STATE_DIR', str(tmpdir))
+        self.ovc = OVCStandInServer(resources=sample_resources(vm_count=4))
+        self.options = dict(ovc_ip='ovc', username='admin', password='password')
+
+        self.plugin_module = sys.modules[type(lookup_loader.get('simplivity')).__module__]
+        self.plugin_module._LISTINGS.clear()
+        # The connection module imported by the plugin
+        connection_module = sys.modules[self.plugin_module.create_plugin_session.__module__]
+        patcher = mock.patch.object(connection_module, 'OVCConnection',
+                                    lambda *args, **kwargs: InProcessOVCConnection(self.ovc, *args, **kwargs))
+        patcher.start()
+        yield
+        patcher.stop()
+
+    def _run(self, *terms, **kwargs):
+        return lookup_loader.get('simplivity').run(list(terms), variables={}, **dict(self.options, **kwargs))
+
+    def test_should_return_the_ids_of_the_resources(self):
+        assert self._run('policy2', 'policy0', resource='policies') == ['policy-2', 'policy-0']
+
+    def test_should_return_the_field_of_the_resources_matching_the_key(self):
+        assert self._run('host-3', resource='hosts', key='id', field='name') == ['host3']
+
+    def test_should_return_the_whole_resources_without_field(self):
+        vm = self._run('vm1', field='')[0]
+
+        assert vm['id'] == 'vm-1'
+        assert vm['policy_name'] == 'policy1'
+
+    def test_should_request_the_ovc_once_for_all_the_lookups(self):
+        for _ in range(100):
+            assert self._run('vm1', 'vm2') == ['vm-1', 'vm-2']
+
+        assert self.ovc.stats['logins'] == 1
+        assert self.ovc.stats['api_calls'] == 1
+
+    def test_should_reuse_the_resources_cached_by_another_process(self):
+        self._run('vm1')
+        # As the worker process of the next task, forked without the resources in memory
+        self.plugin_module._LISTINGS.clear()
+
+        assert self._run('vm2') == ['vm-2']
+        assert self.ovc.stats['api_calls'] == 1
+
+    def test_should_request_the_ovc_again_once_a_module_changed_it(self):
+        self._run('vm1')
+        self.plugin_module._LISTINGS.clear()
+        FactsCache().invalidate('ovc')
+
+        self._run('vm1')
+
+        assert self.ovc.stats['api_calls'] == 2
+
+    def test_should_request_the_ovc_again_in_the_same_process_once_a_module_changed_it(self):
+        self._run('vm1')
+        FactsCache().invalidate('ovc')
+
+        self._run('vm1')
+        self._run('vm1')
+
+        assert self.ovc.stats['api_calls'] == 2
+
+    def test_should_request_the_ovc_for_each_lookup_without_cache(self):
+        self._run('vm1', cache_ttl=0)
+        self._run('vm1', cache_ttl=0)
+
+        assert self.ovc.stats['api_calls'] == 2
+
+    def test_should_request_all_the_pages(self):
+        assert self._run('vm3', page_size=2) == ['vm-3']
+        assert self.ovc.stats['api_calls'] == 3
+
+    def test_should_send_the_filters_to_the_ovc(self):
+        self.ovc.resources['virtual_machines'][2]['name'] = 'vm1'
+
+        assert self._run('vm1', filters=dict(datastore_name='datastore0')) == ['vm-2']
+
+    def test_should_fail_when_several_resources_match(self):
+        self.ovc.resources['virtual_machines'][2]['name'] = 'vm1'
+
+        with pytest.raises(AnsibleError, match='2 virtual_machines match'):
+            self._run('vm1')
+
+    def test_should_return_the_default_when_no_resource_matches(self):
+        assert self._run('missing', default='') == ['']
+
+        with pytest.raises(AnsibleError, match='No virtual_machines match'):
+            self._run('missing')
+
+
+class TestLRUCache():
+
+    @pytest.fixture(autouse=True)
+    def setUp(self):
+        self.lru_cache = sys.modules[type(lookup_loader.get('simplivity')).__module__].LRUCache(2)
+
+    def test_should_discard_the_least_recently_used_entry(self):
+        self.lru_cache.set('a', 1, expires_at=float('inf'))
+        self.lru_cache.set('b', 2, expires_at=float('inf'))
+        self.lru_cache.get('a')
+        self.lru_cache.set('c', 3, expires_at=float('inf'))
+
+        assert [self.lru_cache.get(key) for key in ['a', 'b', 'c']] == [1, None, 3]
+
+    def test_should_not_return_the_expired_entries(self):
+        self.lru_cache.set('a', 1, expires_at=0)
+
+        assert self.lru_cache.get('a') is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
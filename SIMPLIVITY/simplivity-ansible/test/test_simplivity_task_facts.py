@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import mock
+import pytest
+import yaml
+
+from simplivity.exceptions import HPESimpliVityException
+from simplivity_test_utils import SimplivityModuleTest
+from simplivity_module_loader import TaskFactsModule
+
+PARAMS_GET_TASKS = """
+    config: "{{ config.json }}"
+    task_ids: ['task1', 'task2']
+    wait: false
+    timeout: 3600
+"""
+
+PARAMS_WAIT_FOR_TASKS = """
+    config: "{{ config.json }}"
+    task_ids: ['task1', 'task2']
+    wait: true
+    timeout: 60
+"""
+
+
+def task(task_id, state):
+    return {'task': {'id': task_id, 'state': state}}
+
+
+@pytest.mark.resource(TestTaskFactsModule='connection')
+class TestTaskFactsModule(SimplivityModuleTest):
+
+    @pytest.fixture(autouse=True)
+    def mock_time(self):
+        with mock.patch('simplivity_task_facts.time') as mock_time:
+            mock_time.time.return_value = 0
+            self.mock_time = mock_time
+            yield
+
+    def test_should_get_the_tasks_in_order(self):
+        self.resource.get.side_effect = lambda uri: task(uri.split('/')[-1], 'COMPLETED')
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_TASKS)
+
+        TaskFactsModule().run()
+
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=False,
+            ansible_facts=dict(tasks=[task('task1', 'COMPLETED')['task'], task('task2', 'COMPLETED')['task']],
+                               pending_tasks=[])
+        )
+        self.mock_time.sleep.assert_not_called()
+
+    def test_should_not_wait_for_the_running_tasks_by_default(self):
+        self.resource.get.side_effect = [task('task1', 'IN_PROGRESS'), task('task2', 'COMPLETED')]
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_TASKS)
+
+        TaskFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert facts['pending_tasks'] == ['task1']
+        self.mock_time.sleep.assert_not_called()
+
+    def test_should_poll_only_the_running_tasks_until_they_finish(self):
+        states = {'task1': ['IN_PROGRESS', 'IN_PROGRESS', 'COMPLETED'], 'task2': ['ERROR']}
+        self.resource.get.side_effect = lambda uri: task(uri.split('/')[-1], states[uri.split('/')[-1]].pop(0))
+        self.mock_ansible_module.params = yaml.load(PARAMS_WAIT_FOR_TASKS)
+
+        TaskFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [item['state'] for item in facts['tasks']] == ['COMPLETED', 'ERROR']
+        assert facts['pending_tasks'] == []
+        assert self.resource.get.call_count == 4
+        assert self.mock_time.sleep.call_args_list == [mock.call(1), mock.call(2)]
+
+    def test_should_return_the_running_tasks_on_timeout(self):
+        self.resource.get.side_effect = lambda uri: task(uri.split('/')[-1], 'IN_PROGRESS')
+        self.mock_time.time.side_effect = [0, 0, 0, 59, 59, 61]
+        self.mock_ansible_module.params = yaml.load(PARAMS_WAIT_FOR_TASKS)
+
+        TaskFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert facts['pending_tasks'] == ['task1', 'task2']
+        assert self.mock_time.sleep.call_args_list == [mock.call(1), mock.call(1)]
+
+    def test_should_return_unknown_state_when_the_task_can_not_be_retrieved(self):
+        self.resource.get.side_effect = [HPESimpliVityException('Task not found'), task('task2', 'COMPLETED')]
+        self.mock_ansible_module.params = yaml.load(PARAMS_GET_TASKS)
+
+        TaskFactsModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert facts['tasks'][0]['id'] == 'task1'
+        assert facts['tasks'][0]['state'] == 'UNKNOWN'
+        assert 'Task not found' in facts['tasks'][0]['message']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
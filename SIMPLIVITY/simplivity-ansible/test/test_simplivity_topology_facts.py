@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###
+# Copyright (2019) Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+###
+
+import mock
+import pytest
+import threading
+
+from module_utils import simplivity_connection
+from module_utils.simplivity_fetch import FetchEngine
+from simplivity_test_utils import SimplivityModuleTest
+from simplivity_module_loader import TopologyFactsModule
+from simplivity_ovc_server import InProcessOVCConnection, OVCStandInServer, sample_resources
+
+
+@pytest.mark.resource(TestTopologyFactsModule='connection')
+class TestTopologyFactsModule(SimplivityModuleTest):
+    """
+    The listings are requested from the OVC stand-in, through the connections of the module.
+    """
+
+    @pytest.fixture(autouse=True)
+    def stand_in(self, mock_ansible_module):
+        self.ovc = OVCStandInServer(resources=sample_resources(vm_count=6))
+        self.connections = []
+
+        def create_connection(*args, **kwargs):
+            connection = InProcessOVCConnection(self.ovc, *args, **kwargs)
+            self.connections.append(connection)
+            return connection
+
+        mock_ansible_module.params = dict(config=None, ovc_ip='ovc', username='admin', password='password',
+                                          max_workers=3, page_size=2)
+        with mock.patch.object(simplivity_connection, 'OVCConnection', side_effect=create_connection):
+            yield
+
+    def _run(self):
+        TopologyFactsModule().run()
+        return self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']['topology']
+
+    def test_should_join_the_hosts_datastores_and_vms_to_their_clusters(self):
+        topology = self._run()
+
+        cluster = topology['clusters'][1]
+        assert cluster['name'] == 'cluster1'
+        assert [host['name'] for host in cluster['hosts']] == ['host1', 'host3']
+        assert [datastore['name'] for datastore in cluster['datastores']] == ['datastore1']
+        assert [vm['name'] for vm in cluster['datastores'][0]['virtual_machines']] == ['vm1', 'vm3', 'vm5']
+        assert cluster['datastores'][0]['policy_name'] == 'policy0'
+        assert cluster['hosts'][0]['virtual_machine_ids'] == ['vm-1', 'vm-5']
+        assert topology['policies'][0]['virtual_machine_ids'] == ['vm-0', 'vm-3']
+        assert topology['unassigned'] == dict(hosts=[], datastores=[], virtual_machines=[])
+
+    def test_should_return_the_resources_whose_parent_is_not_found(self):
+        self.ovc.resources['virtual_machines'][0]['datastore_id'] = 'removed'
+
+        topology = self._run()
+
+        assert [vm['name'] for vm in topology['unassigned']['virtual_machines']] == ['vm0']
+
+    def test_should_log_in_once_for_all_the_connections(self):
+        self._run()
+
+        assert 1 <= len(self.connections) <= 3
+        assert self.ovc.stats['logins'] == 1
+        # The first page of each of the 5 listings, and the other pages of the hosts, policies and VMs
+        assert self.ovc.stats['api_calls'] == 5 + 1 + 1 + 2
+
+    def test_should_keep_the_join_fields_when_the_fields_are_set(self):
+        self.mock_ansible_module.params['params'] = dict(virtual_machines=dict(fields='name'))
+
+        topology = self._run()
+
+        vm = topology['clusters'][0]['datastores'][0]['virtual_machines'][0]
+        assert sorted(vm) == ['datastore_id', 'host_id', 'id', 'name', 'policy_id']
+
+    def test_should_fail_when_a_listing_fails(self):
+        self.ovc.resources.pop('policies')
+
+        TopologyFactsModule().run()
+
+        self.mock_ansible_module.fail_json.assert_called_once_with(msg=mock.ANY, exception=mock.ANY)
+
+
+class TestFetchEngine():
+
+    def test_should_send_the_requests_at_the_same_time(self):
+        barrier = threading.Barrier(3, timeout=5)
+        connection = mock.Mock()
+
+        def get(url):
+            # Each request waits until 3 of them are being sent
+            barrier.wait()
+            name = url.split('?')[0].strip('/')
+            return {name: [dict(id=name)], 'count': 1}
+
+        connection.get.side_effect = get
+        engine = FetchEngine(lambda: connection, max_workers=3)
+
+        result = engine.fetch(dict(hosts={}, datastores={}, policies={}))
+
+        assert result == dict(hosts=[dict(id='hosts')], datastores=[dict(id='datastores')], policies=[dict(id='policies')])
+
+    def test_should_request_the_pages_one_after_the_other_without_the_count(self):
+        connection = mock.Mock()
+        connection.get.side_effect = [dict(hosts=[1, 2]), dict(hosts=[3, 4]), dict(hosts=[5])]
+        engine = FetchEngine(lambda: connection, max_workers=2, page_size=2)
+
+        assert engine.fetch(dict(hosts={'sort': 'name'})) == dict(hosts=[1, 2, 3, 4, 5])
+        assert connection.get.call_args_list[-1] == mock.call('/hosts?limit=2&offset=4&sort=name')
+        assert connection.close.call_count == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
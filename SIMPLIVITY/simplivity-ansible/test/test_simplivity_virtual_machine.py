@@ -23,7 +23,7 @@ import yaml
 from copy import deepcopy
 from simplivity_test_utils import SimplivityModuleTest
 from simplivity_module_loader import VirtualMachineModule
-from simplivity.exceptions import HPESimpliVityResourceNotFound
+from simplivity.exceptions import HPESimpliVityException, HPESimpliVityResourceNotFound
 
 
 PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS = """
@@ -44,6 +44,16 @@ PARAMS_FOR_CLONE = """
       new_name: 'TESTVM_CLONE'
 """
 
+PARAMS_FOR_MULTIPLE_CLONES = """
+    config: "{{ config }}"
+    state: clone
+    max_concurrent: 2
+    data:
+      name: 'TESTVM'
+      new_name_pattern: 'TESTVM_CLONE{0}'
+      count: 3
+"""
+
 PARAMS_FOR_MOVE = """
     config: "{{ config }}"
     state: move
@@ -53,6 +63,26 @@ PARAMS_FOR_MOVE = """
       datastore_name: 'TEST_DATASTORE_NAME'
 """
 
+PARAMS_FOR_MULTIPLE_MOVES = """
+    config: "{{ config }}"
+    state: move
+    max_concurrent: 10
+    max_concurrent_per_datastores: 1
+    data:
+      vms:
+        - name: 'TESTVM1'
+          datastore_name: 'TARGET'
+        - name: 'TESTVM2'
+          new_name: 'TESTVM2_MOVED'
+          datastore_name: 'TARGET'
+        - name: 'TESTVM3'
+          datastore_name: 'TARGET'
+        - name: 'TESTVM4'
+          datastore_name: 'TARGET'
+        - name: 'MISSINGVM'
+          datastore_name: 'TARGET'
+"""
+
 PARAMS_FOR_BACKUP = """
     config: "{{ config }}"
     state: backup
@@ -64,6 +94,15 @@ PARAMS_FOR_BACKUP = """
       consistency_type: null
 """
 
+PARAMS_FOR_MULTIPLE_BACKUPS = """
+    config: "{{ config }}"
+    state: backup
+    max_concurrent: 2
+    data:
+      vm_names: ['TESTVM1', 'TESTVM2', 'TESTVM3', 'MISSINGVM']
+      backup_name: 'TESTBACKUP'
+"""
+
 PARAMS_FOR_BACKUP_PARAMETERS = """
     config: "{{ config }}"
     state: set_backup_parameters
@@ -98,7 +137,7 @@ class TestVirtualMachineModule(SimplivityModuleTest):
     def test_set_policy_with_no_vms_already_have_the_policy(self):
         self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
         self.policy.get_vms.return_value = []
-        self.mock_ovc_client.virtual_machines.get_by_name.side_effect = [self.vm1, self.vm2]
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1, self.vm2]
         self.mock_ovc_client.policies.get_by_name.return_value = self.policy
 
         VirtualMachineModule().run()
@@ -106,13 +145,13 @@ class TestVirtualMachineModule(SimplivityModuleTest):
         self.mock_ansible_module.exit_json.assert_called_once_with(
             changed=True,
             msg=VirtualMachineModule.MSG_UPDATED_POLICY_OF_MULTIPLE_VMS,
-            ansible_facts=dict(policy_updated_vms=[self.vm1.data["name"], self.vm2.data["name"]])
+            ansible_facts=dict(policy_updated_vms=[self.vm1.data["name"], self.vm2.data["name"]], not_found_vms=[])
         )
 
     def test_set_policy_should_avoid_vms_that_alreay_have_the_policy(self):
         self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
         self.policy.get_vms.return_value = [self.vm1]
-        self.mock_ovc_client.virtual_machines.get_by_name.side_effect = [self.vm1, self.vm2]
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1, self.vm2]
         self.mock_ovc_client.policies.get_by_name.return_value = self.policy
 
         VirtualMachineModule().run()
@@ -120,13 +159,13 @@ class TestVirtualMachineModule(SimplivityModuleTest):
         self.mock_ansible_module.exit_json.assert_called_once_with(
             changed=True,
             msg=VirtualMachineModule.MSG_UPDATED_POLICY_OF_MULTIPLE_VMS,
-            ansible_facts=dict(policy_updated_vms=[self.vm2.data["name"]])
+            ansible_facts=dict(policy_updated_vms=[self.vm2.data["name"]], not_found_vms=[])
         )
 
     def test_set_policy_should_not_call_when_all_the_vms_have_policy_already_attached(self):
         self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
         self.policy.get_vms.return_value = [self.vm1, self.vm2]
-        self.mock_ovc_client.virtual_machines.get_by_name.side_effect = [self.vm1, self.vm2]
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1, self.vm2]
         self.mock_ovc_client.policies.get_by_name.return_value = self.policy
 
         VirtualMachineModule().run()
@@ -134,9 +173,100 @@ class TestVirtualMachineModule(SimplivityModuleTest):
         self.mock_ansible_module.exit_json.assert_called_once_with(
             changed=False,
             msg=VirtualMachineModule.MSG_POLICY_ALREADY_APPLIED,
-            ansible_facts=dict(policy_updated_vms=[])
+            ansible_facts=dict(policy_updated_vms=[], not_found_vms=[])
+        )
+
+    def test_set_policy_should_resolve_the_vms_with_one_request(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        self.policy.get_vms.return_value = []
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1, self.vm2]
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.virtual_machines.get_all.assert_called_once_with(filters={'name': 'TESTVM1,TESTVM2'})
+        self.mock_ovc_client.virtual_machines.get_by_name.assert_not_called()
+
+    def test_set_policy_should_report_the_vms_not_found(self):
+        params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        params['data']['vm_names'] = ['TESTVM1', 'MISSING', 'TESTVM1']
+        self.mock_ansible_module.params = params
+        self.policy.get_vms.return_value = []
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1]
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.virtual_machines.set_policy_for_multiple_vms.assert_called_once_with(self.policy, [self.vm1])
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=True,
+            msg=VirtualMachineModule.MSG_UPDATED_POLICY_OF_MULTIPLE_VMS + ' ' + VirtualMachineModule.MSG_VMS_NOT_FOUND.format('MISSING'),
+            ansible_facts=dict(policy_updated_vms=['TESTVM1'], not_found_vms=['MISSING'])
         )
 
+    def test_set_policy_should_fail_when_no_vm_is_found(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        self.mock_ovc_client.virtual_machines.get_all.return_value = []
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.virtual_machines.set_policy_for_multiple_vms.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            exception=mock.ANY, msg=VirtualMachineModule.MSG_VMS_NOT_FOUND.format('TESTVM1, TESTVM2'))
+
+    def test_set_policy_should_fail_with_a_wildcard_in_the_names(self):
+        params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        params['data']['vm_names'] = ['TESTVM1', 'TESTVM*']
+        self.mock_ansible_module.params = params
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.virtual_machines.get_all.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            exception=mock.ANY, msg=VirtualMachineModule.MSG_VM_NAME_WILDCARD.format('TESTVM*'))
+
+    def test_set_policy_should_resolve_the_names_in_batches(self):
+        params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        params['data']['vm_names'] = ['vm{0}'.format(index) for index in range(VirtualMachineModule.NAME_BATCH_SIZE + 1)]
+        self.mock_ansible_module.params = params
+        self.mock_ovc_client.virtual_machines.get_all.return_value = []
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        assert self.mock_ovc_client.virtual_machines.get_all.call_count == 2
+        last_filters = self.mock_ovc_client.virtual_machines.get_all.call_args[1]['filters']
+        assert last_filters == {'name': 'vm{0}'.format(VirtualMachineModule.NAME_BATCH_SIZE)}
+
+    def test_set_policy_should_request_the_names_with_a_comma_alone(self):
+        params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        params['data']['vm_names'] = ['TESTVM1', 'TEST,VM2']
+        self.mock_ansible_module.params = params
+        self.policy.get_vms.return_value = []
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1]
+        self.mock_ovc_client.virtual_machines.get_by_name.side_effect = HPESimpliVityResourceNotFound('not found')
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.virtual_machines.get_all.assert_called_once_with(filters={'name': 'TESTVM1'})
+        self.mock_ovc_client.virtual_machines.get_by_name.assert_called_once_with('TEST,VM2')
+        assert self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']['not_found_vms'] == ['TEST,VM2']
+
+    def test_set_policy_should_use_the_policy_of_the_vms_when_it_is_listed(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY_FOR_MULTIPLE_VMS)
+        self.vm1.data['policy_id'] = self.policy.data['id']
+        self.vm2.data['policy_id'] = 'other'
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1, self.vm2]
+        self.mock_ovc_client.policies.get_by_name.return_value = self.policy
+
+        VirtualMachineModule().run()
+
+        self.policy.get_vms.assert_not_called()
+        assert self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']['policy_updated_vms'] == ['TESTVM2']
+
     def test_clone_when_vm_with_the_same_name_exists(self):
         self.mock_ansible_module.params = yaml.load(PARAMS_FOR_CLONE)
         self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
@@ -163,6 +293,38 @@ class TestVirtualMachineModule(SimplivityModuleTest):
             ansible_facts=dict(cloned_vm=self.vm2.data)
         )
 
+    def test_clone_should_return_the_task_without_waiting(self):
+        self.mock_ansible_module.params = dict(yaml.load(PARAMS_FOR_CLONE), wait=False)
+        self.mock_ovc_client.virtual_machines.get_by_name.side_effect = [self.vm1, HPESimpliVityResourceNotFound('Test')]
+        self.vm1.data = {'id': '1', 'name': 'TESTVM'}
+        task = {'id': 'task1', 'state': 'IN_PROGRESS'}
+        self.mock_ovc_client.connection.post.return_value = ({'task': task}, {})
+
+        VirtualMachineModule().run()
+
+        self.vm1.clone.assert_not_called()
+        self.mock_ovc_client.connection.post.assert_called_once_with(
+            '/virtual_machines/1/clone', {'virtual_machine_name': 'TESTVM_CLONE', 'app_consistent': False})
+        self.mock_ansible_module.exit_json.assert_called_once_with(
+            changed=True,
+            msg=VirtualMachineModule.MSG_TASK_STARTED,
+            ansible_facts=dict(task=task)
+        )
+
+    def test_clone_to_a_datastore_should_fail_without_waiting(self):
+        params = yaml.load(PARAMS_FOR_CLONE)
+        params['data']['datastore'] = 'TEST_DATASTORE_NAME'
+        self.mock_ansible_module.params = dict(params, wait=False)
+        self.mock_ovc_client.virtual_machines.get_by_name.side_effect = [self.vm1, HPESimpliVityResourceNotFound('Test')]
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            exception=mock.ANY,
+            msg=VirtualMachineModule.MSG_CLONE_TO_DATASTORE_NEEDS_WAIT
+        )
+
     def test_move_when_vm_with_the_same_name_exists(self):
         self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MOVE)
         self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
@@ -251,6 +413,27 @@ class TestVirtualMachineModule(SimplivityModuleTest):
             ansible_facts=dict(virtual_machine=self.vm1.data)
         )
 
+    def test_set_policy_should_return_the_vm_differences_in_diff_mode(self):
+        policy = mock.Mock()
+        policy.data = {'name': 'TESTPOLICY', 'id': '123'}
+        self.vm1.data = {'name': 'TESTVM', 'id': '456', 'policy_id': '100'}
+
+        def set_policy(policy):
+            self.vm1.data = dict(self.vm1.data, policy_id=policy.data['id'])
+        self.vm1.set_policy.side_effect = set_policy
+
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_SET_POLICY)
+        self.mock_ansible_module._diff = True
+        self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
+        self.mock_ovc_client.policies.get_by_name.return_value = policy
+        policy.get_vms.return_value = [self.vm2]
+
+        VirtualMachineModule().run()
+
+        result = self.mock_ansible_module.exit_json.call_args[1]
+        assert result['diff'] == dict(before={'virtual_machine.policy_id': '100'},
+                                      after={'virtual_machine.policy_id': '123'})
+
     def test_set_policy_when_policy_already_attached_to_vm(self):
         policy = mock.Mock()
         policy.data = {'name': 'TESTPOLICY', 'id': '123'}
@@ -268,6 +451,330 @@ class TestVirtualMachineModule(SimplivityModuleTest):
             ansible_facts=dict(virtual_machine={})
         )
 
+    def _setup_multiple_backups(self, task_states):
+        self.vm3 = mock.Mock()
+        self.vm3.data = {'name': 'TESTVM3', 'id': '567'}
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_BACKUPS)
+        self.mock_ovc_client.virtual_machines.get_all.return_value = [self.vm1, self.vm2, self.vm3]
+        self.mock_ovc_client.backups.get_all.side_effect = lambda filters, **kwargs: [
+            mock.Mock(data={'id': backup_id, 'virtual_machine_id': backup_id}) for backup_id in filters.get('id', '').split(',') if backup_id]
+
+        # The VM id is used as the task id and the backup id
+        def post(uri, body):
+            vm_id = uri.split('/')[2]
+            return {'task': self._task(vm_id, task_states[vm_id].pop(0))}, {}
+
+        self.mock_ovc_client.connection.post.side_effect = post
+        self.mock_ovc_client.connection.get.side_effect = lambda uri: {
+            'task': self._task(uri.split('/')[-1], task_states[uri.split('/')[-1]].pop(0))}
+
+    def _task(self, object_id, state, object_type='backup'):
+        return {'id': object_id, 'state': state, 'message': 'Backup failed',
+                'affected_objects': [{'object_id': object_id, 'object_type': object_type}]}
+
+    def test_create_backups_should_keep_max_concurrent_tasks_running(self):
+        self._setup_multiple_backups({'123': ['IN_PROGRESS', 'IN_PROGRESS', 'COMPLETED'],
+                                      '345': ['IN_PROGRESS', 'COMPLETED'],
+                                      '567': ['IN_PROGRESS', 'COMPLETED']})
+
+        with mock.patch('simplivity_virtual_machine.time') as mock_time:
+            VirtualMachineModule().run()
+
+        posted_uris = [call[0][0] for call in self.mock_ovc_client.connection.post.call_args_list]
+        requests = [call[1][0] for call in self.mock_ovc_client.connection.mock_calls if call[0] in ('post', 'get')]
+        assert posted_uris == ['/virtual_machines/123/backup', '/virtual_machines/345/backup', '/virtual_machines/567/backup']
+        # The third backup starts once the second one finishes
+        assert requests.index('/virtual_machines/567/backup') > requests.index('/tasks/345')
+        assert mock_time.sleep.call_count == 2
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [(name, result['status']) for name, result in facts['vm_backups'].items()] == [
+            ('TESTVM1', 'CREATED'), ('TESTVM2', 'CREATED'), ('TESTVM3', 'CREATED')]
+        assert facts['not_found_vms'] == ['MISSINGVM']
+        assert self.mock_ansible_module.exit_json.call_args[1]['msg'] == VirtualMachineModule.MSG_BACKUPS_CREATED
+
+    def test_create_backups_should_skip_the_vms_with_a_backup_of_the_same_name(self):
+        self._setup_multiple_backups({'345': ['COMPLETED']})
+        backups_get_all = self.mock_ovc_client.backups.get_all.side_effect
+        self.mock_ovc_client.backups.get_all.side_effect = lambda filters, **kwargs: (
+            [mock.Mock(data={'virtual_machine_id': '123'}), mock.Mock(data={'virtual_machine_id': '567'})]
+            if 'virtual_machine_id' in filters else backups_get_all(filters))
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_called_once_with(
+            '/virtual_machines/345/backup',
+            {'backup_name': 'TESTBACKUP', 'app_consistent': False, 'consistency_type': None, 'retention': 0})
+        self.mock_ovc_client.backups.get_all.assert_any_call(
+            filters={'name': 'TESTBACKUP', 'virtual_machine_id': '123,345,567'}, fields='virtual_machine_id', limit=500, offset=0)
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [result['status'] for result in facts['vm_backups'].values()] == ['EXISTS', 'CREATED', 'EXISTS']
+
+    def test_create_backups_should_request_all_the_pages_of_backups_with_the_same_name(self):
+        self._setup_multiple_backups({})
+        backups_get_all = self.mock_ovc_client.backups.get_all.side_effect
+        # The recurring backups of TESTVM1 fill the first page, the one of TESTVM3 is on the second one
+        backups = [mock.Mock(data={'virtual_machine_id': '123'})] * 500 + [mock.Mock(data={'virtual_machine_id': '567'})]
+        self.mock_ovc_client.backups.get_all.side_effect = lambda filters, limit=500, offset=0, **kwargs: (
+            backups[offset:offset + limit] if 'virtual_machine_id' in filters else backups_get_all(filters))
+        self.mock_ovc_client.connection.post.side_effect = lambda uri, body: (
+            {'task': self._task(uri.split('/')[2], 'COMPLETED')}, {})
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_called_once_with('/virtual_machines/345/backup', mock.ANY)
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [result['status'] for result in facts['vm_backups'].values()] == ['EXISTS', 'CREATED', 'EXISTS']
+
+    def test_create_backups_should_report_the_vms_with_the_same_name_by_id(self):
+        self._setup_multiple_backups({'1': ['COMPLETED'], '2': ['COMPLETED'], '345': ['COMPLETED']})
+        web1, web2 = mock.Mock(data={'name': 'web', 'id': '1'}), mock.Mock(data={'name': 'web', 'id': '2'})
+        self.mock_ansible_module.params['data'] = dict(vm_names=['web', 'TESTVM2'], vm_ids=['1', '2'],
+                                                       backup_name='TESTBACKUP')
+        self.mock_ovc_client.virtual_machines.get_all.side_effect = lambda filters: (
+            [web1, web2, self.vm2] if 'name' in filters else [web1, web2])
+
+        VirtualMachineModule().run()
+
+        posted_uris = sorted(call[0][0] for call in self.mock_ovc_client.connection.post.call_args_list)
+        assert posted_uris == ['/virtual_machines/1/backup', '/virtual_machines/2/backup', '/virtual_machines/345/backup']
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [(key, result['status']) for key, result in facts['vm_backups'].items()] == [
+            ('1', 'CREATED'), ('TESTVM2', 'CREATED'), ('2', 'CREATED')]
+        assert facts['vm_backups']['2']['backup']['id'] == '2'
+
+    def test_create_backups_should_return_the_running_tasks_without_waiting(self):
+        self._setup_multiple_backups({'123': ['IN_PROGRESS', 'COMPLETED'],
+                                      '345': ['IN_PROGRESS', 'IN_PROGRESS'],
+                                      '567': ['IN_PROGRESS']})
+        self.mock_ansible_module.params['wait'] = False
+
+        with mock.patch('simplivity_virtual_machine.time'):
+            VirtualMachineModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [result['status'] for result in facts['vm_backups'].values()] == ['CREATED', 'STARTED', 'STARTED']
+        assert facts['vm_backups']['TESTVM2']['task']['id'] == '345'
+        self.mock_ansible_module.exit_json.assert_called_once_with(changed=True, msg=VirtualMachineModule.MSG_BACKUPS_CREATED,
+                                                                   ansible_facts=facts)
+
+    def test_create_backups_should_poll_the_task_again_when_a_poll_fails(self):
+        self._setup_multiple_backups({'123': ['IN_PROGRESS', 'COMPLETED'],
+                                      '345': ['IN_PROGRESS', 'COMPLETED'],
+                                      '567': ['COMPLETED']})
+        get = self.mock_ovc_client.connection.get.side_effect
+        errors = [HPESimpliVityException('Service Unavailable')]
+        self.mock_ovc_client.connection.get.side_effect = lambda uri: (
+            self._raise(errors.pop()) if errors and uri == '/tasks/123' else get(uri))
+
+        with mock.patch('simplivity_virtual_machine.time'):
+            VirtualMachineModule().run()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [result['status'] for result in facts['vm_backups'].values()] == ['CREATED', 'CREATED', 'CREATED']
+
+    def test_create_backups_should_fail_the_vm_whose_task_polls_keep_failing(self):
+        self._setup_multiple_backups({'123': ['IN_PROGRESS'], '345': ['IN_PROGRESS', 'COMPLETED'], '567': ['COMPLETED']})
+        get = self.mock_ovc_client.connection.get.side_effect
+        self.mock_ovc_client.connection.get.side_effect = lambda uri: (
+            self._raise(HPESimpliVityException('Service Unavailable')) if uri == '/tasks/123' else get(uri))
+
+        with mock.patch('simplivity_virtual_machine.time'):
+            VirtualMachineModule().run()
+
+        result = self.mock_ansible_module.fail_json.call_args[1]
+        assert result['msg'] == VirtualMachineModule.MSG_TASKS_FAILED.format('TESTVM1: Service Unavailable')
+        assert [backup['status'] for backup in result['ansible_facts']['vm_backups'].values()] == ['FAILED', 'CREATED', 'CREATED']
+        assert self.mock_ovc_client.connection.get.call_count == VirtualMachineModule.MAX_POLL_ERRORS + 1
+
+    @staticmethod
+    def _raise(error):
+        raise error
+
+    def test_create_backups_should_fail_with_the_failed_vms(self):
+        self._setup_multiple_backups({'123': ['COMPLETED'], '345': ['ERROR'], '567': ['COMPLETED']})
+
+        VirtualMachineModule().run()
+
+        assert self.mock_ovc_client.connection.post.call_count == 3
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            exception=mock.ANY,
+            msg=VirtualMachineModule.MSG_TASKS_FAILED.format('TESTVM2: Backup failed'),
+            changed=True,
+            ansible_facts=mock.ANY
+        )
+        facts = self.mock_ansible_module.fail_json.call_args[1]['ansible_facts']
+        assert [(name, result['status']) for name, result in facts['vm_backups'].items()] == [
+            ('TESTVM1', 'CREATED'), ('TESTVM2', 'FAILED'), ('TESTVM3', 'CREATED')]
+        assert facts['vm_backups']['TESTVM2']['error'] == 'Backup failed'
+        assert facts['vm_backups']['TESTVM3']['backup']['id'] == '567'
+        assert facts['not_found_vms'] == ['MISSINGVM']
+
+    def test_clone_many_should_fail_with_the_result_of_each_clone(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_CLONES)
+        self.vm1.data = {'name': 'TESTVM', 'id': '123'}
+        self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
+        self.mock_ovc_client.virtual_machines.get_all.side_effect = lambda filters: (
+            [] if 'name' in filters else [mock.Mock(data={'name': 'TESTVM_CLONE' + vm_id, 'id': vm_id})
+                                          for vm_id in filters['id'].split(',')])
+        self.mock_ovc_client.connection.post.side_effect = lambda uri, body: (
+            {'task': self._task(body['virtual_machine_name'][-1],
+                                'ERROR' if body['virtual_machine_name'] == 'TESTVM_CLONE2' else 'COMPLETED',
+                                'virtual_machine')}, {})
+
+        VirtualMachineModule().run()
+
+        self.mock_ansible_module.exit_json.assert_not_called()
+        result = self.mock_ansible_module.fail_json.call_args[1]
+        assert result['msg'] == VirtualMachineModule.MSG_TASKS_FAILED.format('TESTVM_CLONE2: Backup failed')
+        assert result['changed'] is True
+        assert [(name, clone['status']) for name, clone in result['ansible_facts']['cloned_vms'].items()] == [
+            ('TESTVM_CLONE1', 'CREATED'), ('TESTVM_CLONE2', 'FAILED'), ('TESTVM_CLONE3', 'CREATED')]
+
+    def test_create_backups_should_not_be_changed_when_all_the_backups_failed(self):
+        self._setup_multiple_backups({'123': ['ERROR'], '345': ['ERROR'], '567': ['ERROR']})
+
+        VirtualMachineModule().run()
+
+        result = self.mock_ansible_module.fail_json.call_args[1]
+        assert result['changed'] is False
+        assert [backup['status'] for backup in result['ansible_facts']['vm_backups'].values()] == ['FAILED'] * 3
+
+    def test_clone_many_should_only_clone_the_missing_names(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_CLONES)
+        self.vm1.data = {'name': 'TESTVM', 'id': '123'}
+        self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
+        existing_clone = mock.Mock(data={'name': 'TESTVM_CLONE2', 'id': '2'})
+        self.mock_ovc_client.virtual_machines.get_all.side_effect = lambda filters: (
+            [existing_clone] if 'name' in filters else [mock.Mock(data={'name': 'TESTVM_CLONE' + vm_id, 'id': vm_id})
+                                                        for vm_id in filters['id'].split(',')])
+        self.mock_ovc_client.connection.post.side_effect = lambda uri, body: (
+            {'task': self._task(body['virtual_machine_name'][-1], 'COMPLETED', 'virtual_machine')}, {})
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.virtual_machines.get_all.assert_any_call(
+            filters={'name': 'TESTVM_CLONE1,TESTVM_CLONE2,TESTVM_CLONE3'})
+        assert self.mock_ovc_client.connection.post.call_args_list == [
+            mock.call('/virtual_machines/123/clone', {'virtual_machine_name': 'TESTVM_CLONE1', 'app_consistent': False}),
+            mock.call('/virtual_machines/123/clone', {'virtual_machine_name': 'TESTVM_CLONE3', 'app_consistent': False})]
+        self.vm1.clone.assert_not_called()
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [(name, result['status']) for name, result in facts['cloned_vms'].items()] == [
+            ('TESTVM_CLONE1', 'CREATED'), ('TESTVM_CLONE2', 'EXISTS'), ('TESTVM_CLONE3', 'CREATED')]
+        assert facts['cloned_vms']['TESTVM_CLONE3']['virtual_machine']['id'] == '3'
+
+    def test_clone_many_should_fail_when_the_pattern_has_no_number(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_CLONES)
+        self.mock_ansible_module.params['data']['new_name_pattern'] = 'TESTVM_CLONE'
+        self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(exception=mock.ANY,
+                                                                   msg=VirtualMachineModule.MSG_CLONE_NAME_PATTERN)
+
+    @pytest.mark.parametrize('count', [None, 0, '3'])
+    def test_clone_many_should_fail_without_a_count(self, count):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_CLONES)
+        self.mock_ansible_module.params['data']['count'] = count
+        self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(exception=mock.ANY,
+                                                                   msg=VirtualMachineModule.MSG_CLONE_COUNT)
+
+    def test_clone_many_to_a_datastore_should_fail(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_CLONES)
+        self.mock_ansible_module.params['data']['datastore'] = 'TEST_DATASTORE_NAME'
+        self.mock_ovc_client.virtual_machines.get_by_name.return_value = self.vm1
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(exception=mock.ANY,
+                                                                   msg=VirtualMachineModule.MSG_CLONES_TO_DATASTORE)
+
+    def test_move_many_should_limit_the_moves_per_pair_of_datastores(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_MOVES)
+        target = mock.Mock(data={'name': 'TARGET', 'id': 'ds-target'})
+        self.mock_ovc_client.datastores.get_all.return_value = [target]
+        vms = [mock.Mock(data={'name': 'TESTVM1', 'id': '1', 'datastore_id': 'ds-a'}),
+               mock.Mock(data={'name': 'TESTVM2', 'id': '2', 'datastore_id': 'ds-a'}),
+               mock.Mock(data={'name': 'TESTVM3', 'id': '3', 'datastore_id': 'ds-b'}),
+               mock.Mock(data={'name': 'TESTVM4', 'id': '4', 'datastore_id': 'ds-target'})]
+        self.mock_ovc_client.virtual_machines.get_all.side_effect = lambda filters: (
+            vms if 'name' in filters else [mock.Mock(data={'id': vm_id}) for vm_id in filters['id'].split(',')])
+        task_states = {'1': ['IN_PROGRESS', 'COMPLETED'], '2': ['COMPLETED'], '3': ['IN_PROGRESS', 'COMPLETED']}
+        self.mock_ovc_client.connection.post.side_effect = lambda uri, body: (
+            {'task': self._task(uri.split('/')[2], task_states[uri.split('/')[2]].pop(0), 'virtual_machine')}, {})
+        self.mock_ovc_client.connection.get.side_effect = lambda uri: {
+            'task': self._task(uri.split('/')[-1], task_states[uri.split('/')[-1]].pop(0), 'virtual_machine')}
+
+        with mock.patch('simplivity_virtual_machine.time'):
+            VirtualMachineModule().run()
+
+        self.mock_ovc_client.datastores.get_all.assert_called_once_with(filters={'name': 'TARGET'})
+        self.mock_ovc_client.virtual_machines.get_all.assert_any_call(
+            filters={'name': 'TESTVM1,TESTVM2,TESTVM2_MOVED,TESTVM3,TESTVM4,MISSINGVM'})
+        requests = [call[1][0] for call in self.mock_ovc_client.connection.mock_calls if call[0] in ('post', 'get')]
+        # TESTVM2 waits for TESTVM1, as they move between the same datastores
+        assert requests == ['/virtual_machines/1/move', '/virtual_machines/3/move', '/tasks/1', '/tasks/3',
+                            '/virtual_machines/2/move']
+        self.mock_ovc_client.connection.post.assert_any_call(
+            '/virtual_machines/2/move', {'virtual_machine_name': 'TESTVM2_MOVED', 'destination_datastore_id': 'ds-target'})
+
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [(name, result['status']) for name, result in facts['moved_vms'].items()] == [
+            ('TESTVM1', 'MOVED'), ('TESTVM2', 'MOVED'), ('TESTVM3', 'MOVED'), ('TESTVM4', 'EXISTS')]
+        assert facts['not_found_vms'] == ['MISSINGVM']
+
+    def _setup_moves_of_vms_with_the_same_name(self, vms):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_MOVES)
+        self.mock_ovc_client.datastores.get_all.return_value = [mock.Mock(data={'name': 'TARGET', 'id': 'ds-target'})]
+        self.web_vms = [mock.Mock(data={'name': 'web', 'id': '1', 'datastore_id': 'ds-a', 'datastore_name': 'A'}),
+                        mock.Mock(data={'name': 'web', 'id': '2', 'datastore_id': 'ds-b', 'datastore_name': 'B'})]
+        self.mock_ansible_module.params['data']['vms'] = vms
+        self.mock_ovc_client.virtual_machines.get_all.side_effect = lambda filters: (
+            self.web_vms if 'name' in filters else [vm for vm in self.web_vms if vm.data['id'] in filters['id'].split(',')])
+        self.mock_ovc_client.connection.post.side_effect = lambda uri, body: (
+            {'task': self._task(uri.split('/')[2], 'COMPLETED', 'virtual_machine')}, {})
+
+    def test_move_many_should_move_the_vms_with_the_same_name_by_id_or_source_datastore(self):
+        self._setup_moves_of_vms_with_the_same_name([dict(name='web', source_datastore_name='B', datastore_name='TARGET'),
+                                                     dict(id='1', datastore_name='TARGET'),
+                                                     dict(id='2', datastore_name='TARGET')])
+
+        VirtualMachineModule().run()
+
+        assert [call[0][0] for call in self.mock_ovc_client.connection.post.call_args_list] == [
+            '/virtual_machines/2/move', '/virtual_machines/1/move']
+        facts = self.mock_ansible_module.exit_json.call_args[1]['ansible_facts']
+        assert [(key, result['status']) for key, result in facts['moved_vms'].items()] == [('2', 'MOVED'), ('1', 'MOVED')]
+
+    def test_move_many_should_fail_when_a_name_matches_several_vms(self):
+        self._setup_moves_of_vms_with_the_same_name([dict(name='web', datastore_name='TARGET')])
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            exception=mock.ANY, msg=VirtualMachineModule.MSG_AMBIGUOUS_VMS.format('web'))
+
+    def test_move_many_should_fail_when_a_datastore_is_not_found(self):
+        self.mock_ansible_module.params = yaml.load(PARAMS_FOR_MULTIPLE_MOVES)
+        self.mock_ovc_client.datastores.get_all.return_value = []
+
+        VirtualMachineModule().run()
+
+        self.mock_ovc_client.connection.post.assert_not_called()
+        self.mock_ansible_module.fail_json.assert_called_once_with(
+            exception=mock.ANY, msg=VirtualMachineModule.MSG_DATASTORES_NOT_FOUND.format('TARGET'))
+
 
 if __name__ == '__main__':
     pytest.main([__file__])